@@ -0,0 +1,16 @@
+import timeit
+import tracemalloc
+from typing import Any, Callable
+
+
+def measure(fn: Callable[[], Any], iterations: int) -> tuple[float, int]:
+    """Get the mean time in microseconds, and the peak memory in bytes of one call."""
+
+    seconds = timeit.timeit(fn, number=iterations)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return seconds / iterations * 1e6, peak
@@ -0,0 +1,107 @@
+"""
+Command parsing benchmark, on large comment bodies.
+
+Compares splitting every line before checking the bot nickname, as commands
+were parsed before, with the prefix pre-filter of `CommandParser.parse_body`.
+
+Usage: python -m benchmarks.commands [--iterations N]
+"""
+
+import argparse
+import functools
+
+from benchmarks import measure
+from prbot.config.settings import Settings, set_global_settings
+from prbot.core.commands.processor import CommandParser
+
+DESCRIPTION = "\n".join(
+    [
+        "## Context",
+        "",
+        *[
+            f"This change reworks the handling of item {x}, see #{x} for details."
+            for x in range(150)
+        ],
+        "",
+        "## Changes",
+        "",
+        *[f"- Update `module_{x}.py` to use the new `Client` API" for x in range(200)],
+        "",
+        "```python",
+        *[
+            f"    result_{x} = await client.fetch(owner, name, number={x})"
+            for x in range(100)
+        ],
+        "```",
+    ]
+)
+REVIEW = "\n".join(
+    [
+        *[
+            f"Looks good to me, a few nits on line {x} but nothing blocking."
+            for x in range(40)
+        ],
+        "bot r+ alice bob",
+        "bot qa+",
+        "bot automerge+",
+    ]
+)
+# Lines starting like the nickname, the worst case for the pre-filter
+LOOKALIKES = "\n".join(
+    f"bottom line {x}: the bot {x} should be fixed in a follow-up" for x in range(500)
+)
+BODIES = {"description": DESCRIPTION, "review": REVIEW, "lookalikes": LOOKALIKES}
+
+
+def split_lines(body: str, nickname: str) -> int:
+    # Previous approach: split every line, then compare the first word
+    count = 0
+    for line in body.splitlines():
+        try:
+            bot_name, command_name, *args = line.split(" ")
+        except ValueError:
+            continue
+
+        if bot_name == nickname:
+            count += 1
+
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    set_global_settings(
+        Settings(
+            bot_nickname="bot",
+            database_url="sqlite://:memory:",
+            lock_url="memory://",
+            tenor_key="",
+            github_webhook_secret="",
+        )
+    )
+    command_parser = CommandParser()
+
+    print(
+        f"{'body':<12} {'lines':>6} {'split (us)':>11} {'prefix (us)':>12}"
+        f" {'split (KiB)':>12} {'prefix (KiB)':>13}"
+    )
+    for name, body in BODIES.items():
+        split_time, split_peak = measure(
+            functools.partial(split_lines, body, "bot"), args.iterations
+        )
+        prefix_time, prefix_peak = measure(
+            functools.partial(command_parser.parse_body, body), args.iterations
+        )
+
+        print(
+            f"{name:<12} {len(body.splitlines()):>6} {split_time:>11.1f}"
+            f" {prefix_time:>12.1f} {split_peak / 1024:>12.1f}"
+            f" {prefix_peak / 1024:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Webhook decoding benchmark, on the test fixtures.
+
+Compares decoding to a dict then validating it, with validating the raw bytes.
+
+Usage: python -m benchmarks.webhooks [--iterations N]
+"""
+
+import argparse
+import functools
+import json
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel
+
+from benchmarks import measure
+from prbot.core.webhooks.models import GhEventType
+from prbot.core.webhooks.processor import WEBHOOK_EVENT_MODELS, parse_webhook_event
+
+FIXTURES_PATH = Path(__file__).parent.parent / "tests" / "fixtures" / "webhooks"
+FIXTURES = {
+    "check_suite_completed.json": GhEventType.CheckSuite,
+    "issue_comment_created.json": GhEventType.IssueComment,
+    "ping_event.json": GhEventType.Ping,
+    "pull_request_labeled.json": GhEventType.PullRequest,
+    "pull_request_opened.json": GhEventType.PullRequest,
+    "pull_request_review_submitted.json": GhEventType.PullRequestReview,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(
+        f"{'fixture':<40} {'dict (us)':>10} {'bytes (us)':>11}"
+        f" {'dict (KiB)':>11} {'bytes (KiB)':>12}"
+    )
+    for filename, event_type in FIXTURES.items():
+        body = (FIXTURES_PATH / filename).read_bytes()
+        model = WEBHOOK_EVENT_MODELS[event_type]
+
+        def from_dict(model: type[BaseModel] = model, body: bytes = body) -> Any:
+            return model.model_validate(json.loads(body))
+
+        dict_time, dict_peak = measure(from_dict, args.iterations)
+        bytes_time, bytes_peak = measure(
+            functools.partial(parse_webhook_event, event_type, body), args.iterations
+        )
+
+        print(
+            f"{filename:<40} {dict_time:>10.1f} {bytes_time:>11.1f}"
+            f" {dict_peak / 1024:>11.1f} {bytes_peak / 1024:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
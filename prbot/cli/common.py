@@ -19,6 +19,7 @@ from prbot.core.models import (
     RuleBranchFactory,
 )
 from prbot.injection import inject_instance, setup
+from prbot.modules.cache import CacheClient
 from prbot.modules.database.repository import (
     ExternalAccountDatabase,
     PullRequestDatabase,
@@ -86,6 +87,10 @@ def setup_runtime(coro: Coroutine[None, Any, Any]) -> None:
                 lock_client = inject_instance(LockClient)
                 await lock_client.aclose()
 
+                # Close cache client
+                cache_client = inject_instance(CacheClient)
+                await cache_client.aclose()
+
             except Exception as e:
                 print(
                     f"[yellow]Warning: Something happened on cleanup: {e}. Ignoring...[/yellow]"
@@ -9,7 +9,12 @@ from prbot.cli import account, pull_request, repository
 from prbot.cli.common import async_command, build_typer
 from prbot.config.settings import get_global_settings
 from prbot.injection import inject_instance
-from prbot.modules.database.import_export import ImportExportProcessor
+from prbot.modules.database.bulk import DEFAULT_BATCH_SIZE
+from prbot.modules.database.import_export import (
+    ImportExportFormat,
+    ImportExportProcessor,
+)
+from prbot.modules.database.retention import purge_github_cache
 from prbot.modules.lock import LockClient
 
 app = build_typer()
@@ -66,6 +71,9 @@ def serve() -> None:
         f"{settings.server_ip}:{settings.server_port}",
         "prbot.server.main:app",
     ]
+    if settings.uses_memory_lock():
+        # In-memory locks only work within a single process
+        cmd += ["--workers", "1"]
     os.execvp(cmd[0], cmd)
 
 
@@ -91,8 +99,11 @@ async def check() -> None:
 async def data_export(
     path: Path,
     overwrite: Annotated[bool, typer.Option(help="Overwrite existing file")] = False,
+    data_format: Annotated[
+        ImportExportFormat, typer.Option("--format", help="Output format")
+    ] = ImportExportFormat.Json,
 ) -> None:
-    """Export database items to JSON."""
+    """Export database items to JSON or NDJSON."""
     if path.exists() and not overwrite:
         print(f"[red]Output file '{path}' already exists.[/red]")
         raise typer.Exit(code=1)
@@ -100,15 +111,21 @@ async def data_export(
     processor = ImportExportProcessor()
 
     with open(path, mode="wb") as fd:
-        await processor.export_data(fd)
+        await processor.export_data(fd, data_format=data_format)
 
 
 @async_command(app)
 async def data_import(
     path: Path,
     compatibility: Annotated[bool, typer.Option(help="Use compatibility mode")] = False,
+    data_format: Annotated[
+        ImportExportFormat, typer.Option("--format", help="Input format")
+    ] = ImportExportFormat.Json,
+    batch_size: Annotated[
+        int, typer.Option(min=1, help="Number of rows inserted per statement")
+    ] = DEFAULT_BATCH_SIZE,
 ) -> None:
-    """Import database items from JSON."""
+    """Import database items from JSON or NDJSON."""
     if not path.exists():
         print(f"[red]Import file '{path}' does not exist.[/red]")
         raise typer.Exit(code=1)
@@ -116,9 +133,29 @@ async def data_import(
     processor = ImportExportProcessor()
     with open(path, mode="rb") as fd:
         if compatibility:
-            await processor.import_data_compatibility(fd)
+            report = await processor.import_data_compatibility(
+                fd, batch_size=batch_size
+            )
         else:
-            await processor.import_data(fd)
+            report = await processor.import_data(
+                fd, data_format=data_format, batch_size=batch_size
+            )
+
+    print(
+        f"[green]Imported {report.total_rows} rows in {report.duration_seconds:.2f}s"
+        f" ({report.rows_per_second:.0f} rows/s).[/green]"
+    )
+
+
+@async_command(app)
+async def purge_cache() -> None:
+    """Remove expired pull request snapshots, check runs and QA status jobs."""
+    report = await purge_github_cache()
+    print(
+        f"[green]Removed {report.snapshots} snapshots,"
+        f" check runs of {report.commits} commits"
+        f" and {report.jobs} QA status jobs.[/green]"
+    )
 
 
 @app.command()
@@ -1,8 +1,16 @@
+from typing import Annotated
+
+import typer
 from rich import print
 
+from prbot.core.models import CheckStatus, QaStatus
+from prbot.core.step.models import StepLabel
 from prbot.core.sync.processor import SyncProcessor
 from prbot.injection import inject_instance
-from prbot.modules.database.repository import PullRequestDatabase
+from prbot.modules.database.repository import (
+    PullRequestDatabase,
+    PullRequestStateDatabase,
+)
 
 from .common import (
     PullRequestPathArg,
@@ -63,3 +71,41 @@ async def show(path: PullRequestPathArg) -> None:
     """Show info about a specific pull request."""
     pull_request = await ensure_pull_request(path)
     print(pull_request)
+
+
+@async_command(app)
+async def states(
+    owner: Annotated[str | None, typer.Option(help="Repository owner")] = None,
+    name: Annotated[str | None, typer.Option(help="Repository name")] = None,
+    step_label: Annotated[
+        StepLabel | None, typer.Option(help="Filter on step label")
+    ] = None,
+    check_status: Annotated[
+        CheckStatus | None, typer.Option(help="Filter on check status")
+    ] = None,
+    qa_status: Annotated[
+        QaStatus | None, typer.Option(help="Filter on QA status")
+    ] = None,
+    limit: Annotated[int, typer.Option(min=1, help="Page size")] = 100,
+    cursor: Annotated[int | None, typer.Option(help="Cursor of the page")] = None,
+) -> None:
+    """List the last synchronized state of pull requests, without calling GitHub."""
+    pull_request_state_db = inject_instance(PullRequestStateDatabase)
+    page = await pull_request_state_db.filter(
+        owner=owner,
+        name=name,
+        step_label=step_label,
+        check_status=check_status,
+        qa_status=qa_status,
+        limit=limit,
+        cursor=cursor,
+    )
+    if len(page.items) == 0:
+        print("[yellow]No pull request state found.[/yellow]")
+        return
+
+    for state in page.items:
+        print(state)
+
+    if page.next_cursor is not None:
+        print(f"[blue]Next page: --cursor {page.next_cursor}[/blue]")
@@ -5,6 +5,7 @@ from prbot.core.models import (
     RuleActionFactory,
     RuleConditionFactory,
 )
+from prbot.core.rule_index import RuleIndex
 from prbot.injection import inject_instance
 from prbot.modules.database.repository import (
     RepositoryRuleDatabase,
@@ -61,3 +62,29 @@ async def list(repository_path: RepositoryPathArg) -> None:
 
     for rule in rules:
         print(rule)
+
+
+@async_command(app)
+async def match(
+    repository_path: RepositoryPathArg, author: str, base_branch: str, head_branch: str
+) -> None:
+    """List repository rules matching a pull request author and branches."""
+    await ensure_repository(repository_path)
+
+    rule_db = inject_instance(RepositoryRuleDatabase)
+    candidates = await rule_db.filter_candidates(
+        owner=repository_path.owner,
+        name=repository_path.name,
+        author=author,
+        base_branch=base_branch,
+        head_branch=head_branch,
+    )
+    rules = RuleIndex(candidates).match(
+        author=author, base_branch=base_branch, head_branch=head_branch
+    )
+    if len(rules) == 0:
+        print("[yellow]No rule found.[/yellow]")
+        return
+
+    for rule in rules:
+        print(rule)
@@ -1,9 +1,13 @@
 from contextvars import ContextVar
 from typing import Annotated, cast
+from urllib.parse import urlsplit
 
 from pydantic import AfterValidator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# Lock URL scheme of single-process deployments, running without Redis
+MEMORY_URL_SCHEME = "memory"
+
 PrivateKeyField = Annotated[str, AfterValidator(lambda x: x.replace("\\n", "\n"))]
 
 
@@ -12,7 +16,22 @@ class Settings(BaseSettings):
 
     database_url: str
     lock_url: str
+    # Max time to wait in line for a lock, before giving up
+    lock_wait_timeout_seconds: float = 30.0
+    # Lock expiration, extended while the holder is running
+    lock_lease_seconds: float = 10.0
     tenor_key: str
+    # Tenor results are cached by query, shorter when nothing was found
+    gif_cache_size: int = 512
+    gif_cache_ttl_seconds: int = 86400
+    gif_negative_cache_ttl_seconds: int = 600
+    # Share the GIF cache between processes through the lock Redis server
+    gif_shared_cache: bool = False
+    gif_request_timeout_seconds: float = 3.0
+    # Pull requests synced at once by external QA status jobs
+    qa_status_job_concurrency: int = 4
+    # Age after which QA status jobs can no longer be fetched
+    qa_status_job_retention_seconds: int = 86400
 
     # Logging
     log_level: str = "INFO"
@@ -22,6 +41,12 @@ class Settings(BaseSettings):
     github_personal_token: str = ""
     github_app_client_id: str = ""
     github_app_private_key: PrivateKeyField = ""
+    # Max age of a stored pull request snapshot before fetching it again
+    github_pull_request_snapshot_ttl_seconds: int = 300
+    # Max age of the check runs of a commit, listed once then updated by webhooks
+    github_check_runs_ttl_seconds: int = 600
+    # Age after which stored snapshots and check runs are removed
+    github_cache_retention_seconds: int = 86400
 
     # Sentry
     sentry_dsn: str = ""
@@ -35,6 +60,9 @@ class Settings(BaseSettings):
 
     model_config = SettingsConfigDict(env_prefix="prbot_")
 
+    def uses_memory_lock(self) -> bool:
+        return urlsplit(self.lock_url).scheme == MEMORY_URL_SCHEME
+
 
 _SETTINGS: ContextVar[Settings | None] = ContextVar("_SETTINGS", default=None)
 
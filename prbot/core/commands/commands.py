@@ -16,6 +16,13 @@ from prbot.modules.github.models import GhReactionType
 
 logger = structlog.get_logger()
 
+# Only one reaction is added to a comment, the most significant one
+REACTION_PRIORITY = [
+    GhReactionType.Eyes,
+    GhReactionType.PlusOne,
+    GhReactionType.Confused,
+]
+
 
 class CommandExecutionError(Exception):
     def __init__(self, message: str) -> None:
@@ -44,6 +51,10 @@ class CommandContext:
     command: str | None
     comment_id: int | None
 
+    # Sent once all the commands of a comment are processed
+    _reaction: GhReactionType | None
+    _replies: list[tuple[str | None, str]]
+
     def __init__(
         self,
         *,
@@ -64,9 +75,24 @@ class CommandContext:
         self.author = author
         self.comment_id = comment_id
         self.command = command
+        self._reaction = None
+        self._replies = []
 
     async def add_reaction(self, reaction: GhReactionType) -> None:
-        if self.comment_id is not None:
+        if self._reaction is None or _reaction_priority(reaction) > _reaction_priority(
+            self._reaction
+        ):
+            self._reaction = reaction
+
+    async def respond_to_author(self, comment: str) -> None:
+        self._replies.append((self.command, comment))
+
+    async def flush(self) -> None:
+        """Send the reaction and a single reply for the processed commands."""
+        reaction, self._reaction = self._reaction, None
+        replies, self._replies = self._replies, []
+
+        if reaction is not None and self.comment_id is not None:
             await self.api.reactions().add(
                 owner=self.owner,
                 name=self.name,
@@ -74,14 +100,40 @@ class CommandContext:
                 reaction=reaction,
             )
 
-    async def respond_to_author(self, comment: str) -> None:
-        final_comment = f"{comment}\n{generate_message_footer()}"
-        if self.command is not None:
-            final_comment = f"> {self.command}\n\n{final_comment}"
+        if len(replies) > 0:
+            sections = [
+                comment if command is None else f"> {command}\n\n{comment}"
+                for command, comment in replies
+            ]
+            final_comment = "\n\n".join(sections) + f"\n{generate_message_footer()}"
+
+            await self.api.issues().create_comment(
+                owner=self.owner,
+                name=self.name,
+                number=self.number,
+                message=final_comment,
+            )
 
-        await self.api.issues().create_comment(
-            owner=self.owner, name=self.name, number=self.number, message=final_comment
-        )
+
+class CommandBatch:
+    """Commands of a comment which were run, with their replies not sent yet."""
+
+    needs_sync: bool
+    _ctx: CommandContext | None
+
+    def __init__(self, *, needs_sync: bool, ctx: CommandContext | None) -> None:
+        self.needs_sync = needs_sync
+        self._ctx = ctx
+
+    async def reply(self) -> None:
+        if self._ctx is not None:
+            await self._ctx.flush()
+
+
+def _reaction_priority(reaction: GhReactionType) -> int:
+    if reaction in REACTION_PRIORITY:
+        return REACTION_PRIORITY.index(reaction)
+    return -1
 
 
 class BaseCommand(ABC):
@@ -109,13 +161,14 @@ class SetQa(BaseCommand):
             raise CommandExecutionError(str(err))
 
         await ctx.add_reaction(GhReactionType.Eyes)
-        await ctx.respond_to_author(
-            "QA status is marked as **{status}** by **{author}**.".format(
-                status=self.status.value, author=ctx.author
-            ),
-        )
+        await ctx.respond_to_author(self.message(ctx.author))
         return CommandOutput(needs_sync=True)
 
+    def message(self, author: str) -> str:
+        return "QA status is marked as **{status}** by **{author}**.".format(
+            status=self.status.value, author=author
+        )
+
 
 class SetChecksEnabled(BaseCommand):
     status: bool
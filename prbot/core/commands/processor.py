@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Callable, NamedTuple
 
 import structlog
 
@@ -10,6 +11,7 @@ from .commands import (
     AssignLabels,
     AssignReviewers,
     BaseCommand,
+    CommandBatch,
     CommandContext,
     CommandExecutionError,
     CommandOutput,
@@ -28,166 +30,177 @@ from .commands import (
 
 logger = structlog.get_logger()
 
+UNEXPECTED_ERROR_MESSAGE = "Unexpected error while running the command."
+
 
 class CommandParseError(Exception):
     def __init__(self, message: str) -> None:
         super().__init__(f"Invalid command: {message}")
 
 
-class CommandParser:
-    def __init__(self) -> None: ...
-
-    def parse(self, command: str) -> BaseCommand | None:
-        try:
-            bot_name, command_name, *args = command.split(" ")
-        except ValueError:
-            # Wrong format, ignore
-            return None
-
-        if bot_name != get_global_settings().bot_nickname:
-            # Nope
-            return None
-
-        if command_name == "qa+":
-            if len(args) != 0:
-                raise CommandParseError("Unexpected arguments for command")
-
-            return SetQa(QaStatus.Pass)
-
-        elif command_name == "qa-":
-            if len(args) != 0:
-                raise CommandParseError("Unexpected arguments for command")
-
-            return SetQa(QaStatus.Fail)
-
-        elif command_name == "qa?":
-            if len(args) != 0:
-                raise CommandParseError("Unexpected arguments for command")
-
-            return SetQa(QaStatus.Waiting)
-
-        elif command_name == "noqa+":
-            if len(args) != 0:
-                raise CommandParseError("Unexpected arguments for command")
-
-            return SetQa(QaStatus.Skipped)
-
-        elif command_name == "nochecks-":
-            if len(args) != 0:
-                raise CommandParseError("Unexpected arguments for command")
-
-            return SetChecksEnabled(True)
-
-        elif command_name == "nochecks+":
-            if len(args) != 0:
-                raise CommandParseError("Unexpected arguments for command")
+class CommandSpec(NamedTuple):
+    """How to build a command from its arguments."""
+
+    build: Callable[[list[str]], BaseCommand]
+    min_args: int = 0
+    # None for any number of arguments
+    max_args: int | None = 0
+    missing_args_message: str = "Missing arguments for command"
+
+
+def _parse_strategy(value: str) -> MergeStrategy:
+    try:
+        return MergeStrategy(value)
+    except ValueError:
+        raise CommandParseError(f"Invalid merge strategy: {value}")
+
+
+COMMANDS: dict[str, CommandSpec] = {
+    "qa+": CommandSpec(lambda args: SetQa(QaStatus.Pass)),
+    "qa-": CommandSpec(lambda args: SetQa(QaStatus.Fail)),
+    "qa?": CommandSpec(lambda args: SetQa(QaStatus.Waiting)),
+    "noqa+": CommandSpec(lambda args: SetQa(QaStatus.Skipped)),
+    "nochecks-": CommandSpec(lambda args: SetChecksEnabled(True)),
+    "nochecks+": CommandSpec(lambda args: SetChecksEnabled(False)),
+    "automerge+": CommandSpec(lambda args: SetAutomerge(True)),
+    "automerge-": CommandSpec(lambda args: SetAutomerge(False)),
+    "lock+": CommandSpec(
+        lambda args: SetLocked(True, comment=" ".join(args) if args else None),
+        max_args=None,
+    ),
+    "lock-": CommandSpec(
+        lambda args: SetLocked(False, comment=" ".join(args) if args else None),
+        max_args=None,
+    ),
+    "r+": CommandSpec(
+        AssignReviewers,
+        min_args=1,
+        max_args=None,
+        missing_args_message="Missing reviewers to set",
+    ),
+    "r-": CommandSpec(
+        UnassignReviewers,
+        min_args=1,
+        max_args=None,
+        missing_args_message="Missing reviewers to unset",
+    ),
+    "strategy+": CommandSpec(
+        lambda args: SetStrategy(_parse_strategy(args[0])),
+        min_args=1,
+        max_args=1,
+        missing_args_message="Missing strategy name",
+    ),
+    "strategy?": CommandSpec(lambda args: SetStrategy(None)),
+    "merge": CommandSpec(
+        lambda args: Merge(_parse_strategy(args[0]) if args else None), max_args=1
+    ),
+    "labels+": CommandSpec(
+        AssignLabels,
+        min_args=1,
+        max_args=None,
+        missing_args_message="Missing labels to set",
+    ),
+    "labels-": CommandSpec(
+        UnassignLabels,
+        min_args=1,
+        max_args=None,
+        missing_args_message="Missing labels to unset",
+    ),
+    "ping": CommandSpec(lambda args: Ping()),
+    "gif": CommandSpec(
+        lambda args: Gif(" ".join(args)),
+        min_args=1,
+        max_args=None,
+        missing_args_message="Missing GIF query",
+    ),
+    "sync": CommandSpec(lambda args: Sync()),
+}
 
-            return SetChecksEnabled(False)
 
-        elif command_name == "automerge+":
-            if len(args) != 0:
-                raise CommandParseError("Unexpected arguments for command")
-
-            return SetAutomerge(True)
-
-        elif command_name == "automerge-":
-            if len(args) != 0:
-                raise CommandParseError("Unexpected arguments for command")
-
-            return SetAutomerge(False)
-
-        elif command_name == "lock+":
-            if len(args) > 0:
-                return SetLocked(True, comment=" ".join(args))
-            else:
-                return SetLocked(True, comment=None)
-
-        elif command_name == "lock-":
-            if len(args) > 0:
-                return SetLocked(False, comment=" ".join(args))
-            else:
-                return SetLocked(False, comment=None)
-
-        elif command_name == "r+":
-            if len(args) == 0:
-                raise CommandParseError("Missing reviewers to set")
-
-            return AssignReviewers(args)
-
-        elif command_name == "r-":
-            if len(args) == 0:
-                raise CommandParseError("Missing reviewers to unset")
+class CommandParser:
+    _prefix: str
 
-            return UnassignReviewers(args)
+    def __init__(self) -> None:
+        self._prefix = f"{get_global_settings().bot_nickname} "
 
-        elif command_name == "strategy+":
-            if len(args) > 1:
-                raise CommandParseError("Unexpected arguments for command")
+    def parse(self, command: str) -> BaseCommand | None:
+        # Most lines are not commands, reject them before splitting anything
+        if not command.startswith(self._prefix):
+            return None
 
-            try:
-                strategy_arg = args[0]
-                strategy = MergeStrategy(strategy_arg)
-                return SetStrategy(strategy)
-            except IndexError:
-                raise CommandParseError("Missing strategy name")
-            except ValueError:
-                raise CommandParseError(f"Invalid merge strategy: {strategy_arg}")
+        command_name, *args = command[len(self._prefix) :].split(" ")
 
-        elif command_name == "strategy?":
-            if len(args) != 0:
-                raise CommandParseError("Unexpected arguments for command")
+        spec = COMMANDS.get(command_name)
+        if spec is None:
+            raise CommandParseError(f'Unknown command "{command_name}"')
 
-            return SetStrategy(None)
+        if len(args) < spec.min_args:
+            raise CommandParseError(spec.missing_args_message)
+        if spec.max_args is not None and len(args) > spec.max_args:
+            raise CommandParseError("Unexpected arguments for command")
 
-        elif command_name == "merge":
-            if len(args) == 0:
-                return Merge(None)
+        return spec.build(args)
 
-            if len(args) > 1:
-                raise CommandParseError("Unexpected arguments for command")
+    def parse_body(
+        self, body: str
+    ) -> list[tuple[str, BaseCommand | CommandParseError]]:
+        """Parse the commands of a comment, keeping parsing errors in line order."""
+        if self._prefix not in body:
+            return []
 
+        commands: list[tuple[str, BaseCommand | CommandParseError]] = []
+        for line in body.splitlines():
             try:
-                strategy = MergeStrategy(args[0])
-                return Merge(strategy)
-            except ValueError:
-                raise CommandParseError(f"Invalid merge strategy: {args[0]}")
+                command = self.parse(line)
+            except CommandParseError as err:
+                commands.append((line, err))
+                continue
 
-        elif command_name == "labels+":
-            if len(args) == 0:
-                raise CommandParseError("Missing labels to set")
+            if command is not None:
+                commands.append((line, command))
 
-            return AssignLabels(args)
+        return commands
 
-        elif command_name == "labels-":
-            if len(args) == 0:
-                raise CommandParseError("Missing labels to unset")
 
-            return UnassignLabels(args)
-
-        elif command_name == "ping":
-            if len(args) > 0:
-                raise CommandParseError("Unexpected arguments for command")
-
-            return Ping()
-
-        elif command_name == "gif":
-            if len(args) == 0:
-                raise CommandParseError("Missing GIF query")
+class CommandProcessor(ABC):
+    @abstractmethod
+    async def process(
+        self,
+        *,
+        owner: str,
+        name: str,
+        number: int,
+        author: str,
+        body: str,
+        comment_id: int | None = None,
+    ) -> CommandOutput:
+        """
+        Run the commands found in the lines of a comment.
 
-            return Gif(" ".join(args))
+        Commands run in order, and the comment gets a single reaction
+        and a single reply, even when some of them fail.
+        """
 
-        elif command_name == "sync":
-            if len(args) > 0:
-                raise CommandParseError("Unexpected arguments for command")
+    @abstractmethod
+    async def apply(
+        self,
+        *,
+        owner: str,
+        name: str,
+        number: int,
+        author: str,
+        body: str,
+        comment_id: int | None = None,
+    ) -> CommandBatch:
+        """Run the commands found in the lines of a comment, without replying yet."""
 
-            return Sync()
 
-        else:
-            raise CommandParseError(f'Unknown command "{command_name}"')
+class CommandProcessorImplementation(CommandProcessor):
+    _parser: CommandParser
 
+    def __init__(self) -> None:
+        self._parser = CommandParser()
 
-class CommandProcessor(ABC):
-    @abstractmethod
     async def process(
         self,
         *,
@@ -195,41 +208,67 @@ class CommandProcessor(ABC):
         name: str,
         number: int,
         author: str,
-        command: str,
+        body: str,
         comment_id: int | None = None,
-    ) -> CommandOutput: ...
+    ) -> CommandOutput:
+        batch = await self.apply(
+            owner=owner,
+            name=name,
+            number=number,
+            author=author,
+            body=body,
+            comment_id=comment_id,
+        )
+        await batch.reply()
 
+        return CommandOutput(needs_sync=batch.needs_sync)
 
-class CommandProcessorImplementation(CommandProcessor):
-    async def process(
+    async def apply(
         self,
         *,
         owner: str,
         name: str,
         number: int,
         author: str,
-        command: str,
+        body: str,
         comment_id: int | None = None,
-    ) -> CommandOutput:
+    ) -> CommandBatch:
+        commands = self._parser.parse_body(body)
+        if len(commands) == 0:
+            return CommandBatch(needs_sync=False, ctx=None)
+
         ctx = CommandContext(
             owner=owner,
             name=name,
             number=number,
             author=author,
-            command=command,
+            command=None,
             comment_id=comment_id,
         )
 
-        try:
-            parsed_command = CommandParser().parse(command)
-            if parsed_command:
-                logger.info("Command detected", command=parsed_command)
-                return await parsed_command.process(ctx)
-        except CommandParseError as err:
-            await ctx.add_reaction(GhReactionType.Confused)
-            await ctx.respond_to_author(str(err))
-        except CommandExecutionError as err:
-            await ctx.add_reaction(GhReactionType.Confused)
-            await ctx.respond_to_author(str(err))
-
-        return CommandOutput(needs_sync=False)
+        # Commands are not run in a transaction: they call GitHub, and each of
+        # their database writes is a single statement.
+        needs_sync = False
+        for line, command in commands:
+            ctx.command = line
+
+            try:
+                if isinstance(command, CommandParseError):
+                    raise command
+
+                logger.info("Command detected", command=command)
+                output = await command.process(ctx)
+            except (CommandParseError, CommandExecutionError) as err:
+                await ctx.add_reaction(GhReactionType.Confused)
+                await ctx.respond_to_author(str(err))
+                continue
+            except Exception:
+                # Previous commands are applied, so keep going and reply for all
+                logger.exception("Unexpected command error", command=command)
+                await ctx.add_reaction(GhReactionType.Confused)
+                await ctx.respond_to_author(UNEXPECTED_ERROR_MESSAGE)
+                continue
+
+            needs_sync |= output.needs_sync
+
+        return CommandBatch(needs_sync=needs_sync, ctx=ctx)
@@ -1,10 +1,15 @@
 import enum
+import fnmatch
 import json
 import re
 from abc import ABC, abstractmethod
-from typing import Any, Self
+from datetime import datetime
+from typing import Annotated, Any, Literal, Self
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, computed_field, field_validator
+
+from prbot.core.step.models import StepLabel
+from prbot.modules.github.models import GhPullRequest, GhReviewDecision
 
 
 class RepositoryPath(BaseModel):
@@ -52,29 +57,92 @@ class MergeStrategy(enum.StrEnum):
 class RuleBranchType(enum.StrEnum):
     Named = "named"
     Wildcard = "wildcard"
+    Glob = "glob"
+    Regex = "regex"
 
 
 class RuleBranchBase(ABC, BaseModel):
     @abstractmethod
     def get_name(self) -> str: ...
 
+    @abstractmethod
+    def matches(self, branch: str) -> bool: ...
+
 
 class NamedRuleBranch(RuleBranchBase):
-    type: RuleBranchType = RuleBranchType.Named
+    type: Literal[RuleBranchType.Named] = RuleBranchType.Named
     value: str
 
     def get_name(self) -> str:
         return self.value
 
+    def matches(self, branch: str) -> bool:
+        return branch == self.value
+
 
 class WildcardRuleBranch(RuleBranchBase):
-    type: RuleBranchType = RuleBranchType.Wildcard
+    type: Literal[RuleBranchType.Wildcard] = RuleBranchType.Wildcard
 
     def get_name(self) -> str:
         return "*"
 
+    def matches(self, branch: str) -> bool:
+        return True
+
+
+class GlobRuleBranch(RuleBranchBase):
+    """Shell-like pattern, where `*` matches any characters, including `/`."""
+
+    type: Literal[RuleBranchType.Glob] = RuleBranchType.Glob
+    value: str
+
+    def get_name(self) -> str:
+        return self.value
+
+    def matches(self, branch: str) -> bool:
+        return self.compile().fullmatch(branch) is not None
+
+    def literal_prefix(self) -> str:
+        for index, char in enumerate(self.value):
+            if char in GLOB_CHARACTERS:
+                return self.value[:index]
+        return self.value
 
-RuleBranch = NamedRuleBranch | WildcardRuleBranch
+    def compile(self) -> re.Pattern[str]:
+        return re.compile(fnmatch.translate(self.value))
+
+
+class RegexRuleBranch(RuleBranchBase):
+    type: Literal[RuleBranchType.Regex] = RuleBranchType.Regex
+    value: str
+
+    @field_validator("value")
+    @classmethod
+    def validate_pattern(cls, value: str) -> str:
+        try:
+            re.compile(value)
+        except re.error as exc:
+            raise ValueError(f"Invalid branch regex: {exc}") from exc
+        return value
+
+    def get_name(self) -> str:
+        return f"{REGEX_BRANCH_PREFIX}{self.value}"
+
+    def matches(self, branch: str) -> bool:
+        return self.compile().fullmatch(branch) is not None
+
+    def compile(self) -> re.Pattern[str]:
+        return re.compile(self.value)
+
+
+RuleBranch = Annotated[
+    NamedRuleBranch | WildcardRuleBranch | GlobRuleBranch | RegexRuleBranch,
+    Field(discriminator="type"),
+]
+
+# Characters which cannot be part of a git branch name
+GLOB_CHARACTERS = "*?["
+REGEX_BRANCH_PREFIX = "re:"
 
 
 class RuleBranchFactory:
@@ -82,6 +150,10 @@ class RuleBranchFactory:
     def from_str(value: str) -> RuleBranch:
         if value == "*":
             return WildcardRuleBranch()
+        elif value.startswith(REGEX_BRANCH_PREFIX):
+            return RegexRuleBranch(value=value.removeprefix(REGEX_BRANCH_PREFIX))
+        elif any(char in value for char in GLOB_CHARACTERS):
+            return GlobRuleBranch(value=value)
         else:
             return NamedRuleBranch(value=value)
 
@@ -187,8 +259,15 @@ class RuleActionFactory:
 
     @staticmethod
     def from_str_many(value: str) -> list[RuleAction]:
-        json_data = json.loads(value)
-        return [RuleActionFactory.from_dict(entry) for entry in json_data]
+        return RuleActionFactory.from_list_many(json.loads(value))
+
+    @staticmethod
+    def from_list_many(value: list[dict[str, Any]]) -> list[RuleAction]:
+        return [RuleActionFactory.from_dict(entry) for entry in value]
+
+    @staticmethod
+    def many_to_list(actions: list[RuleAction]) -> list[dict[str, Any]]:
+        return [action.model_dump() for action in actions]
 
     @staticmethod
     def many_to_str(actions: list[RuleAction]) -> str:
@@ -213,8 +292,15 @@ class RuleConditionFactory:
 
     @staticmethod
     def from_str_many(value: str) -> list[RuleCondition]:
-        json_data = json.loads(value)
-        return [RuleConditionFactory.from_dict(entry) for entry in json_data]
+        return RuleConditionFactory.from_list_many(json.loads(value))
+
+    @staticmethod
+    def from_list_many(value: list[dict[str, Any]]) -> list[RuleCondition]:
+        return [RuleConditionFactory.from_dict(entry) for entry in value]
+
+    @staticmethod
+    def many_to_list(conditions: list[RuleCondition]) -> list[dict[str, Any]]:
+        return [condition.model_dump() for condition in conditions]
 
     @staticmethod
     def many_to_str(conditions: list[RuleCondition]) -> str:
@@ -237,3 +323,55 @@ class PullRequest(BaseModel):
     automerge: bool = False
     locked: bool = False
     strategy_override: MergeStrategy | None = None
+
+
+class PullRequestState(BaseModel):
+    """Last state computed when synchronizing a pull request."""
+
+    repository_path: RepositoryPath
+    number: int
+    step_label: StepLabel
+    check_status: CheckStatus
+    qa_status: QaStatus
+    review_decision: GhReviewDecision | None
+    mergeable: bool
+    merged: bool
+    head_sha: str
+    updated_at: datetime
+
+
+class PullRequestSnapshot(BaseModel):
+    """Last known upstream data of a pull request, from webhooks or the API."""
+
+    repository_path: RepositoryPath
+    pull_request: GhPullRequest
+    stored_at: datetime
+
+
+class QaStatusJobItemStatus(enum.StrEnum):
+    Pending = "pending"
+    Done = "done"
+    Failed = "failed"
+
+
+class QaStatusJobItem(BaseModel):
+    number: int
+    status: QaStatusJobItemStatus
+    error: str | None = None
+
+
+class QaStatusJob(BaseModel):
+    """QA status change requested by an external account, synced in the background."""
+
+    id: str
+    repository_path: RepositoryPath
+    qa_status: QaStatus
+    author: str
+    username: str
+    created_at: datetime
+    items: list[QaStatusJobItem]
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def done(self) -> bool:
+        return all(item.status != QaStatusJobItemStatus.Pending for item in self.items)
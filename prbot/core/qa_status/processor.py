@@ -0,0 +1,224 @@
+import asyncio
+import datetime
+import uuid
+from abc import ABC, abstractmethod
+
+import structlog
+
+from prbot.config.settings import get_global_settings
+from prbot.core.commands.commands import CommandContext, SetQa
+from prbot.core.models import (
+    QaStatus,
+    QaStatusJob,
+    QaStatusJobItem,
+    QaStatusJobItemStatus,
+    RepositoryPath,
+)
+from prbot.core.sync.processor import SyncProcessor
+from prbot.injection import inject_instance
+from prbot.modules.database.repository import (
+    PullRequestDatabase,
+    QaStatusJobDatabase,
+    UnknownPullRequest,
+)
+
+logger = structlog.get_logger()
+
+HEARTBEAT_INTERVAL_SECONDS = 10.0
+# Leave room for a few missed heartbeats before failing a job
+ABANDONED_AFTER_SECONDS = 60.0
+ABANDONED_ITEM_ERROR = "The worker running the job stopped before syncing."
+
+
+class QaStatusProcessor(ABC):
+    @abstractmethod
+    async def start(
+        self,
+        *,
+        owner: str,
+        name: str,
+        numbers: list[int],
+        qa_status: QaStatus,
+        author: str,
+        username: str,
+    ) -> QaStatusJob:
+        """
+        Set the QA status of pull requests at once, then reply and sync
+        each of them in the background.
+
+        Returns the stored job, which is updated as pull requests are synced.
+        """
+
+    @abstractmethod
+    async def join(self) -> None:
+        """Wait for the jobs started by this process."""
+
+    @abstractmethod
+    async def fail_abandoned(self) -> int:
+        """
+        Fail the pending items of jobs whose worker stopped, e.g. on a
+        restart, returning how many items were failed.
+        """
+
+    @abstractmethod
+    async def run_heartbeat_loop(self) -> None:
+        """
+        Record that the jobs of this process are alive and fail abandoned
+        ones periodically, until cancelled.
+        """
+
+
+class QaStatusProcessorImplementation(QaStatusProcessor):
+    _pull_request_db: PullRequestDatabase
+    _job_db: QaStatusJobDatabase
+    _sync_processor: SyncProcessor
+    # Shared by all jobs, so that concurrent requests do not add up
+    _semaphore: asyncio.Semaphore
+    # Keep a reference to running jobs, so they are not garbage collected
+    _tasks: set[asyncio.Task[None]]
+    _running_job_ids: set[str]
+
+    def __init__(self) -> None:
+        self._pull_request_db = inject_instance(PullRequestDatabase)
+        self._job_db = inject_instance(QaStatusJobDatabase)
+        self._sync_processor = inject_instance(SyncProcessor)
+        self._semaphore = asyncio.Semaphore(
+            get_global_settings().qa_status_job_concurrency
+        )
+        self._tasks = set()
+        self._running_job_ids = set()
+
+    async def start(
+        self,
+        *,
+        owner: str,
+        name: str,
+        numbers: list[int],
+        qa_status: QaStatus,
+        author: str,
+        username: str,
+    ) -> QaStatusJob:
+        numbers = list(dict.fromkeys(numbers))
+        updated = set(
+            await self._pull_request_db.set_qa_status_many(
+                owner=owner, name=name, numbers=numbers, qa_status=qa_status
+            )
+        )
+
+        items = []
+        for number in numbers:
+            if number in updated:
+                items.append(
+                    QaStatusJobItem(number=number, status=QaStatusJobItemStatus.Pending)
+                )
+            else:
+                items.append(
+                    QaStatusJobItem(
+                        number=number,
+                        status=QaStatusJobItemStatus.Failed,
+                        error=str(
+                            UnknownPullRequest(owner=owner, name=name, number=number)
+                        ),
+                    )
+                )
+
+        job = await self._job_db.create(
+            QaStatusJob(
+                id=str(uuid.uuid4()),
+                repository_path=RepositoryPath(owner=owner, name=name),
+                qa_status=qa_status,
+                author=author,
+                username=username,
+                created_at=datetime.datetime.now(datetime.timezone.utc),
+                items=items,
+            )
+        )
+
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def join(self) -> None:
+        if len(self._tasks) > 0:
+            await asyncio.wait(set(self._tasks))
+
+    async def fail_abandoned(self) -> int:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return await self._job_db.fail_abandoned(
+            heartbeat_before=now - datetime.timedelta(seconds=ABANDONED_AFTER_SECONDS),
+            error=ABANDONED_ITEM_ERROR,
+        )
+
+    async def run_heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL_SECONDS)
+
+            try:
+                if len(self._running_job_ids) > 0:
+                    await self._job_db.heartbeat(
+                        job_ids=list(self._running_job_ids),
+                        at=datetime.datetime.now(datetime.timezone.utc),
+                    )
+                await self.fail_abandoned()
+            except Exception:
+                logger.warning(
+                    "Could not record QA status job heartbeat", exc_info=True
+                )
+
+    async def _run(self, job: QaStatusJob) -> None:
+        logger.info("Running QA status job", job_id=job.id, qa_status=job.qa_status)
+
+        self._running_job_ids.add(job.id)
+        try:
+            await asyncio.gather(
+                *(
+                    self._run_item(job, item.number)
+                    for item in job.items
+                    if item.status == QaStatusJobItemStatus.Pending
+                )
+            )
+        finally:
+            self._running_job_ids.discard(job.id)
+
+        logger.info("QA status job done", job_id=job.id)
+
+    async def _run_item(self, job: QaStatusJob, number: int) -> None:
+        owner = job.repository_path.owner
+        name = job.repository_path.name
+
+        async with self._semaphore:
+            try:
+                ctx = CommandContext(
+                    owner=owner,
+                    name=name,
+                    number=number,
+                    author=job.author,
+                    command=None,
+                    comment_id=None,
+                )
+                await ctx.respond_to_author(SetQa(job.qa_status).message(job.author))
+                await ctx.flush()
+
+                await self._sync_processor.process(
+                    owner=owner, name=name, number=number, force_creation=False
+                )
+            except Exception as err:
+                logger.exception(
+                    "Could not sync pull request of QA status job",
+                    job_id=job.id,
+                    owner=owner,
+                    name=name,
+                    number=number,
+                )
+                await self._job_db.set_item_status(
+                    job_id=job.id,
+                    number=number,
+                    status=QaStatusJobItemStatus.Failed,
+                    error=str(err),
+                )
+                return
+
+        await self._job_db.set_item_status(
+            job_id=job.id, number=number, status=QaStatusJobItemStatus.Done
+        )
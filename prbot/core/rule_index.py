@@ -0,0 +1,306 @@
+import re
+from typing import NamedTuple
+
+from prbot.core.models import (
+    GlobRuleBranch,
+    MergeRule,
+    NamedRuleBranch,
+    RegexRuleBranch,
+    RepositoryRule,
+    RuleBranch,
+    RuleCondition,
+    RuleConditionAuthor,
+    RuleConditionBaseBranch,
+    RuleConditionHeadBranch,
+)
+
+Specificity = tuple[int, int]
+
+
+def branch_specificity(branch: RuleBranch) -> Specificity:
+    """Exact names first, then globs with the longest literal prefix, then regexes."""
+
+    if isinstance(branch, NamedRuleBranch):
+        return (3, len(branch.value))
+    elif isinstance(branch, GlobRuleBranch):
+        return (2, len(branch.literal_prefix()))
+    elif isinstance(branch, RegexRuleBranch):
+        return (1, 0)
+    else:
+        return (0, 0)
+
+
+class IndexedConditions(NamedTuple):
+    author: str | None
+    base_branch: RuleBranch | None
+    head_branch: RuleBranch | None
+    # Conditions which are not indexed, checked on match
+    extra: list[RuleCondition]
+
+
+def split_conditions(conditions: list[RuleCondition]) -> IndexedConditions:
+    """Split the first condition of each kind, used as index keys, from the others."""
+
+    author: str | None = None
+    base_branch: RuleBranch | None = None
+    head_branch: RuleBranch | None = None
+    extra = []
+    for condition in conditions:
+        if isinstance(condition, RuleConditionAuthor) and author is None:
+            author = condition.value
+        elif isinstance(condition, RuleConditionBaseBranch) and base_branch is None:
+            base_branch = condition.value
+        elif isinstance(condition, RuleConditionHeadBranch) and head_branch is None:
+            head_branch = condition.value
+        else:
+            extra.append(condition)
+
+    return IndexedConditions(
+        author=author, base_branch=base_branch, head_branch=head_branch, extra=extra
+    )
+
+
+def exact_branch_name(branch: RuleBranch | None) -> str | None:
+    """Get the branch name matched by a named branch, or None for patterns."""
+
+    if isinstance(branch, NamedRuleBranch):
+        return branch.value
+    return None
+
+
+def _simplify_conditions(
+    conditions: list[RuleCondition],
+) -> list[RuleCondition] | None:
+    """
+    Drop the conditions implied by an exact value of the same kind, or
+    return None when conditions contradict each other, e.g. two different authors.
+    """
+
+    authors = [c for c in conditions if isinstance(c, RuleConditionAuthor)]
+    if len({c.value for c in authors}) > 1:
+        return None
+
+    simplified: list[RuleCondition] = list(authors[:1])
+    for kind in (RuleConditionBaseBranch, RuleConditionHeadBranch):
+        branches = [c for c in conditions if isinstance(c, kind)]
+        named = [c for c in branches if isinstance(c.value, NamedRuleBranch)]
+        if len(named) == 0:
+            simplified.extend(branches)
+            continue
+
+        name = named[0].value.get_name()
+        if not all(c.value.matches(name) for c in branches):
+            return None
+        simplified.append(named[0])
+
+    return simplified
+
+
+class _ConditionIndex:
+    """Rule positions by required value, plus positions matching any value."""
+
+    _by_value: dict[str, set[int]]
+    _any: set[int]
+
+    def __init__(self) -> None:
+        self._by_value = {}
+        self._any = set()
+
+    def add(self, position: int, value: str | None) -> None:
+        if value is None:
+            self._any.add(position)
+        else:
+            self._by_value.setdefault(value, set()).add(position)
+
+    def lookup(self, value: str) -> set[int]:
+        return self._any | self._by_value.get(value, set())
+
+
+class _TrieNode:
+    __slots__ = ("children", "patterns")
+
+    children: dict[str, "_TrieNode"]
+    patterns: list[tuple[int, re.Pattern[str]]]
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.patterns = []
+
+
+class BranchMatcher:
+    """
+    Positions of branch patterns matching a branch name.
+
+    Exact names are a dictionary lookup. Globs are stored in a trie by literal
+    prefix, so only the patterns sharing a prefix with the branch name are tested.
+    """
+
+    _named: _ConditionIndex
+    _patterns: _TrieNode
+
+    def __init__(self) -> None:
+        self._named = _ConditionIndex()
+        self._patterns = _TrieNode()
+
+    def add(self, position: int, branch: RuleBranch | None) -> None:
+        if branch is None:
+            self._named.add(position, None)
+        elif isinstance(branch, NamedRuleBranch):
+            self._named.add(position, branch.value)
+        elif isinstance(branch, GlobRuleBranch):
+            node = self._patterns
+            for char in branch.literal_prefix():
+                node = node.children.setdefault(char, _TrieNode())
+            node.patterns.append((position, branch.compile()))
+        elif isinstance(branch, RegexRuleBranch):
+            self._patterns.patterns.append((position, branch.compile()))
+        else:
+            self._named.add(position, None)
+
+    def lookup(self, branch: str) -> set[int]:
+        positions = self._named.lookup(branch)
+
+        # Walk down the trie, along the branch name
+        node = self._patterns
+        self._match_patterns(node, branch, positions)
+        for char in branch:
+            child = node.children.get(char)
+            if child is None:
+                break
+
+            node = child
+            self._match_patterns(node, branch, positions)
+
+        return positions
+
+    def _match_patterns(
+        self, node: _TrieNode, branch: str, positions: set[int]
+    ) -> None:
+        for position, pattern in node.patterns:
+            if position not in positions and pattern.fullmatch(branch):
+                positions.add(position)
+
+
+class RuleIndex:
+    """
+    Repository rules indexed by author, base branch and head branch.
+
+    A rule matches when all of its conditions match.
+    Rules without conditions or actions, or whose conditions contradict
+    each other, never match and are dropped when the index is built.
+    """
+
+    _rules: list[RepositoryRule]
+    _authors: _ConditionIndex
+    _base_branches: BranchMatcher
+    _head_branches: BranchMatcher
+    # Conditions which are not indexed, checked on match
+    _extra_conditions: dict[int, list[RuleCondition]]
+
+    def __init__(self, rules: list[RepositoryRule]) -> None:
+        self._rules = []
+        self._authors = _ConditionIndex()
+        self._base_branches = BranchMatcher()
+        self._head_branches = BranchMatcher()
+        self._extra_conditions = {}
+
+        for rule in rules:
+            self._add(rule)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def match(
+        self, *, author: str, base_branch: str, head_branch: str
+    ) -> list[RepositoryRule]:
+        positions = (
+            self._authors.lookup(author)
+            & self._base_branches.lookup(base_branch)
+            & self._head_branches.lookup(head_branch)
+        )
+
+        return [
+            self._rules[position]
+            for position in sorted(positions)
+            if all(
+                self._check_condition(
+                    condition,
+                    author=author,
+                    base_branch=base_branch,
+                    head_branch=head_branch,
+                )
+                for condition in self._extra_conditions.get(position, [])
+            )
+        ]
+
+    def _add(self, rule: RepositoryRule) -> None:
+        if len(rule.actions) == 0 or len(rule.conditions) == 0:
+            return
+
+        conditions = _simplify_conditions(rule.conditions)
+        if conditions is None:
+            return
+
+        position = len(self._rules)
+        self._rules.append(rule)
+
+        indexed = split_conditions(conditions)
+        self._authors.add(position, indexed.author)
+        self._base_branches.add(position, indexed.base_branch)
+        self._head_branches.add(position, indexed.head_branch)
+        if indexed.extra:
+            self._extra_conditions[position] = indexed.extra
+
+    def _check_condition(
+        self,
+        condition: RuleCondition,
+        *,
+        author: str,
+        base_branch: str,
+        head_branch: str,
+    ) -> bool:
+        if isinstance(condition, RuleConditionAuthor):
+            return condition.value == author
+        elif isinstance(condition, RuleConditionBaseBranch):
+            return condition.value.matches(base_branch)
+        else:
+            return condition.value.matches(head_branch)
+
+
+class MergeRuleIndex:
+    """
+    Merge rules indexed by base and head branch patterns.
+
+    When several rules match, the most specific one is returned,
+    then the first one in order.
+    """
+
+    _merge_rules: list[MergeRule]
+    _specificities: list[Specificity]
+    _base_branches: BranchMatcher
+    _head_branches: BranchMatcher
+
+    def __init__(self, merge_rules: list[MergeRule]) -> None:
+        self._merge_rules = list(merge_rules)
+        self._specificities = []
+        self._base_branches = BranchMatcher()
+        self._head_branches = BranchMatcher()
+
+        for position, merge_rule in enumerate(self._merge_rules):
+            base_rank, base_length = branch_specificity(merge_rule.base_branch)
+            head_rank, head_length = branch_specificity(merge_rule.head_branch)
+            self._specificities.append(
+                (base_rank + head_rank, base_length + head_length)
+            )
+            self._base_branches.add(position, merge_rule.base_branch)
+            self._head_branches.add(position, merge_rule.head_branch)
+
+    def match(self, *, base_branch: str, head_branch: str) -> MergeRule | None:
+        positions = self._base_branches.lookup(
+            base_branch
+        ) & self._head_branches.lookup(head_branch)
+        if len(positions) == 0:
+            return None
+
+        best = max(positions, key=lambda p: (self._specificities[p], -p))
+        return self._merge_rules[best]
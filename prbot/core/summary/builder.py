@@ -3,10 +3,14 @@ from prbot.core.message import generate_message_footer
 from prbot.core.models import CheckStatus, MergeStrategy, QaStatus, RepositoryRule
 from prbot.core.sync.sync_state import PullRequestSyncState
 
+# Hidden marker to find the summary comment back
+SUMMARY_MARKER = "<!-- prbot:summary -->"
+
 
 class SummaryBuilder:
     def build(self, *, sync_state: PullRequestSyncState) -> str:
         return (
+            f"{SUMMARY_MARKER}\n"
             f"_This is an auto-generated message summarizing this pull request._\n"
             f"\n"
             f"{self._generate_rules(sync_state=sync_state)}\n"
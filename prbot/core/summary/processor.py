@@ -1,25 +1,28 @@
+import time
+
 import structlog
 
 from prbot.core.sync.sync_state import PullRequestSyncState
 from prbot.injection import inject_instance
 from prbot.modules.database.repository import PullRequestDatabase
 from prbot.modules.github.client import GitHubClient
-from prbot.modules.lock import LockClient, LockException
 
-from .builder import SummaryBuilder
+from .builder import SUMMARY_MARKER, SummaryBuilder
 
 logger = structlog.get_logger()
 
+# While the summary comment is created, the status comment ID holds the negated
+# claim timestamp. Claims older than this are considered abandoned.
+SUMMARY_CLAIM_TIMEOUT_SECONDS = 60
+
 
 class SummaryProcessor:
     _api: GitHubClient
-    _lock: LockClient
     _pull_request_db: PullRequestDatabase
     _builder: SummaryBuilder
 
     def __init__(self) -> None:
         self._api = inject_instance(GitHubClient)
-        self._lock = inject_instance(LockClient)
         self._pull_request_db = inject_instance(PullRequestDatabase)
         self._builder = SummaryBuilder()
 
@@ -27,43 +30,98 @@ class SummaryProcessor:
         owner = sync_state.owner
         name = sync_state.name
         number = sync_state.number
+        status_comment_id = sync_state.status_comment_id
+
+        summary = self._builder.build(sync_state=sync_state)
 
-        if sync_state.status_comment_id > 0:
-            summary = self._builder.build(sync_state=sync_state)
+        if status_comment_id > 0:
             await self._api.issues().update_comment(
                 owner=owner,
                 name=name,
-                comment_id=sync_state.status_comment_id,
+                comment_id=status_comment_id,
                 message=summary,
             )
             return summary
 
-        else:
-            try:
-                async with self._lock.lock(f"summary.{owner}.{name}.{number}"):
-                    # Check if comment ID was filled in the meantime.
-                    updated_pr = await self._pull_request_db.get_or_raise(
-                        owner=owner, name=name, number=number
-                    )
-                    if updated_pr.status_comment_id > 0:
-                        return await self.process(sync_state=sync_state)
-
-                    summary = self._builder.build(sync_state=sync_state)
-                    comment_id = await self._api.issues().create_comment(
-                        owner=owner, name=name, number=number, message=summary
-                    )
-                    await self._pull_request_db.set_status_comment_id(
-                        owner=owner,
-                        name=name,
-                        number=number,
-                        status_comment_id=comment_id,
-                    )
-                    return summary
-
-            except LockException:
-                logger.error(
-                    "Could not obtain lock to create initial summary message. Skipping.",
-                    exc_info=True,
+        now = int(time.time())
+        if status_comment_id < 0 and now + status_comment_id < (
+            SUMMARY_CLAIM_TIMEOUT_SECONDS
+        ):
+            logger.info(
+                "Summary comment is being created by another sync. Skipping.",
+                owner=owner,
+                name=name,
+                number=number,
+            )
+            return None
+
+        claimed = await self._pull_request_db.compare_and_set_status_comment_id(
+            owner=owner,
+            name=name,
+            number=number,
+            expected=status_comment_id,
+            status_comment_id=-now,
+        )
+        if not claimed:
+            # Created or claimed since the sync state was built
+            updated_pr = await self._pull_request_db.get_or_raise(
+                owner=owner, name=name, number=number
+            )
+            return await self.process(
+                sync_state=sync_state.model_copy(
+                    update={"status_comment_id": updated_pr.status_comment_id}
                 )
+            )
+
+        try:
+            comment_id = await self._create_or_recover_comment(
+                sync_state=sync_state,
+                summary=summary,
+                # Only an abandoned claim may have created the comment
+                recover=status_comment_id < 0,
+            )
+        except Exception:
+            # Let the next sync try again right away
+            await self._pull_request_db.compare_and_set_status_comment_id(
+                owner=owner,
+                name=name,
+                number=number,
+                expected=-now,
+                status_comment_id=0,
+            )
+            raise
+
+        await self._pull_request_db.set_status_comment_id(
+            owner=owner, name=name, number=number, status_comment_id=comment_id
+        )
+        return summary
+
+    async def _create_or_recover_comment(
+        self, *, sync_state: PullRequestSyncState, summary: str, recover: bool
+    ) -> int:
+        owner = sync_state.owner
+        name = sync_state.name
+        number = sync_state.number
+
+        # An abandoned claim may have created the comment without storing its ID
+        comment_id = None
+        if recover:
+            comment_id = await self._api.issues().find_comment(
+                owner=owner, name=name, number=number, marker=SUMMARY_MARKER
+            )
+        if comment_id is None:
+            return await self._api.issues().create_comment(
+                owner=owner, name=name, number=number, message=summary
+            )
 
-                return None
+        logger.info(
+            "Recovering existing summary comment",
+            owner=owner,
+            name=name,
+            number=number,
+            comment_id=comment_id,
+        )
+        await self._api.issues().update_comment(
+            owner=owner, name=name, comment_id=comment_id, message=summary
+        )
+        return comment_id
@@ -1,3 +1,5 @@
+import asyncio
+import datetime
 import enum
 from abc import ABC, abstractmethod
 
@@ -5,12 +7,23 @@ import structlog
 from pydantic import BaseModel
 
 from prbot.core.commit_status.processor import CommitStatusProcessor
-from prbot.core.models import PullRequest, QaStatus, Repository, RepositoryPath
+from prbot.core.models import (
+    PullRequest,
+    PullRequestState,
+    QaStatus,
+    Repository,
+    RepositoryPath,
+)
 from prbot.core.step.models import StepLabel
 from prbot.core.step.processor import StepLabelProcessor
 from prbot.core.summary.processor import SummaryProcessor
 from prbot.injection import inject_instance
-from prbot.modules.database.repository import PullRequestDatabase, RepositoryDatabase
+from prbot.modules.database.config_cache import RepositoryConfigCache
+from prbot.modules.database.repository import (
+    PullRequestDatabase,
+    PullRequestStateDatabase,
+    RepositoryDatabase,
+)
 from prbot.modules.github.client import GitHubClient
 from prbot.modules.lock import LockClient, LockException
 
@@ -42,83 +55,236 @@ class SyncProcessorResultSkipped(SyncProcessorResult):
 class SyncProcessor(ABC):
     @abstractmethod
     async def process(
-        self, *, owner: str, name: str, number: int, force_creation: bool
+        self,
+        *,
+        owner: str,
+        name: str,
+        number: int,
+        force_creation: bool,
+        head_sha: str | None = None,
     ) -> SyncProcessorResult: ...
 
+    @abstractmethod
+    async def prepare(
+        self, *, owner: str, name: str, number: int, force_creation: bool
+    ) -> PullRequest | None:
+        """
+        Get the pull request to synchronize, creating it and its repository if needed.
+
+        Returns None when it should not be synchronized.
+        """
+
+
+class _SyncSuperseded(Exception):
+    pass
+
+
+class _SyncSlot:
+    """Execution slot of a pull request being synchronized in this process.
+
+    Requests arriving during a run are queued as waiters (the slot is dirty)
+    and answered by the next run, which starts once the current one ends.
+    """
+
+    waiters: list[asyncio.Future[SyncProcessorResult]]
+    force_creation: bool
+    running_head_sha: str | None
+    superseded: bool
+    # Keep a reference to the runs, so they are not garbage collected
+    task: asyncio.Task[None] | None
+
+    def __init__(self) -> None:
+        self.waiters = []
+        self.force_creation = False
+        self.running_head_sha = None
+        self.superseded = False
+        self.task = None
+
+    @property
+    def dirty(self) -> bool:
+        return len(self.waiters) > 0
+
+    def request(
+        self, *, force_creation: bool, head_sha: str | None
+    ) -> asyncio.Future[SyncProcessorResult]:
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.force_creation |= force_creation
+
+        if (
+            head_sha is not None
+            and self.running_head_sha is not None
+            and head_sha != self.running_head_sha
+        ):
+            self.superseded = True
+
+        return waiter
+
+    def start_run(self) -> tuple[list[asyncio.Future[SyncProcessorResult]], bool]:
+        waiters, force_creation = self.waiters, self.force_creation
+        self.waiters, self.force_creation = [], False
+        self.running_head_sha = None
+        self.superseded = False
+        return waiters, force_creation
+
+    def requeue(
+        self, waiters: list[asyncio.Future[SyncProcessorResult]], force_creation: bool
+    ) -> None:
+        self.waiters = waiters + self.waiters
+        self.force_creation |= force_creation
+
+    def checkpoint(self) -> None:
+        if self.superseded:
+            raise _SyncSuperseded()
+
 
 class SyncProcessorImplementation(SyncProcessor):
     _api: GitHubClient
     _lock: LockClient
     _repository_db: RepositoryDatabase
+    _repository_config_cache: RepositoryConfigCache
     _pull_request_db: PullRequestDatabase
+    _pull_request_state_db: PullRequestStateDatabase
     _sync_state_builder: PullRequestSyncStateBuilder
+    _slots: dict[tuple[str, str, int], _SyncSlot]
 
     def __init__(self) -> None:
         self._api = inject_instance(GitHubClient)
         self._lock = inject_instance(LockClient)
         self._repository_db = inject_instance(RepositoryDatabase)
+        self._repository_config_cache = inject_instance(RepositoryConfigCache)
         self._pull_request_db = inject_instance(PullRequestDatabase)
+        self._pull_request_state_db = inject_instance(PullRequestStateDatabase)
         self._sync_state_builder = inject_instance(PullRequestSyncStateBuilder)
+        self._slots = {}
 
     async def process(
-        self, *, owner: str, name: str, number: int, force_creation: bool
+        self,
+        *,
+        owner: str,
+        name: str,
+        number: int,
+        force_creation: bool,
+        head_sha: str | None = None,
     ) -> SyncProcessorResult:
-        logger.info("Synchronizing pull request", owner=owner, name=name, number=number)
-        await self._api.setup_client_for_repository(owner=owner, name=name)
-
-        repository = await self._repository_db.get(owner=owner, name=name)
-        if repository is None:
-            upstream_repository = await self._api.repositories().get(
-                owner=owner, name=name
-            )
-            repository = Repository(
-                owner=upstream_repository.owner.login, name=upstream_repository.name
+        key = (owner, name, number)
+        slot = self._slots.get(key)
+        if slot is not None:
+            # Already running: the running task syncs again once done
+            logger.info(
+                "Pull request sync already running, marking as dirty",
+                owner=owner,
+                name=name,
+                number=number,
             )
-            repository = await self._repository_db.create(repository)
+            waiter = slot.request(force_creation=force_creation, head_sha=head_sha)
+            return await asyncio.shield(waiter)
 
-        pull_request = await self._pull_request_db.get(
-            owner=owner, name=name, number=number
-        )
-        if pull_request is None:
-            if repository.manual_interaction and not force_creation:
-                logger.info(
-                    "Not syncing pull request because of manual interaction settings",
-                    owner=owner,
-                    name=name,
-                    number=number,
-                )
-                return SyncProcessorResultSkipped()
+        slot = _SyncSlot()
+        self._slots[key] = slot
+        own_result = slot.request(force_creation=force_creation, head_sha=head_sha)
 
-            # Synchronize pull request
-            pull_request = PullRequest(
-                repository_path=RepositoryPath(
-                    owner=repository.owner, name=repository.name
-                ),
+        # Runs are not tied to this caller, so that cancelling it does not
+        # cancel the syncs other callers are waiting for. The first run takes
+        # its requests right away, later ones are answered by the next run.
+        waiters, run_force_creation = slot.start_run()
+        slot.task = asyncio.create_task(
+            self._run(
+                owner=owner,
+                name=name,
                 number=number,
-                automerge=repository.default_automerge,
-                checks_enabled=repository.default_enable_checks,
-                qa_status=QaStatus.Waiting
-                if repository.default_enable_qa
-                else QaStatus.Skipped,
+                slot=slot,
+                waiters=waiters,
+                force_creation=run_force_creation,
             )
-            pull_request = await self._pull_request_db.create(pull_request)
+        )
+        return await asyncio.shield(own_result)
+
+    async def _run(
+        self,
+        *,
+        owner: str,
+        name: str,
+        number: int,
+        slot: _SyncSlot,
+        waiters: list[asyncio.Future[SyncProcessorResult]],
+        force_creation: bool,
+    ) -> None:
+        try:
+            while True:
+                try:
+                    result = await self._sync(
+                        owner=owner,
+                        name=name,
+                        number=number,
+                        force_creation=force_creation,
+                        slot=slot,
+                    )
+                except _SyncSuperseded:
+                    logger.info(
+                        "Newer head SHA received, restarting pull request sync",
+                        owner=owner,
+                        name=name,
+                        number=number,
+                    )
+                    slot.requeue(waiters, force_creation)
+                except Exception as exc:
+                    for waiter in waiters:
+                        waiter.set_exception(exc)
+                except asyncio.CancelledError:
+                    for waiter in waiters:
+                        waiter.cancel()
+                    raise
+                else:
+                    for waiter in waiters:
+                        waiter.set_result(result)
+
+                if not slot.dirty:
+                    break
+                waiters, force_creation = slot.start_run()
+        finally:
+            del self._slots[(owner, name, number)]
+            for waiter in slot.waiters:
+                waiter.cancel()
+
+    async def _sync(
+        self,
+        *,
+        owner: str,
+        name: str,
+        number: int,
+        force_creation: bool,
+        slot: _SyncSlot,
+    ) -> SyncProcessorResult:
+        logger.info("Synchronizing pull request", owner=owner, name=name, number=number)
+
+        pull_request = await self.prepare(
+            owner=owner, name=name, number=number, force_creation=force_creation
+        )
+        if pull_request is None:
+            return SyncProcessorResultSkipped()
 
         # Generate sync state
         sync_state = await self._sync_state_builder.build(
             owner=owner, name=name, number=number
         )
+        slot.running_head_sha = sync_state.head_sha
+        slot.checkpoint()
 
         # Update PR commit status
         commit_status_processor = CommitStatusProcessor()
         await commit_status_processor.process(sync_state=sync_state)
+        slot.checkpoint()
 
         # Generate step label
         step_processor = StepLabelProcessor()
         step_label = await step_processor.process(sync_state=sync_state)
+        slot.checkpoint()
 
         # Update summary comment
         summary_processor = SummaryProcessor()
         summary = await summary_processor.process(sync_state=sync_state)
+        slot.checkpoint()
 
         # Handle automerge
         if (
@@ -128,14 +294,7 @@ class SyncProcessorImplementation(SyncProcessor):
         ):
             try:
                 async with self._lock.lock(f"automerge.{owner}.{name}.{number}"):
-                    await self._api.pull_requests().merge(
-                        owner=owner,
-                        name=name,
-                        number=number,
-                        strategy=sync_state.merge_strategy,
-                        commit_title=f"{sync_state.title} (#{number})",
-                        commit_message="",
-                    )
+                    await self._merge(sync_state=sync_state)
             except LockException:
                 logger.error(
                     "Could not obtain lock to merge pull request. Skipping.",
@@ -152,6 +311,90 @@ class SyncProcessorImplementation(SyncProcessor):
                     owner=owner, name=name, number=number, automerge=False
                 )
 
+        # Store the computed state, to query it without calling GitHub
+        await self._pull_request_state_db.create_or_update(
+            PullRequestState(
+                repository_path=pull_request.repository_path,
+                number=number,
+                step_label=step_label,
+                check_status=sync_state.check_status,
+                qa_status=sync_state.qa_status,
+                review_decision=sync_state.review_decision,
+                mergeable=sync_state.can_merge,
+                merged=sync_state.merged,
+                head_sha=sync_state.head_sha,
+                updated_at=datetime.datetime.now(datetime.timezone.utc),
+            )
+        )
+
         return SyncProcessorResultSuccess(
             sync_state=sync_state, step_label=step_label, summary=summary
         )
+
+    async def prepare(
+        self, *, owner: str, name: str, number: int, force_creation: bool
+    ) -> PullRequest | None:
+        await self._api.setup_client_for_repository(owner=owner, name=name)
+
+        config = await self._repository_config_cache.get(owner=owner, name=name)
+        if config is not None:
+            repository = config.repository
+        else:
+            upstream_repository = await self._api.repositories().get(
+                owner=owner, name=name
+            )
+            repository = Repository(
+                owner=upstream_repository.owner.login, name=upstream_repository.name
+            )
+            repository = await self._repository_db.create(repository)
+
+        pull_request = await self._pull_request_db.get(
+            owner=owner, name=name, number=number
+        )
+        if pull_request is None:
+            if repository.manual_interaction and not force_creation:
+                logger.info(
+                    "Not syncing pull request because of manual interaction settings",
+                    owner=owner,
+                    name=name,
+                    number=number,
+                )
+                return None
+
+            # Synchronize pull request
+            pull_request = PullRequest(
+                repository_path=RepositoryPath(
+                    owner=repository.owner, name=repository.name
+                ),
+                number=number,
+                automerge=repository.default_automerge,
+                checks_enabled=repository.default_enable_checks,
+                qa_status=QaStatus.Waiting
+                if repository.default_enable_qa
+                else QaStatus.Skipped,
+            )
+            pull_request = await self._pull_request_db.create(pull_request)
+
+        return pull_request
+
+    async def _merge(self, *, sync_state: PullRequestSyncState) -> None:
+        owner, name, number = sync_state.owner, sync_state.name, sync_state.number
+
+        # A concurrent sync may have merged it while waiting for the lock
+        upstream_pr = await self._api.pull_requests().get(
+            owner=owner, name=name, number=number
+        )
+        if upstream_pr.merged:
+            logger.info(
+                "Pull request already merged", owner=owner, name=name, number=number
+            )
+            return
+
+        await self._api.pull_requests().merge(
+            owner=owner,
+            name=name,
+            number=number,
+            strategy=sync_state.merge_strategy,
+            commit_title=f"{sync_state.title} (#{number})",
+            commit_message="",
+        )
@@ -1,33 +1,27 @@
+import datetime
 import re
 from abc import ABC, abstractmethod
-from typing import cast
+from typing import Any
 
 from pydantic import BaseModel
 
+from prbot.config.settings import get_global_settings
 from prbot.core.models import (
     CheckStatus,
     MergeStrategy,
-    NamedRuleBranch,
     PullRequest,
     QaStatus,
     RepositoryRule,
     RuleActionSetAutomerge,
     RuleActionSetChecksEnabled,
     RuleActionSetQaStatus,
-    RuleBranch,
-    RuleBranchFactory,
-    RuleBranchType,
-    RuleConditionAuthor,
-    RuleConditionBaseBranch,
-    RuleConditionHeadBranch,
-    RuleConditionType,
 )
 from prbot.injection import inject_instance
+from prbot.modules.database.config_cache import RepositoryConfig, RepositoryConfigCache
 from prbot.modules.database.repository import (
-    MergeRuleDatabase,
+    CheckRunDatabase,
     PullRequestDatabase,
-    RepositoryDatabase,
-    RepositoryRuleDatabase,
+    PullRequestSnapshotDatabase,
     UnknownPullRequest,
     UnknownRepository,
 )
@@ -101,24 +95,25 @@ class PullRequestSyncStateBuilder(ABC):
 
 class PullRequestSyncStateBuilderImplementation(PullRequestSyncStateBuilder):
     _api: GitHubClient
-    _repository_db: RepositoryDatabase
+    _repository_config_cache: RepositoryConfigCache
     _pull_request_db: PullRequestDatabase
-    _rule_db: RepositoryRuleDatabase
-    _merge_rule_db: MergeRuleDatabase
+    _snapshot_db: PullRequestSnapshotDatabase
+    _check_run_db: CheckRunDatabase
 
     def __init__(self) -> None:
         self._api = inject_instance(GitHubClient)
-        self._repository_db = inject_instance(RepositoryDatabase)
+        self._repository_config_cache = inject_instance(RepositoryConfigCache)
         self._pull_request_db = inject_instance(PullRequestDatabase)
-        self._rule_db = inject_instance(RepositoryRuleDatabase)
-        self._merge_rule_db = inject_instance(MergeRuleDatabase)
+        self._snapshot_db = inject_instance(PullRequestSnapshotDatabase)
+        self._check_run_db = inject_instance(CheckRunDatabase)
 
     async def build(
         self, *, owner: str, name: str, number: int
     ) -> PullRequestSyncState:
-        local_repository = await self._repository_db.get(owner=owner, name=name)
-        if local_repository is None:
+        config = await self._repository_config_cache.get(owner=owner, name=name)
+        if config is None:
             raise UnknownRepository(owner=owner, name=name)
+        local_repository = config.repository
 
         local_pr = await self._pull_request_db.get(
             owner=owner, name=name, number=number
@@ -126,14 +121,12 @@ class PullRequestSyncStateBuilderImplementation(PullRequestSyncStateBuilder):
         if local_pr is None:
             raise UnknownPullRequest(owner=owner, name=name, number=number)
 
-        upstream_pr = await self._api.pull_requests().get(
+        upstream_pr = await self._get_upstream_pull_request(
             owner=owner, name=name, number=number
         )
 
         # Rules
-        rules = await self._resolve_repository_rules(
-            owner=owner, name=name, upstream_pr=upstream_pr
-        )
+        rules = self._resolve_repository_rules(config=config, upstream_pr=upstream_pr)
 
         # Apply applicable rules
         local_pr = await self._apply_rules(
@@ -149,11 +142,10 @@ class PullRequestSyncStateBuilderImplementation(PullRequestSyncStateBuilder):
             check_result = CheckStatus.Skipped
 
         # Strategy
-        strategy = await self._get_merge_strategy(
-            owner=owner,
-            name=name,
-            base_branch=RuleBranchFactory.from_str(upstream_pr.base.ref),
-            head_branch=RuleBranchFactory.from_str(upstream_pr.head.ref),
+        strategy = self._get_merge_strategy(
+            config=config,
+            base_branch=upstream_pr.base.ref,
+            head_branch=upstream_pr.head.ref,
             local_pull_request=local_pr,
         )
 
@@ -188,6 +180,23 @@ class PullRequestSyncStateBuilderImplementation(PullRequestSyncStateBuilder):
             wip=upstream_pr.draft,
         )
 
+    async def _get_upstream_pull_request(
+        self, *, owner: str, name: str, number: int
+    ) -> GhPullRequest:
+        # Use the snapshot fed by webhooks, unless it is missing or too old
+        snapshot = await self._snapshot_db.get(owner=owner, name=name, number=number)
+        if snapshot is not None:
+            ttl = get_global_settings().github_pull_request_snapshot_ttl_seconds
+            age = datetime.datetime.now(datetime.timezone.utc) - snapshot.stored_at
+            if age.total_seconds() < ttl:
+                return snapshot.pull_request
+
+        upstream_pr = await self._api.pull_requests().get(
+            owner=owner, name=name, number=number
+        )
+        await self._snapshot_db.store(owner=owner, name=name, pull_request=upstream_pr)
+        return upstream_pr
+
     def _validate_pr_title(self, *, name: str, pattern: re.Pattern[str]) -> bool:
         return pattern.match(name) is not None
 
@@ -202,98 +211,54 @@ class PullRequestSyncStateBuilderImplementation(PullRequestSyncStateBuilder):
         pull_request: PullRequest,
         rules: list[RepositoryRule],
     ) -> PullRequest:
-        number = pull_request.number
-
-        needs_pr_update = False
+        changes: dict[str, Any] = {}
         for rule in rules:
             for action in rule.actions:
                 if isinstance(action, RuleActionSetAutomerge):
                     if pull_request.automerge != action.value:
-                        await self._pull_request_db.set_automerge(
-                            owner=owner,
-                            name=name,
-                            number=number,
-                            automerge=action.value,
-                        )
-                        needs_pr_update = True
+                        changes["automerge"] = action.value
 
                 elif isinstance(action, RuleActionSetQaStatus):
                     if pull_request.qa_status != action.value:
-                        await self._pull_request_db.set_qa_status(
-                            owner=owner,
-                            name=name,
-                            number=number,
-                            qa_status=action.value,
-                        )
-                        needs_pr_update = True
+                        changes["qa_status"] = action.value
 
                 elif isinstance(action, RuleActionSetChecksEnabled):
                     if pull_request.checks_enabled != action.value:
-                        await self._pull_request_db.set_checks_enabled(
-                            owner=owner, name=name, number=number, value=action.value
-                        )
-                        needs_pr_update = True
-
-        if needs_pr_update:
-            updated_pull_request = await self._pull_request_db.get(
-                owner=owner, name=name, number=number
-            )
-            assert updated_pull_request is not None
-            return updated_pull_request
+                        changes["checks_enabled"] = action.value
 
-        else:
+        if len(changes) == 0:
             # Nothing changed.
             return pull_request
 
-    async def _resolve_repository_rules(
-        self, *, owner: str, name: str, upstream_pr: GhPullRequest
+        # Write every rule action in one statement
+        return await self._pull_request_db.patch(
+            owner=owner, name=name, number=pull_request.number, **changes
+        )
+
+    def _resolve_repository_rules(
+        self, *, config: RepositoryConfig, upstream_pr: GhPullRequest
     ) -> list[RepositoryRule]:
-        output = []
-        rules = await self._rule_db.filter(owner=owner, name=name)
-        for rule in rules:
-            # Ignore rule without actions or conditions
-            if len(rule.actions) == 0 or len(rule.conditions) == 0:
-                continue
-
-            for condition in rule.conditions:
-                if condition.type == RuleConditionType.Author:
-                    author_condition = cast(RuleConditionAuthor, condition)
-                    if author_condition.value != upstream_pr.user.login:
-                        continue
-
-                elif condition.type == RuleConditionType.BaseBranch:
-                    base_condition = cast(RuleConditionBaseBranch, condition)
-                    if base_condition.value.type == RuleBranchType.Named:
-                        branch_name = cast(NamedRuleBranch, base_condition.value).value
-                        if branch_name != upstream_pr.base.ref:
-                            continue
-
-                elif condition.type == RuleConditionType.HeadBranch:
-                    head_condition = cast(RuleConditionHeadBranch, condition)
-                    if head_condition.value.type == RuleBranchType.Named:
-                        branch_name = cast(NamedRuleBranch, head_condition.value).value
-                        if branch_name != upstream_pr.head.ref:
-                            continue
-
-                output.append(rule)
-
-        return output
-
-    async def _get_merge_strategy(
+        # The cached index is matched in memory, without querying candidates
+        return config.rule_index.match(
+            author=upstream_pr.user.login,
+            base_branch=upstream_pr.base.ref,
+            head_branch=upstream_pr.head.ref,
+        )
+
+    def _get_merge_strategy(
         self,
         *,
-        owner: str,
-        name: str,
-        base_branch: RuleBranch,
-        head_branch: RuleBranch,
+        config: RepositoryConfig,
+        base_branch: str,
+        head_branch: str,
         local_pull_request: PullRequest,
     ) -> MergeStrategy:
         if local_pull_request.strategy_override is not None:
             return local_pull_request.strategy_override
 
         # Compute
-        merge_rule = await self._merge_rule_db.get(
-            owner=owner, name=name, base_branch=base_branch, head_branch=head_branch
+        merge_rule = config.match_merge_rule(
+            base_branch=base_branch, head_branch=head_branch
         )
 
         if merge_rule:
@@ -304,16 +269,27 @@ class PullRequestSyncStateBuilderImplementation(PullRequestSyncStateBuilder):
     async def _get_checks_result(
         self, *, owner: str, name: str, commit_sha: str
     ) -> CheckStatus:
-        upstream_checks = await self._api.check_runs().for_commit(
-            owner=owner, name=name, commit_sha=commit_sha
+        # Checks are kept up to date by webhooks, once listed
+        check_runs = await self._check_run_db.get_for_commit(
+            owner=owner,
+            name=name,
+            head_sha=commit_sha,
+            max_age_seconds=get_global_settings().github_check_runs_ttl_seconds,
         )
-        if len(upstream_checks) == 0:
+        if check_runs is None:
+            upstream_checks = await self._api.check_runs().for_commit(
+                owner=owner, name=name, commit_sha=commit_sha
+            )
+            check_runs = self._filter_last_check_runs(upstream_checks)
+            await self._check_run_db.store_listing(
+                owner=owner, name=name, head_sha=commit_sha, check_runs=check_runs
+            )
+
+        if len(check_runs) == 0:
             # No checks yet, wait.
             return CheckStatus.Waiting
 
-        # Filter and merge check runs
-        filtered = self._filter_last_check_runs(upstream_checks)
-        return self._merge_check_run_statuses(filtered)
+        return self._merge_check_run_statuses(check_runs)
 
     def _filter_last_check_runs(self, check_runs: list[GhCheckRun]) -> list[GhCheckRun]:
         last_check_runs: dict[str, GhCheckRun] = {}
@@ -2,6 +2,7 @@ import enum
 
 
 class GhEventType(enum.StrEnum):
+    CheckRun = "check_run"
     CheckSuite = "check_suite"
     IssueComment = "issue_comment"
     Ping = "ping"
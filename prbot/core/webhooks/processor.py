@@ -1,16 +1,23 @@
 from typing import Any
 
+from pydantic import BaseModel
 from sentry_sdk import set_tag
 from structlog import get_logger
 
+from prbot.core.commands.commands import CommandBatch
 from prbot.core.commands.processor import CommandProcessor
 from prbot.core.models import RepositoryPath
 from prbot.core.sync.processor import SyncProcessor
 from prbot.core.webhooks.models import GhEventType
 from prbot.injection import inject_instance
+from prbot.modules.database.repository import (
+    CheckRunDatabase,
+    PullRequestSnapshotDatabase,
+)
 from prbot.modules.github.client import GitHubClient
 from prbot.modules.github.models import GhPullRequestAction, GhRepository
 from prbot.modules.github.webhooks.models import (
+    GhCheckRunEvent,
     GhCheckSuiteEvent,
     GhIssueCommentEvent,
     GhPingEvent,
@@ -32,7 +39,7 @@ class EventProcessorBase:
 
 class PingEventProcessor(EventProcessorBase):
     async def process(self, event: GhPingEvent) -> None:
-        logger.info("Processing PingEvent...", payload=event)
+        logger.info("Processing PingEvent...", hook_id=event.hook_id, zen=event.zen)
 
 
 class PullRequestEventProcessor(EventProcessorBase):
@@ -40,21 +47,34 @@ class PullRequestEventProcessor(EventProcessorBase):
     _lock: LockClient
     _sync_processor: SyncProcessor
     _command_processor: CommandProcessor
+    _snapshot_db: PullRequestSnapshotDatabase
 
     def __init__(self) -> None:
         self._api = inject_instance(GitHubClient)
         self._lock = inject_instance(LockClient)
         self._sync_processor = inject_instance(SyncProcessor)
         self._command_processor = inject_instance(CommandProcessor)
+        self._snapshot_db = inject_instance(PullRequestSnapshotDatabase)
 
     async def process(self, event: GhPullRequestEvent) -> None:
-        logger.info("Processing PullRequestEvent", payload=event)
+        logger.info(
+            "Processing PullRequestEvent",
+            repository=event.repository.full_name,
+            number=event.number,
+            action=event.action,
+        )
         self._add_repository_tag_to_sentry(event.repository)
 
         await self._api.setup_client_for_repository(
             owner=event.repository.owner.login, name=event.repository.name
         )
 
+        await self._snapshot_db.store(
+            owner=event.repository.owner.login,
+            name=event.repository.name,
+            pull_request=event.pull_request,
+        )
+
         # Ignore sync on specific actions
         if event.action in [
             GhPullRequestAction.Assigned,
@@ -66,51 +86,79 @@ class PullRequestEventProcessor(EventProcessorBase):
 
         was_opened = event.action == GhPullRequestAction.Opened
 
+        # Apply the commands of the PR body first, so a single sync accounts for them
+        body_commands: CommandBatch | None = None
+        if was_opened and event.pull_request.body is not None:
+            pull_request = await self._sync_processor.prepare(
+                owner=event.repository.owner.login,
+                name=event.repository.name,
+                number=event.pull_request.number,
+                force_creation=True,
+            )
+            if pull_request is not None:
+                body_commands = await self._command_processor.apply(
+                    owner=event.repository.owner.login,
+                    name=event.repository.name,
+                    number=event.pull_request.number,
+                    author=event.pull_request.user.login,
+                    body=event.pull_request.body,
+                    comment_id=None,
+                )
+
         await self._sync_processor.process(
             owner=event.repository.owner.login,
             name=event.repository.name,
             number=event.pull_request.number,
             force_creation=was_opened,
+            head_sha=event.pull_request.head.sha,
         )
 
-        if was_opened:
-            # Handle commands in PR body
-            pr_body = event.pull_request.body
-            if pr_body is not None:
-                needs_sync = False
-
-                for line in pr_body.splitlines():
-                    output = await self._command_processor.process(
-                        owner=event.repository.owner.login,
-                        name=event.repository.name,
-                        number=event.pull_request.number,
-                        author=event.pull_request.user.login,
-                        command=line,
-                        comment_id=None,
-                    )
-
-                    if output.needs_sync:
-                        needs_sync = True
-
-                if needs_sync:
-                    await self._sync_processor.process(
-                        owner=event.repository.owner.login,
-                        name=event.repository.name,
-                        number=event.pull_request.number,
-                        force_creation=False,
-                    )
+        if body_commands is not None:
+            # Reply after the summary comment created by the sync
+            await body_commands.reply()
+
+
+class CheckRunEventProcessor(EventProcessorBase):
+    _check_run_db: CheckRunDatabase
+
+    def __init__(self) -> None:
+        self._check_run_db = inject_instance(CheckRunDatabase)
+
+    async def process(self, event: GhCheckRunEvent) -> None:
+        logger.info(
+            "Processing CheckRunEvent",
+            repository=event.repository.full_name,
+            check_name=event.check_run.name,
+            head_sha=event.check_run.head_sha,
+            action=event.action,
+        )
+        self._add_repository_tag_to_sentry(event.repository)
+
+        # Only keep listed checks up to date, the check suite completion triggers the sync
+        await self._check_run_db.store(
+            owner=event.repository.owner.login,
+            name=event.repository.name,
+            check_run=event.check_run,
+        )
 
 
 class CheckSuiteEventProcessor(EventProcessorBase):
     _api: GitHubClient
     _sync_processor: SyncProcessor
+    _snapshot_db: PullRequestSnapshotDatabase
 
     def __init__(self) -> None:
         self._api = inject_instance(GitHubClient)
         self._sync_processor = inject_instance(SyncProcessor)
+        self._snapshot_db = inject_instance(PullRequestSnapshotDatabase)
 
     async def process(self, event: GhCheckSuiteEvent) -> None:
-        logger.info("Processing CheckSuiteEvent", payload=event)
+        logger.info(
+            "Processing CheckSuiteEvent",
+            repository=event.repository.full_name,
+            pull_requests=[pr.number for pr in event.check_suite.pull_requests],
+            action=event.action,
+        )
         self._add_repository_tag_to_sentry(event.repository)
 
         await self._api.setup_client_for_repository(
@@ -118,6 +166,13 @@ class CheckSuiteEventProcessor(EventProcessorBase):
         )
 
         for pull_request in event.check_suite.pull_requests:
+            # A check suite for another commit means the snapshot missed a push
+            await self._snapshot_db.discard_outdated(
+                owner=event.repository.owner.login,
+                name=event.repository.name,
+                number=pull_request.number,
+                head_sha=pull_request.head.sha,
+            )
             await self._sync_processor.process(
                 owner=event.repository.owner.login,
                 name=event.repository.name,
@@ -137,30 +192,29 @@ class IssueCommentEventProcessor(EventProcessorBase):
         self._command_processor = inject_instance(CommandProcessor)
 
     async def process(self, event: GhIssueCommentEvent) -> None:
-        logger.info("Processing IssueCommentEvent", payload=event)
+        logger.info(
+            "Processing IssueCommentEvent",
+            repository=event.repository.full_name,
+            number=event.issue.number,
+            comment_id=event.comment.id,
+            action=event.action,
+        )
         self._add_repository_tag_to_sentry(event.repository)
 
         await self._api.setup_client_for_repository(
             owner=event.repository.owner.login, name=event.repository.name
         )
 
-        needs_sync = False
-
-        # Try to parse each line as a command
-        for line in event.comment.body.splitlines():
-            output = await self._command_processor.process(
-                owner=event.repository.owner.login,
-                name=event.repository.name,
-                number=event.issue.number,
-                author=event.comment.user.login,
-                command=line,
-                comment_id=event.comment.id,
-            )
-
-            if output.needs_sync:
-                needs_sync = True
+        output = await self._command_processor.process(
+            owner=event.repository.owner.login,
+            name=event.repository.name,
+            number=event.issue.number,
+            author=event.comment.user.login,
+            body=event.comment.body,
+            comment_id=event.comment.id,
+        )
 
-        if needs_sync:
+        if output.needs_sync:
             await self._sync_processor.process(
                 owner=event.repository.owner.login,
                 name=event.repository.name,
@@ -178,13 +232,21 @@ class ReviewEventProcessor(EventProcessorBase):
         self._sync_processor = inject_instance(SyncProcessor)
 
     async def process(self, event: GhReviewEvent) -> None:
-        logger.info("Processing ReviewEvent", payload=event)
+        logger.info(
+            "Processing ReviewEvent",
+            repository=event.repository.full_name,
+            number=event.pull_request.number,
+            reviewer=event.review.user.login,
+            action=event.action,
+        )
         self._add_repository_tag_to_sentry(event.repository)
 
         await self._api.setup_client_for_repository(
             owner=event.repository.owner.login, name=event.repository.name
         )
 
+        # Review events carry a reduced pull request (e.g. without `merged`),
+        # so they are not stored as a snapshot.
         await self._sync_processor.process(
             owner=event.repository.owner.login,
             name=event.repository.name,
@@ -193,25 +255,48 @@ class ReviewEventProcessor(EventProcessorBase):
         )
 
 
+WEBHOOK_EVENT_MODELS: dict[GhEventType, type[BaseModel]] = {
+    GhEventType.CheckRun: GhCheckRunEvent,
+    GhEventType.CheckSuite: GhCheckSuiteEvent,
+    GhEventType.IssueComment: GhIssueCommentEvent,
+    GhEventType.Ping: GhPingEvent,
+    GhEventType.PullRequest: GhPullRequestEvent,
+    GhEventType.PullRequestReview: GhReviewEvent,
+}
+
+
+def parse_webhook_event(event_type: GhEventType, body: bytes) -> BaseModel:
+    """
+    Validate a webhook payload straight from its JSON bytes.
+
+    Members which are not declared by the event model are skipped
+    while decoding, without building Python objects for them.
+    """
+
+    return WEBHOOK_EVENT_MODELS[event_type].model_validate_json(body)
+
+
 class EventProcessor:
     async def process_event(
         self, event_type: GhEventType, body: dict[str, Any]
     ) -> None:
-        if event_type == GhEventType.Ping:
-            await PingEventProcessor().process(GhPingEvent.model_validate(body))
-        elif event_type == GhEventType.CheckSuite:
-            await CheckSuiteEventProcessor().process(
-                GhCheckSuiteEvent.model_validate(body)
-            )
-        elif event_type == GhEventType.IssueComment:
-            await IssueCommentEventProcessor().process(
-                GhIssueCommentEvent.model_validate(body)
-            )
-        elif event_type == GhEventType.PullRequest:
-            await PullRequestEventProcessor().process(
-                GhPullRequestEvent.model_validate(body)
-            )
-        elif event_type == GhEventType.PullRequestReview:
-            await ReviewEventProcessor().process(GhReviewEvent.model_validate(body))
+        await self._dispatch(WEBHOOK_EVENT_MODELS[event_type].model_validate(body))
+
+    async def process_raw_event(self, event_type: GhEventType, body: bytes) -> None:
+        await self._dispatch(parse_webhook_event(event_type, body))
+
+    async def _dispatch(self, event: BaseModel) -> None:
+        if isinstance(event, GhPingEvent):
+            await PingEventProcessor().process(event)
+        elif isinstance(event, GhCheckRunEvent):
+            await CheckRunEventProcessor().process(event)
+        elif isinstance(event, GhCheckSuiteEvent):
+            await CheckSuiteEventProcessor().process(event)
+        elif isinstance(event, GhIssueCommentEvent):
+            await IssueCommentEventProcessor().process(event)
+        elif isinstance(event, GhPullRequestEvent):
+            await PullRequestEventProcessor().process(event)
+        elif isinstance(event, GhReviewEvent):
+            await ReviewEventProcessor().process(event)
         else:
             print("Unhandled event type.")
@@ -1,51 +1,91 @@
 import inject
 import structlog
 
+from prbot.config.settings import get_global_settings
 from prbot.core.commands.processor import (
     CommandProcessor,
     CommandProcessorImplementation,
 )
+from prbot.core.qa_status.processor import (
+    QaStatusProcessor,
+    QaStatusProcessorImplementation,
+)
 from prbot.core.sync.processor import SyncProcessor, SyncProcessorImplementation
 from prbot.core.sync.sync_state import (
     PullRequestSyncStateBuilder,
     PullRequestSyncStateBuilderImplementation,
 )
+from prbot.modules.cache import (
+    CacheClient,
+    CacheClientImplementation,
+    MemoryCacheClientImplementation,
+)
+from prbot.modules.database.config_cache import (
+    RepositoryConfigCache,
+    RepositoryConfigCacheImplementation,
+)
 from prbot.modules.database.implementations import (
+    CheckRunDatabaseImplementation,
     ExternalAccountDatabaseImplementation,
     ExternalAccountRightDatabaseImplementation,
     MergeRuleDatabaseImplementation,
     PullRequestDatabaseImplementation,
+    PullRequestSnapshotDatabaseImplementation,
+    PullRequestStateDatabaseImplementation,
+    QaStatusJobDatabaseImplementation,
     RepositoryDatabaseImplementation,
     RepositoryRuleDatabaseImplementation,
 )
 from prbot.modules.database.repository import (
+    CheckRunDatabase,
     ExternalAccountDatabase,
     ExternalAccountRightDatabase,
     MergeRuleDatabase,
     PullRequestDatabase,
+    PullRequestSnapshotDatabase,
+    PullRequestStateDatabase,
+    QaStatusJobDatabase,
     RepositoryDatabase,
     RepositoryRuleDatabase,
 )
 from prbot.modules.gif.client import GifClient, GifClientImplementation
 from prbot.modules.github.client import GitHubClient, GitHubClientImplementation
 from prbot.modules.http.client import HttpClientImplementation
-from prbot.modules.lock import LockClient, LockClientImplementation
+from prbot.modules.lock import (
+    LockClient,
+    LockClientImplementation,
+    MemoryLockClientImplementation,
+)
 
 logger = structlog.get_logger(__name__)
 
 
 def _setup_binder(binder: inject.Binder) -> None:
-    binder.bind(LockClient, LockClientImplementation())
+    if get_global_settings().uses_memory_lock():
+        binder.bind(LockClient, MemoryLockClientImplementation())
+        binder.bind(CacheClient, MemoryCacheClientImplementation())
+    else:
+        binder.bind(LockClient, LockClientImplementation())
+        binder.bind(CacheClient, CacheClientImplementation())
 
     # Database
     binder.bind(RepositoryDatabase, RepositoryDatabaseImplementation())
     binder.bind(PullRequestDatabase, PullRequestDatabaseImplementation())
+    binder.bind(PullRequestStateDatabase, PullRequestStateDatabaseImplementation())
+    binder.bind(
+        PullRequestSnapshotDatabase, PullRequestSnapshotDatabaseImplementation()
+    )
+    binder.bind(CheckRunDatabase, CheckRunDatabaseImplementation())
+    binder.bind(QaStatusJobDatabase, QaStatusJobDatabaseImplementation())
     binder.bind(MergeRuleDatabase, MergeRuleDatabaseImplementation())
     binder.bind(RepositoryRuleDatabase, RepositoryRuleDatabaseImplementation())
     binder.bind(ExternalAccountDatabase, ExternalAccountDatabaseImplementation())
     binder.bind(
         ExternalAccountRightDatabase, ExternalAccountRightDatabaseImplementation()
     )
+    binder.bind_to_constructor(
+        RepositoryConfigCache, lambda: RepositoryConfigCacheImplementation()
+    )
 
     # Modules
     binder.bind_to_constructor(
@@ -68,6 +108,10 @@ def _setup_binder(binder: inject.Binder) -> None:
         PullRequestSyncStateBuilder,
         lambda: PullRequestSyncStateBuilderImplementation(),
     )
+    binder.bind_to_constructor(
+        QaStatusProcessor,
+        lambda: QaStatusProcessorImplementation(),
+    )
 
 
 def setup_injections() -> None:
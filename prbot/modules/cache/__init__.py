@@ -0,0 +1,175 @@
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, TypeVar
+
+import structlog
+from redis.asyncio import Redis
+
+from prbot.config.settings import get_global_settings
+
+logger = structlog.get_logger()
+
+T = TypeVar("T")
+
+INVALIDATION_CHANNEL = "prbot:cache:invalidate"
+INVALIDATE_ALL = "*"
+# Bounds how long a stale value is served. Without Redis, changes made by the CLI
+# are only seen once entries expire. With it, an invalidation can be received
+# before the write is committed, and the old value loaded again.
+LOCAL_CACHE_TTL_SECONDS = 30.0
+
+
+class CacheClient(ABC):
+    @abstractmethod
+    async def aclose(self) -> None: ...
+
+    @abstractmethod
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[T]]) -> T:
+        """Get a value from the local cache, or load it on a miss."""
+
+    @abstractmethod
+    async def invalidate(self, key: str) -> None:
+        """Invalidate a key in this process, and broadcast it to other processes."""
+
+    @abstractmethod
+    async def invalidate_all(self) -> None: ...
+
+    @abstractmethod
+    async def listen(self) -> None:
+        """Apply invalidations broadcast by other processes, until cancelled."""
+
+
+class LocalCache:
+    """
+    Versioned in-memory cache.
+
+    Each invalidation bumps the key version, so a value loaded while
+    it was invalidated is not stored. Entries expire after `ttl` seconds if set.
+    """
+
+    _entries: dict[str, tuple[Any, float]]
+    _versions: dict[str, int]
+    _generation: int
+    _ttl: float | None
+
+    def __init__(self, ttl: float | None = None) -> None:
+        self._entries = {}
+        self._versions = {}
+        self._generation = 0
+        self._ttl = ttl
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[T]]) -> T:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]  # type: ignore[no-any-return]
+
+        version = self._version(key)
+        value = await loader()
+        if self._version(key) == version:
+            expires_at = math.inf if self._ttl is None else time.monotonic() + self._ttl
+            self._entries[key] = (value, expires_at)
+
+        return value
+
+    def invalidate(self, key: str) -> None:
+        if key == INVALIDATE_ALL:
+            self.clear()
+            return
+
+        self._versions[key] = self._versions.get(key, 0) + 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._versions.clear()
+        self._entries.clear()
+
+    def _version(self, key: str) -> tuple[int, int]:
+        return (self._generation, self._versions.get(key, 0))
+
+
+class CacheClientImplementation(CacheClient):
+    _client: Redis
+    _local: LocalCache
+    _listening: bool
+
+    def __init__(self) -> None:
+        settings = get_global_settings()
+        self._client = Redis.from_url(settings.lock_url)
+        self._local = LocalCache(ttl=LOCAL_CACHE_TTL_SECONDS)
+        self._listening = False
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[T]]) -> T:
+        # Without a listener, other processes' writes would never be seen.
+        if not self._listening:
+            return await loader()
+
+        return await self._local.get_or_load(key, loader)
+
+    async def invalidate(self, key: str) -> None:
+        self._local.invalidate(key)
+
+        try:
+            await self._client.publish(INVALIDATION_CHANNEL, key)
+        except Exception:
+            logger.warning(
+                "Could not broadcast cache invalidation", key=key, exc_info=True
+            )
+
+    async def invalidate_all(self) -> None:
+        await self.invalidate(INVALIDATE_ALL)
+
+    async def listen(self) -> None:
+        while True:
+            try:
+                await self._listen_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Cache invalidation listener failed", exc_info=True)
+            finally:
+                self._listening = False
+
+            await asyncio.sleep(1)
+
+    async def _listen_once(self) -> None:
+        async with self._client.pubsub(ignore_subscribe_messages=True) as pubsub:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+
+            # Invalidations may have been missed while not subscribed.
+            self._local.clear()
+            self._listening = True
+
+            async for message in pubsub.listen():
+                key = message["data"]
+                self._local.invalidate(key.decode() if isinstance(key, bytes) else key)
+
+
+class MemoryCacheClientImplementation(CacheClient):
+    """Cache of a single-process deployment, without invalidation broadcasts."""
+
+    _local: LocalCache
+
+    def __init__(self) -> None:
+        self._local = LocalCache(ttl=LOCAL_CACHE_TTL_SECONDS)
+
+    async def aclose(self) -> None:
+        pass
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[T]]) -> T:
+        return await self._local.get_or_load(key, loader)
+
+    async def invalidate(self, key: str) -> None:
+        self._local.invalidate(key)
+
+    async def invalidate_all(self) -> None:
+        self._local.clear()
+
+    async def listen(self) -> None:
+        # No other process to listen to
+        await asyncio.Event().wait()
@@ -0,0 +1,267 @@
+import time
+from typing import Any, Callable, Hashable, Iterable, TypeVar
+
+import structlog
+from pydantic import BaseModel
+from tortoise.models import Model
+
+from prbot.core.models import (
+    ExternalAccount,
+    ExternalAccountRight,
+    MergeRule,
+    PullRequest,
+    Repository,
+    RepositoryPath,
+    RepositoryRule,
+)
+
+from .implementations import REPOSITORY_RULE_VALUE_FIELDS, repository_rule_values
+from .models import (
+    ExternalAccountModel,
+    ExternalAccountRightModel,
+    MergeRuleModel,
+    PullRequestModel,
+    RepositoryModel,
+    RepositoryRuleModel,
+)
+from .queries import bulk_upsert
+from .repository import UnknownRepository
+
+logger = structlog.get_logger()
+
+ItemT = TypeVar("ItemT")
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class ImportReport(BaseModel):
+    rows: dict[str, int] = {}
+    duration_seconds: float = 0.0
+
+    @property
+    def total_rows(self) -> int:
+        return sum(self.rows.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.duration_seconds == 0:
+            return 0.0
+        return self.total_rows / self.duration_seconds
+
+
+class BulkImporter:
+    """
+    Upsert domain objects in batches, using multi-row inserts.
+
+    Repository IDs are resolved once, when the first dependent entity is imported,
+    so repositories must be imported first.
+    Transactions are left to the caller.
+    """
+
+    _batch_size: int
+    _repository_ids: dict[tuple[str, str], int] | None
+    _report: ImportReport
+    _start_time: float
+
+    def __init__(self, *, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        if batch_size < 1:
+            raise ValueError("Batch size should be at least 1")
+
+        self._batch_size = batch_size
+        self._repository_ids = None
+        self._report = ImportReport()
+        self._start_time = time.perf_counter()
+
+    def report(self) -> ImportReport:
+        self._report.duration_seconds = time.perf_counter() - self._start_time
+        return self._report
+
+    async def import_repositories(self, repositories: Iterable[Repository]) -> None:
+        await self._import(
+            "repositories",
+            repositories,
+            key=lambda r: (r.owner, r.name),
+            to_values=lambda r: dict(
+                owner=r.owner,
+                name=r.name,
+                manual_interaction=r.manual_interaction,
+                pr_title_validation_regex=r.pr_title_validation_regex.pattern,
+                default_strategy=r.default_strategy.value,
+                default_automerge=r.default_automerge,
+                default_enable_qa=r.default_enable_qa,
+                default_enable_checks=r.default_enable_checks,
+            ),
+            model=RepositoryModel,
+            conflict_fields=["name", "owner"],
+            update_fields=[
+                "manual_interaction",
+                "pr_title_validation_regex",
+                "default_strategy",
+                "default_automerge",
+                "default_enable_qa",
+                "default_enable_checks",
+            ],
+        )
+
+        # Newly imported repositories are not known yet.
+        self._repository_ids = None
+
+    async def import_pull_requests(self, pull_requests: Iterable[PullRequest]) -> None:
+        repository_ids = await self._get_repository_ids()
+        await self._import(
+            "pull_requests",
+            pull_requests,
+            key=lambda p: (p.repository_path.owner, p.repository_path.name, p.number),
+            to_values=lambda p: dict(
+                repository_id=self._resolve(repository_ids, p.repository_path),
+                number=p.number,
+                qa_status=p.qa_status.value,
+                status_comment_id=p.status_comment_id,
+                checks_enabled=p.checks_enabled,
+                automerge=p.automerge,
+                locked=p.locked,
+                strategy_override=p.strategy_override.value
+                if p.strategy_override
+                else None,
+            ),
+            model=PullRequestModel,
+            conflict_fields=["repository_id", "number"],
+            update_fields=[
+                "qa_status",
+                "status_comment_id",
+                "checks_enabled",
+                "automerge",
+                "locked",
+                "strategy_override",
+            ],
+        )
+
+    async def import_repository_rules(
+        self, repository_rules: Iterable[RepositoryRule]
+    ) -> None:
+        repository_ids = await self._get_repository_ids()
+        await self._import(
+            "repository_rules",
+            repository_rules,
+            key=lambda r: (r.repository_path.owner, r.repository_path.name, r.name),
+            to_values=lambda r: dict(
+                repository_id=self._resolve(repository_ids, r.repository_path),
+                name=r.name,
+                **repository_rule_values(r),
+            ),
+            model=RepositoryRuleModel,
+            conflict_fields=["repository_id", "name"],
+            update_fields=REPOSITORY_RULE_VALUE_FIELDS,
+        )
+
+    async def import_merge_rules(self, merge_rules: Iterable[MergeRule]) -> None:
+        repository_ids = await self._get_repository_ids()
+        await self._import(
+            "merge_rules",
+            merge_rules,
+            key=lambda r: (
+                r.repository_path.owner,
+                r.repository_path.name,
+                r.base_branch.get_name(),
+                r.head_branch.get_name(),
+            ),
+            to_values=lambda r: dict(
+                repository_id=self._resolve(repository_ids, r.repository_path),
+                base_branch=r.base_branch.get_name(),
+                head_branch=r.head_branch.get_name(),
+                strategy=r.strategy.value,
+            ),
+            model=MergeRuleModel,
+            conflict_fields=["repository_id", "base_branch", "head_branch"],
+            update_fields=["strategy"],
+        )
+
+    async def import_external_accounts(
+        self, external_accounts: Iterable[ExternalAccount]
+    ) -> None:
+        await self._import(
+            "external_accounts",
+            external_accounts,
+            key=lambda a: a.username,
+            to_values=lambda a: dict(
+                username=a.username,
+                public_key=a.public_key,
+                private_key=a.private_key,
+            ),
+            model=ExternalAccountModel,
+            conflict_fields=["username"],
+            update_fields=["public_key", "private_key"],
+        )
+
+    async def import_external_account_rights(
+        self, external_account_rights: Iterable[ExternalAccountRight]
+    ) -> None:
+        repository_ids = await self._get_repository_ids()
+        await self._import(
+            "external_account_rights",
+            external_account_rights,
+            key=lambda r: (r.repository_path.owner, r.repository_path.name, r.username),
+            to_values=lambda r: dict(
+                repository_id=self._resolve(repository_ids, r.repository_path),
+                account_id=r.username,
+            ),
+            model=ExternalAccountRightModel,
+            conflict_fields=["account_id", "repository_id"],
+            update_fields=[],
+        )
+
+    async def _import(
+        self,
+        entity_name: str,
+        items: Iterable[ItemT],
+        *,
+        key: Callable[[ItemT], Hashable],
+        to_values: Callable[[ItemT], dict[str, Any]],
+        model: type[Model],
+        conflict_fields: list[str],
+        update_fields: list[str],
+    ) -> None:
+        batch: dict[Hashable, dict[str, Any]] = {}
+
+        async def flush() -> None:
+            if len(batch) == 0:
+                return
+
+            await bulk_upsert(
+                model,
+                rows=list(batch.values()),
+                conflict_fields=conflict_fields,
+                update_fields=update_fields,
+            )
+
+            count = self._report.rows.get(entity_name, 0) + len(batch)
+            self._report.rows[entity_name] = count
+            logger.debug("Imported batch", entity=entity_name, rows=count)
+            batch.clear()
+
+        for item in items:
+            # Rows are deduplicated per batch, the last one wins
+            batch[key(item)] = to_values(item)
+            if len(batch) >= self._batch_size:
+                await flush()
+
+        await flush()
+
+    async def _get_repository_ids(self) -> dict[tuple[str, str], int]:
+        if self._repository_ids is None:
+            self._repository_ids = {
+                (owner, name): repository_id
+                for repository_id, owner, name in await RepositoryModel.all().values_list(
+                    "id", "owner", "name"
+                )
+            }
+
+        return self._repository_ids
+
+    def _resolve(
+        self, repository_ids: dict[tuple[str, str], int], path: RepositoryPath
+    ) -> int:
+        try:
+            return repository_ids[(path.owner, path.name)]
+        except KeyError:
+            raise UnknownRepository(owner=path.owner, name=path.name) from None
@@ -0,0 +1,78 @@
+from abc import ABC, abstractmethod
+from functools import cached_property
+
+from pydantic import BaseModel
+
+from prbot.core.models import MergeRule, Repository, RepositoryRule
+from prbot.core.rule_index import MergeRuleIndex, RuleIndex
+from prbot.injection import inject_instance
+from prbot.modules.cache import CacheClient
+
+from .repository import MergeRuleDatabase, RepositoryDatabase, RepositoryRuleDatabase
+
+
+class RepositoryConfig(BaseModel):
+    repository: Repository
+    rules: list[RepositoryRule]
+    merge_rules: list[MergeRule]
+
+    @cached_property
+    def rule_index(self) -> RuleIndex:
+        # Built once per cached configuration
+        return RuleIndex(self.rules)
+
+    @cached_property
+    def merge_rule_index(self) -> MergeRuleIndex:
+        return MergeRuleIndex(self.merge_rules)
+
+    def match_merge_rule(
+        self, *, base_branch: str, head_branch: str
+    ) -> MergeRule | None:
+        """Get the most specific merge rule matching a pair of branch names."""
+        return self.merge_rule_index.match(
+            base_branch=base_branch, head_branch=head_branch
+        )
+
+
+def repository_config_key(*, owner: str, name: str) -> str:
+    return f"repository-config:{owner}/{name}"
+
+
+async def invalidate_repository_config(*, owner: str, name: str) -> None:
+    cache_client = inject_instance(CacheClient)
+    await cache_client.invalidate(repository_config_key(owner=owner, name=name))
+
+
+class RepositoryConfigCache(ABC):
+    @abstractmethod
+    async def get(self, *, owner: str, name: str) -> RepositoryConfig | None:
+        """Get a repository with its rules and merge rules, or None if unknown."""
+
+
+class RepositoryConfigCacheImplementation(RepositoryConfigCache):
+    _cache_client: CacheClient
+    _repository_db: RepositoryDatabase
+    _rule_db: RepositoryRuleDatabase
+    _merge_rule_db: MergeRuleDatabase
+
+    def __init__(self) -> None:
+        self._cache_client = inject_instance(CacheClient)
+        self._repository_db = inject_instance(RepositoryDatabase)
+        self._rule_db = inject_instance(RepositoryRuleDatabase)
+        self._merge_rule_db = inject_instance(MergeRuleDatabase)
+
+    async def get(self, *, owner: str, name: str) -> RepositoryConfig | None:
+        async def load() -> RepositoryConfig | None:
+            repository = await self._repository_db.get(owner=owner, name=name)
+            if repository is None:
+                return None
+
+            return RepositoryConfig(
+                repository=repository,
+                rules=await self._rule_db.filter(owner=owner, name=name),
+                merge_rules=await self._merge_rule_db.filter(owner=owner, name=name),
+            )
+
+        return await self._cache_client.get_or_load(
+            repository_config_key(owner=owner, name=name), load
+        )
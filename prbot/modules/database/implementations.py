@@ -1,15 +1,27 @@
+import datetime
+import enum
 import re
+from typing import Any, AsyncIterator
+from uuid import UUID
 
 import structlog
-from tortoise.transactions import atomic
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Q, Subquery
+from tortoise.queryset import QuerySet
 
 from prbot.core.models import (
+    CheckStatus,
     ExternalAccount,
     ExternalAccountRight,
     MergeRule,
     MergeStrategy,
     PullRequest,
+    PullRequestSnapshot,
+    PullRequestState,
     QaStatus,
+    QaStatusJob,
+    QaStatusJobItem,
+    QaStatusJobItemStatus,
     Repository,
     RepositoryPath,
     RepositoryRule,
@@ -18,20 +30,43 @@ from prbot.core.models import (
     RuleBranchFactory,
     RuleConditionFactory,
 )
+from prbot.core.rule_index import exact_branch_name, split_conditions
+from prbot.core.step.models import StepLabel
+from prbot.modules.github.models import GhCheckRun, GhPullRequest, GhReviewDecision
 
+from .config_cache import invalidate_repository_config
 from .models import (
+    CheckRunModel,
+    CommitChecksModel,
     ExternalAccountModel,
     ExternalAccountRightModel,
     MergeRuleModel,
     PullRequestModel,
+    PullRequestSnapshotModel,
+    PullRequestStateModel,
+    QaStatusJobItemModel,
+    QaStatusJobModel,
     RepositoryModel,
     RepositoryRuleModel,
 )
+from .queries import (
+    bulk_upsert,
+    iter_pages,
+    transaction,
+    update_returning,
+    upsert_returning,
+)
 from .repository import (
+    DEFAULT_PAGE_SIZE,
+    CheckRunDatabase,
     ExternalAccountDatabase,
     ExternalAccountRightDatabase,
     MergeRuleDatabase,
     PullRequestDatabase,
+    PullRequestSnapshotDatabase,
+    PullRequestStateDatabase,
+    PullRequestStatePage,
+    QaStatusJobDatabase,
     RepositoryDatabase,
     RepositoryRuleDatabase,
     UnknownExternalAccount,
@@ -44,10 +79,66 @@ from .repository import (
 logger = structlog.get_logger()
 
 
+def _to_model_values(fields: dict[str, Any], *, allowed: set[str]) -> dict[str, Any]:
+    values = {}
+    for key, value in fields.items():
+        if key not in allowed:
+            raise ValueError(f"Unknown or read-only field: {key}")
+
+        if isinstance(value, enum.Enum):
+            value = value.value
+        elif isinstance(value, re.Pattern):
+            value = value.pattern
+        values[key] = value
+
+    return values
+
+
+def _repository_id_subquery(*, owner: str, name: str) -> Subquery:
+    return Subquery(RepositoryModel.filter(owner=owner, name=name).values("id"))
+
+
+REPOSITORY_RULE_VALUE_FIELDS = [
+    "conditions",
+    "actions",
+    "author",
+    "base_branch",
+    "head_branch",
+]
+
+
+def repository_rule_values(repository_rule: RepositoryRule) -> dict[str, Any]:
+    """Get the column values of a repository rule, with its indexed projection."""
+
+    indexed = split_conditions(repository_rule.conditions)
+    return {
+        "conditions": RuleConditionFactory.many_to_list(repository_rule.conditions),
+        "actions": RuleActionFactory.many_to_list(repository_rule.actions),
+        "author": indexed.author,
+        "base_branch": exact_branch_name(indexed.base_branch),
+        "head_branch": exact_branch_name(indexed.head_branch),
+    }
+
+
+async def _raise_on_missing_repository(*, owner: str, name: str) -> None:
+    if not await RepositoryModel.exists(owner=owner, name=name):
+        raise UnknownRepository(owner=owner, name=name)
+
+
 class RepositoryDatabaseImplementation(RepositoryDatabase):
+    _PATCHABLE_FIELDS = set(Repository.model_fields) - {"owner", "name"}
+    _UPSERT_FIELDS = sorted(_PATCHABLE_FIELDS)
+
     async def all(self) -> list[Repository]:
         return [self._model_to_domain(repo) for repo in await RepositoryModel.all()]
 
+    async def iter_all(
+        self, *, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[Repository]:
+        async for page in iter_pages(RepositoryModel.all(), page_size=page_size):
+            for model in page:
+                yield self._model_to_domain(model)
+
     async def create(self, repository: Repository) -> Repository:
         logger.info("Creating repository", repository=repository)
 
@@ -62,6 +153,7 @@ class RepositoryDatabaseImplementation(RepositoryDatabase):
             default_enable_checks=repository.default_enable_checks,
         )
 
+        await invalidate_repository_config(owner=repository.owner, name=repository.name)
         return await self.get_or_raise(owner=repository.owner, name=repository.name)
 
     async def update(self, repository: Repository) -> Repository:
@@ -77,8 +169,23 @@ class RepositoryDatabaseImplementation(RepositoryDatabase):
         model.default_enable_checks = repository.default_enable_checks
         await model.save()
 
+        await invalidate_repository_config(owner=repository.owner, name=repository.name)
         return await self.get_or_raise(owner=repository.owner, name=repository.name)
 
+    async def create_or_update(self, repository: Repository) -> Repository:
+        logger.info("Upserting repository", repository=repository)
+
+        model = await upsert_returning(
+            RepositoryModel,
+            values=self._domain_to_values(repository),
+            conflict_fields=["name", "owner"],
+            update_fields=self._UPSERT_FIELDS,
+        )
+        assert model is not None
+
+        await invalidate_repository_config(owner=repository.owner, name=repository.name)
+        return self._model_to_domain(model)
+
     async def get(self, *, owner: str, name: str) -> Repository | None:
         model = await RepositoryModel.get_or_none(owner=owner, name=name)
         if model is not None:
@@ -89,73 +196,65 @@ class RepositoryDatabaseImplementation(RepositoryDatabase):
     async def delete(self, *, owner: str, name: str) -> bool:
         logger.info("Deleting repository", owner=owner, name=name)
         results = await RepositoryModel.filter(owner=owner, name=name).delete()
+
+        await invalidate_repository_config(owner=owner, name=name)
         return results > 0
 
-    @atomic()
+    async def patch(self, *, owner: str, name: str, **fields: Any) -> Repository:
+        if len(fields) == 0:
+            return await self.get_or_raise(owner=owner, name=name)
+
+        models = await update_returning(
+            RepositoryModel.filter(owner=owner, name=name),
+            **_to_model_values(fields, allowed=self._PATCHABLE_FIELDS),
+        )
+        if len(models) == 0:
+            raise UnknownRepository(owner=owner, name=name)
+
+        await invalidate_repository_config(owner=owner, name=name)
+        return self._model_to_domain(models[0])
+
     async def set_default_strategy(
         self, *, owner: str, name: str, strategy: MergeStrategy
     ) -> None:
-        await self._raise_on_missing(owner, name)
-
-        model = await RepositoryModel.select_for_update().get(owner=owner, name=name)
+        await self.patch(owner=owner, name=name, default_strategy=strategy)
 
-        model.default_strategy = strategy.value
-        await model.save(update_fields=["default_strategy"])
-
-    @atomic()
     async def set_default_automerge(
         self, *, owner: str, name: str, value: bool
     ) -> None:
-        await self._raise_on_missing(owner, name)
-
-        model = await RepositoryModel.select_for_update().get(owner=owner, name=name)
+        await self.patch(owner=owner, name=name, default_automerge=value)
 
-        model.default_automerge = value
-        await model.save(update_fields=["default_automerge"])
-
-    @atomic()
     async def set_default_enable_qa(
         self, *, owner: str, name: str, value: bool
     ) -> None:
-        await self._raise_on_missing(owner, name)
-
-        model = await RepositoryModel.select_for_update().get(owner=owner, name=name)
+        await self.patch(owner=owner, name=name, default_enable_qa=value)
 
-        model.default_enable_qa = value
-        await model.save(update_fields=["default_enable_qa"])
-
-    @atomic()
     async def set_default_enable_checks(
         self, *, owner: str, name: str, value: bool
     ) -> None:
-        await self._raise_on_missing(owner, name)
-
-        model = await RepositoryModel.select_for_update().get(owner=owner, name=name)
-
-        model.default_enable_checks = value
-        await model.save(update_fields=["default_enable_checks"])
+        await self.patch(owner=owner, name=name, default_enable_checks=value)
 
-    @atomic()
     async def set_pr_title_validation_regex(
         self, *, owner: str, name: str, value: re.Pattern[str]
     ) -> None:
-        await self._raise_on_missing(owner, name)
+        await self.patch(owner=owner, name=name, pr_title_validation_regex=value)
 
-        model = await RepositoryModel.select_for_update().get(owner=owner, name=name)
-
-        model.pr_title_validation_regex = value.pattern
-        await model.save(update_fields=["pr_title_validation_regex"])
-
-    @atomic()
     async def set_manual_interaction(
         self, *, owner: str, name: str, value: bool
     ) -> None:
-        await self._raise_on_missing(owner, name)
-
-        model = await RepositoryModel.select_for_update().get(owner=owner, name=name)
-
-        model.manual_interaction = value
-        await model.save(update_fields=["manual_interaction"])
+        await self.patch(owner=owner, name=name, manual_interaction=value)
+
+    def _domain_to_values(self, repository: Repository) -> dict[str, Any]:
+        return {
+            "owner": repository.owner,
+            "name": repository.name,
+            "manual_interaction": repository.manual_interaction,
+            "pr_title_validation_regex": repository.pr_title_validation_regex.pattern,
+            "default_strategy": repository.default_strategy.value,
+            "default_automerge": repository.default_automerge,
+            "default_enable_qa": repository.default_enable_qa,
+            "default_enable_checks": repository.default_enable_checks,
+        }
 
     def _model_to_domain(self, model: RepositoryModel) -> Repository:
         return Repository(
@@ -169,18 +268,26 @@ class RepositoryDatabaseImplementation(RepositoryDatabase):
             default_enable_checks=model.default_enable_checks,
         )
 
-    async def _raise_on_missing(self, owner: str, name: str) -> None:
-        if not await RepositoryModel.exists(owner=owner, name=name):
-            raise UnknownRepository(owner=owner, name=name)
-
 
 class PullRequestDatabaseImplementation(PullRequestDatabase):
+    _PATCHABLE_FIELDS = set(PullRequest.model_fields) - {"repository_path", "number"}
+    _UPSERT_FIELDS = sorted(_PATCHABLE_FIELDS)
+
     async def all(self) -> list[PullRequest]:
         return [
             self._model_to_domain(model)
             for model in await PullRequestModel.all().select_related("repository")
         ]
 
+    async def iter_all(
+        self, *, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[PullRequest]:
+        async for page in iter_pages(
+            PullRequestModel.all().select_related("repository"), page_size=page_size
+        ):
+            for model in page:
+                yield self._model_to_domain(model)
+
     async def filter(self, *, owner: str, name: str) -> list[PullRequest]:
         return [
             self._model_to_domain(model)
@@ -243,6 +350,34 @@ class PullRequestDatabaseImplementation(PullRequestDatabase):
             number=pull_request.number,
         )
 
+    async def create_or_update(self, pull_request: PullRequest) -> PullRequest:
+        logger.info("Upserting pull request", pull_request=pull_request)
+        owner = pull_request.repository_path.owner
+        name = pull_request.repository_path.name
+
+        try:
+            model = await upsert_returning(
+                PullRequestModel,
+                values={
+                    "repository_id": _repository_id_subquery(owner=owner, name=name),
+                    "number": pull_request.number,
+                    **_to_model_values(
+                        pull_request.model_dump(include=self._PATCHABLE_FIELDS),
+                        allowed=self._PATCHABLE_FIELDS,
+                    ),
+                },
+                conflict_fields=["repository_id", "number"],
+                update_fields=self._UPSERT_FIELDS,
+            )
+        except IntegrityError:
+            await _raise_on_missing_repository(owner=owner, name=name)
+            raise
+
+        assert model is not None
+        return self._model_to_domain(
+            model, repository_path=RepositoryPath(owner=owner, name=name)
+        )
+
     async def delete(self, *, owner: str, name: str, number: int) -> bool:
         logger.info("Deleting pull request", owner=owner, name=name, number=number)
         results = await PullRequestModel.filter(
@@ -263,95 +398,111 @@ class PullRequestDatabaseImplementation(PullRequestDatabase):
 
         return None
 
-    @atomic()
+    async def patch(
+        self, *, owner: str, name: str, number: int, **fields: Any
+    ) -> PullRequest:
+        if len(fields) == 0:
+            return await self.get_or_raise(owner=owner, name=name, number=number)
+
+        models = await update_returning(
+            self._filter_one(owner=owner, name=name, number=number),
+            **_to_model_values(fields, allowed=self._PATCHABLE_FIELDS),
+        )
+        if len(models) == 0:
+            raise UnknownPullRequest(owner=owner, name=name, number=number)
+
+        return self._model_to_domain(
+            models[0], repository_path=RepositoryPath(owner=owner, name=name)
+        )
+
     async def set_qa_status(
         self, *, owner: str, name: str, number: int, qa_status: QaStatus
     ) -> None:
-        await self._raise_on_missing(owner, name, number)
-
-        model = await PullRequestModel.select_for_update().get(
-            repository__owner=owner, repository__name=name, number=number
+        await self.patch(owner=owner, name=name, number=number, qa_status=qa_status)
+
+    async def set_qa_status_many(
+        self, *, owner: str, name: str, numbers: list[int], qa_status: QaStatus
+    ) -> list[int]:
+        if len(numbers) == 0:
+            return []
+
+        models = await update_returning(
+            PullRequestModel.filter(
+                repository_id=_repository_id_subquery(owner=owner, name=name),
+                number__in=numbers,
+            ),
+            **_to_model_values(
+                {"qa_status": qa_status}, allowed=self._PATCHABLE_FIELDS
+            ),
         )
+        return sorted(model.number for model in models)
 
-        model.qa_status = str(qa_status)
-        await model.save(update_fields=["qa_status"])
-
-    @atomic()
     async def set_checks_enabled(
         self, *, owner: str, name: str, number: int, value: bool
     ) -> None:
-        await self._raise_on_missing(owner, name, number)
-
-        model = await PullRequestModel.select_for_update().get(
-            repository__owner=owner, repository__name=name, number=number
-        )
-
-        model.checks_enabled = value
-        await model.save(update_fields=["checks_enabled"])
+        await self.patch(owner=owner, name=name, number=number, checks_enabled=value)
 
-    @atomic()
     async def set_automerge(
         self, *, owner: str, name: str, number: int, automerge: bool
     ) -> None:
-        await self._raise_on_missing(owner, name, number)
-
-        model = await PullRequestModel.select_for_update().get(
-            repository__owner=owner, repository__name=name, number=number
-        )
-
-        model.automerge = automerge
-        await model.save(update_fields=["automerge"])
+        await self.patch(owner=owner, name=name, number=number, automerge=automerge)
 
-    @atomic()
     async def set_locked(
         self, *, owner: str, name: str, number: int, locked: bool
     ) -> None:
-        await self._raise_on_missing(owner, name, number)
+        await self.patch(owner=owner, name=name, number=number, locked=locked)
 
-        model = await PullRequestModel.select_for_update().get(
-            repository__owner=owner, repository__name=name, number=number
-        )
-
-        model.locked = locked
-        await model.save(update_fields=["locked"])
-
-    @atomic()
     async def set_status_comment_id(
         self, *, owner: str, name: str, number: int, status_comment_id: int
     ) -> None:
-        await self._raise_on_missing(owner, name, number)
-
-        model = await PullRequestModel.select_for_update().get(
-            repository__owner=owner, repository__name=name, number=number
+        await self.patch(
+            owner=owner,
+            name=name,
+            number=number,
+            status_comment_id=status_comment_id,
         )
 
-        model.status_comment_id = status_comment_id
-        await model.save(update_fields=["status_comment_id"])
+    async def compare_and_set_status_comment_id(
+        self,
+        *,
+        owner: str,
+        name: str,
+        number: int,
+        expected: int,
+        status_comment_id: int,
+    ) -> bool:
+        updated = (
+            await self._filter_one(owner=owner, name=name, number=number)
+            .filter(status_comment_id=expected)
+            .update(status_comment_id=status_comment_id)
+        )
+        return updated > 0
 
-    @atomic()
     async def set_merge_strategy(
         self, *, owner: str, name: str, number: int, strategy: MergeStrategy | None
     ) -> None:
-        await self._raise_on_missing(owner, name, number)
-
-        model = await PullRequestModel.select_for_update().get(
-            repository__owner=owner, repository__name=name, number=number
+        await self.patch(
+            owner=owner, name=name, number=number, strategy_override=strategy
         )
 
-        model.strategy_override = strategy.value if strategy is not None else None  # type: ignore
-        await model.save(update_fields=["strategy_override"])
-
-    async def _raise_on_missing(self, owner: str, name: str, number: int) -> None:
-        if not await PullRequestModel.exists(
-            repository__owner=owner, repository__name=name, number=number
-        ):
-            raise UnknownPullRequest(owner=owner, name=name, number=number)
+    def _filter_one(
+        self, *, owner: str, name: str, number: int
+    ) -> QuerySet[PullRequestModel]:
+        # No join allowed in an UPDATE statement, so filter the repository using a subquery.
+        return PullRequestModel.filter(
+            repository_id=_repository_id_subquery(owner=owner, name=name),
+            number=number,
+        )
 
-    def _model_to_domain(self, model: PullRequestModel) -> PullRequest:
+    def _model_to_domain(
+        self,
+        model: PullRequestModel,
+        *,
+        repository_path: RepositoryPath | None = None,
+    ) -> PullRequest:
         return PullRequest(
-            repository_path=RepositoryPath(
-                owner=model.repository.owner, name=model.repository.name
-            ),
+            repository_path=repository_path
+            or RepositoryPath(owner=model.repository.owner, name=model.repository.name),
             number=model.number,
             qa_status=QaStatus(model.qa_status),
             status_comment_id=model.status_comment_id,
@@ -364,6 +515,304 @@ class PullRequestDatabaseImplementation(PullRequestDatabase):
         )
 
 
+class PullRequestStateDatabaseImplementation(PullRequestStateDatabase):
+    _UPSERT_FIELDS = [
+        "step_label",
+        "check_status",
+        "qa_status",
+        "review_decision",
+        "mergeable",
+        "merged",
+        "head_sha",
+        "updated_at",
+    ]
+
+    async def get(
+        self, *, owner: str, name: str, number: int
+    ) -> PullRequestState | None:
+        model = await PullRequestStateModel.get_or_none(
+            pull_request__repository__owner=owner,
+            pull_request__repository__name=name,
+            pull_request__number=number,
+        ).select_related("pull_request__repository")
+        if model is not None:
+            return self._model_to_domain(model)
+
+        return None
+
+    async def create_or_update(
+        self, pull_request_state: PullRequestState
+    ) -> PullRequestState:
+        owner = pull_request_state.repository_path.owner
+        name = pull_request_state.repository_path.name
+        number = pull_request_state.number
+
+        try:
+            model = await upsert_returning(
+                PullRequestStateModel,
+                values={
+                    "pull_request_id": Subquery(
+                        PullRequestModel.filter(
+                            repository_id=_repository_id_subquery(
+                                owner=owner, name=name
+                            ),
+                            number=number,
+                        ).values("id")
+                    ),
+                    "step_label": pull_request_state.step_label.value,
+                    "check_status": pull_request_state.check_status.value,
+                    "qa_status": pull_request_state.qa_status.value,
+                    "review_decision": pull_request_state.review_decision.value
+                    if pull_request_state.review_decision
+                    else None,
+                    "mergeable": pull_request_state.mergeable,
+                    "merged": pull_request_state.merged,
+                    "head_sha": pull_request_state.head_sha,
+                    "updated_at": pull_request_state.updated_at,
+                },
+                conflict_fields=["pull_request_id"],
+                update_fields=self._UPSERT_FIELDS,
+            )
+        except IntegrityError:
+            if not await PullRequestModel.exists(
+                repository__owner=owner, repository__name=name, number=number
+            ):
+                raise UnknownPullRequest(owner=owner, name=name, number=number)
+            raise
+
+        assert model is not None
+        return self._model_to_domain(
+            model, repository_path=pull_request_state.repository_path, number=number
+        )
+
+    async def filter(
+        self,
+        *,
+        owner: str | None = None,
+        name: str | None = None,
+        step_label: StepLabel | None = None,
+        check_status: CheckStatus | None = None,
+        qa_status: QaStatus | None = None,
+        username: str | None = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: int | None = None,
+    ) -> PullRequestStatePage:
+        if limit < 1:
+            raise ValueError("Limit should be at least 1")
+
+        queryset = PullRequestStateModel.all().select_related(
+            "pull_request__repository"
+        )
+        if owner is not None:
+            queryset = queryset.filter(pull_request__repository__owner=owner)
+        if name is not None:
+            queryset = queryset.filter(pull_request__repository__name=name)
+        if step_label is not None:
+            queryset = queryset.filter(step_label=step_label.value)
+        if check_status is not None:
+            queryset = queryset.filter(check_status=check_status.value)
+        if qa_status is not None:
+            queryset = queryset.filter(qa_status=qa_status.value)
+        if username is not None:
+            queryset = queryset.filter(
+                pull_request__repository__rights__account_id=username
+            )
+        if cursor is not None:
+            queryset = queryset.filter(pull_request_id__gt=cursor)
+
+        # Fetch one more row to know if there is a next page
+        models = await queryset.order_by("pull_request_id").limit(limit + 1)
+        next_cursor = models[limit - 1].pull_request_id if len(models) > limit else None
+
+        return PullRequestStatePage(
+            items=[self._model_to_domain(model) for model in models[:limit]],
+            next_cursor=next_cursor,
+        )
+
+    def _model_to_domain(
+        self,
+        model: PullRequestStateModel,
+        *,
+        repository_path: RepositoryPath | None = None,
+        number: int | None = None,
+    ) -> PullRequestState:
+        if repository_path is None or number is None:
+            repository = model.pull_request.repository
+            repository_path = RepositoryPath(
+                owner=repository.owner, name=repository.name
+            )
+            number = model.pull_request.number
+
+        return PullRequestState(
+            repository_path=repository_path,
+            number=number,
+            step_label=StepLabel(model.step_label),
+            check_status=CheckStatus(model.check_status),
+            qa_status=QaStatus(model.qa_status),
+            review_decision=GhReviewDecision(model.review_decision)
+            if model.review_decision is not None
+            else None,
+            mergeable=model.mergeable,
+            merged=model.merged,
+            head_sha=model.head_sha,
+            updated_at=model.updated_at,
+        )
+
+
+class PullRequestSnapshotDatabaseImplementation(PullRequestSnapshotDatabase):
+    async def get(
+        self, *, owner: str, name: str, number: int
+    ) -> PullRequestSnapshot | None:
+        model = await PullRequestSnapshotModel.get_or_none(
+            owner=owner, name=name, number=number
+        )
+        if model is not None:
+            return self._model_to_domain(model)
+
+        return None
+
+    async def store(
+        self, *, owner: str, name: str, pull_request: GhPullRequest
+    ) -> bool:
+        model = await upsert_returning(
+            PullRequestSnapshotModel,
+            values={
+                "owner": owner,
+                "name": name,
+                "number": pull_request.number,
+                "head_sha": pull_request.head.sha,
+                "updated_at": pull_request.updated_at,
+                "stored_at": datetime.datetime.now(datetime.timezone.utc),
+                "data": pull_request.model_dump_json(),
+            },
+            conflict_fields=["owner", "name", "number"],
+            update_fields=["head_sha", "updated_at", "stored_at", "data"],
+            version_field="updated_at",
+        )
+
+        if model is None:
+            logger.info(
+                "Ignoring outdated pull request snapshot",
+                owner=owner,
+                name=name,
+                number=pull_request.number,
+                updated_at=pull_request.updated_at,
+            )
+            return False
+
+        return True
+
+    async def discard_outdated(
+        self, *, owner: str, name: str, number: int, head_sha: str
+    ) -> None:
+        await (
+            PullRequestSnapshotModel.filter(owner=owner, name=name, number=number)
+            .exclude(head_sha=head_sha)
+            .delete()
+        )
+
+    async def purge(self, *, stored_before: datetime.datetime) -> int:
+        return await PullRequestSnapshotModel.filter(
+            stored_at__lt=stored_before
+        ).delete()
+
+    def _model_to_domain(self, model: PullRequestSnapshotModel) -> PullRequestSnapshot:
+        return PullRequestSnapshot(
+            repository_path=RepositoryPath(owner=model.owner, name=model.name),
+            pull_request=GhPullRequest.model_validate(model.data),
+            stored_at=model.stored_at,
+        )
+
+
+class CheckRunDatabaseImplementation(CheckRunDatabase):
+    async def get_for_commit(
+        self, *, owner: str, name: str, head_sha: str, max_age_seconds: int
+    ) -> list[GhCheckRun] | None:
+        listed_after = datetime.datetime.now(
+            datetime.timezone.utc
+        ) - datetime.timedelta(seconds=max_age_seconds)
+        if not await CommitChecksModel.exists(
+            owner=owner, name=name, head_sha=head_sha, listed_at__gt=listed_after
+        ):
+            return None
+
+        models = await CheckRunModel.filter(
+            owner=owner, name=name, head_sha=head_sha
+        ).order_by("check_name")
+        return [GhCheckRun.model_validate(model.data) for model in models]
+
+    async def store(self, *, owner: str, name: str, check_run: GhCheckRun) -> None:
+        # Commits without pull request are never listed, do not keep their checks
+        if not await CommitChecksModel.exists(
+            owner=owner, name=name, head_sha=check_run.head_sha
+        ):
+            return
+
+        await upsert_returning(
+            CheckRunModel,
+            values=self._to_values(owner=owner, name=name, check_run=check_run),
+            conflict_fields=["owner", "name", "head_sha", "check_name"],
+            update_fields=["started_at", "data"],
+            version_field="started_at",
+        )
+
+    async def store_listing(
+        self, *, owner: str, name: str, head_sha: str, check_runs: list[GhCheckRun]
+    ) -> None:
+        if len(check_runs) == 0:
+            return
+
+        await bulk_upsert(
+            CheckRunModel,
+            rows=[
+                self._to_values(owner=owner, name=name, check_run=check_run)
+                for check_run in check_runs
+            ],
+            conflict_fields=["owner", "name", "head_sha", "check_name"],
+            update_fields=["started_at", "data"],
+            version_field="started_at",
+        )
+        await upsert_returning(
+            CommitChecksModel,
+            values={
+                "owner": owner,
+                "name": name,
+                "head_sha": head_sha,
+                "listed_at": datetime.datetime.now(datetime.timezone.utc),
+            },
+            conflict_fields=["owner", "name", "head_sha"],
+            update_fields=["listed_at"],
+        )
+
+    async def purge(self, *, listed_before: datetime.datetime) -> int:
+        count = await CommitChecksModel.filter(listed_at__lt=listed_before).delete()
+
+        # Remove the check runs of the commits which are not listed anymore
+        await CheckRunModel._meta.db.execute_query(
+            """
+            DELETE FROM "check_run" WHERE NOT EXISTS (
+                SELECT 1 FROM "commit_checks"
+                WHERE "commit_checks"."owner" = "check_run"."owner"
+                AND "commit_checks"."name" = "check_run"."name"
+                AND "commit_checks"."head_sha" = "check_run"."head_sha"
+            )
+            """
+        )
+        return count
+
+    def _to_values(
+        self, *, owner: str, name: str, check_run: GhCheckRun
+    ) -> dict[str, Any]:
+        return {
+            "owner": owner,
+            "name": name,
+            "head_sha": check_run.head_sha,
+            "check_name": check_run.name,
+            "started_at": check_run.started_at,
+            "data": check_run.model_dump_json(),
+        }
+
+
 class MergeRuleDatabaseImplementation(MergeRuleDatabase):
     async def all(self) -> list[MergeRule]:
         return [
@@ -371,6 +820,15 @@ class MergeRuleDatabaseImplementation(MergeRuleDatabase):
             for model in await MergeRuleModel.all().select_related("repository")
         ]
 
+    async def iter_all(
+        self, *, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[MergeRule]:
+        async for page in iter_pages(
+            MergeRuleModel.all().select_related("repository"), page_size=page_size
+        ):
+            for model in page:
+                yield self._model_to_domain(model)
+
     async def create(self, merge_rule: MergeRule) -> MergeRule:
         logger.info("Creating merge rule", merge_rule=merge_rule)
 
@@ -384,6 +842,7 @@ class MergeRuleDatabaseImplementation(MergeRuleDatabase):
             strategy=merge_rule.strategy.value,
         )
 
+        await invalidate_repository_config(owner=repository.owner, name=repository.name)
         return await self.get_or_raise(
             owner=repository.owner,
             name=repository.name,
@@ -409,6 +868,9 @@ class MergeRuleDatabaseImplementation(MergeRuleDatabase):
         model.strategy = merge_rule.strategy.value
         await model.save(update_fields=["strategy"])
 
+        await invalidate_repository_config(
+            owner=merge_rule.repository_path.owner, name=merge_rule.repository_path.name
+        )
         return await self.get_or_raise(
             owner=merge_rule.repository_path.owner,
             name=merge_rule.repository_path.name,
@@ -416,6 +878,34 @@ class MergeRuleDatabaseImplementation(MergeRuleDatabase):
             head_branch=merge_rule.head_branch,
         )
 
+    async def create_or_update(self, merge_rule: MergeRule) -> MergeRule:
+        logger.info("Upserting merge rule", merge_rule=merge_rule)
+        owner = merge_rule.repository_path.owner
+        name = merge_rule.repository_path.name
+
+        try:
+            model = await upsert_returning(
+                MergeRuleModel,
+                values={
+                    "repository_id": _repository_id_subquery(owner=owner, name=name),
+                    "base_branch": merge_rule.base_branch.get_name(),
+                    "head_branch": merge_rule.head_branch.get_name(),
+                    "strategy": merge_rule.strategy.value,
+                },
+                conflict_fields=["repository_id", "base_branch", "head_branch"],
+                update_fields=["strategy"],
+            )
+        except IntegrityError:
+            await _raise_on_missing_repository(owner=owner, name=name)
+            raise
+
+        assert model is not None
+
+        await invalidate_repository_config(owner=owner, name=name)
+        return self._model_to_domain(
+            model, repository_path=RepositoryPath(owner=owner, name=name)
+        )
+
     async def filter(self, *, owner: str, name: str) -> list[MergeRule]:
         results = await MergeRuleModel.filter(
             repository__owner=owner,
@@ -444,6 +934,8 @@ class MergeRuleDatabaseImplementation(MergeRuleDatabase):
         found = len(results) > 0
         for result in results:
             await result.delete()
+
+        await invalidate_repository_config(owner=owner, name=name)
         return found
 
     async def get(
@@ -473,11 +965,15 @@ class MergeRuleDatabaseImplementation(MergeRuleDatabase):
                 owner=owner, name=name, base_branch=base_branch, head_branch=head_branch
             )
 
-    def _model_to_domain(self, model: MergeRuleModel) -> MergeRule:
+    def _model_to_domain(
+        self,
+        model: MergeRuleModel,
+        *,
+        repository_path: RepositoryPath | None = None,
+    ) -> MergeRule:
         return MergeRule(
-            repository_path=RepositoryPath(
-                owner=model.repository.owner, name=model.repository.name
-            ),
+            repository_path=repository_path
+            or RepositoryPath(owner=model.repository.owner, name=model.repository.name),
             base_branch=RuleBranchFactory.from_str(model.base_branch),
             head_branch=RuleBranchFactory.from_str(model.head_branch),
             strategy=MergeStrategy(model.strategy),
@@ -491,6 +987,15 @@ class RepositoryRuleDatabaseImplementation(RepositoryRuleDatabase):
             for model in await RepositoryRuleModel.all().select_related("repository")
         ]
 
+    async def iter_all(
+        self, *, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[RepositoryRule]:
+        async for page in iter_pages(
+            RepositoryRuleModel.all().select_related("repository"), page_size=page_size
+        ):
+            for model in page:
+                yield self._model_to_domain(model)
+
     async def filter(self, *, owner: str, name: str) -> list[RepositoryRule]:
         rules = (
             await RepositoryRuleModel.filter(
@@ -501,6 +1006,22 @@ class RepositoryRuleDatabaseImplementation(RepositoryRuleDatabase):
         )
         return [self._model_to_domain(rule) for rule in rules]
 
+    async def filter_candidates(
+        self, *, owner: str, name: str, author: str, base_branch: str, head_branch: str
+    ) -> list[RepositoryRule]:
+        rules = (
+            await RepositoryRuleModel.filter(
+                Q(author__isnull=True) | Q(author=author),
+                Q(base_branch__isnull=True) | Q(base_branch=base_branch),
+                Q(head_branch__isnull=True) | Q(head_branch=head_branch),
+                repository__owner=owner,
+                repository__name=name,
+            )
+            .select_related("repository")
+            .order_by("name")
+        )
+        return [self._model_to_domain(rule) for rule in rules]
+
     async def create(self, repository_rule: RepositoryRule) -> RepositoryRule:
         logger.info("Creating repository rule", repository_rule=repository_rule)
 
@@ -511,10 +1032,13 @@ class RepositoryRuleDatabaseImplementation(RepositoryRuleDatabase):
         await RepositoryRuleModel.create(
             repository_id=repository.id,
             name=repository_rule.name,
-            conditions=RuleConditionFactory.many_to_str(repository_rule.conditions),
-            actions=RuleActionFactory.many_to_str(repository_rule.actions),
+            **repository_rule_values(repository_rule),
         )
 
+        await invalidate_repository_config(
+            owner=repository_rule.repository_path.owner,
+            name=repository_rule.repository_path.name,
+        )
         return await self.get_or_raise(
             owner=repository_rule.repository_path.owner,
             name=repository_rule.repository_path.name,
@@ -534,16 +1058,46 @@ class RepositoryRuleDatabaseImplementation(RepositoryRuleDatabase):
             repository__name=repository_rule.repository_path.name,
             name=repository_rule.name,
         )
-        model.conditions = RuleConditionFactory.many_to_str(repository_rule.conditions)
-        model.actions = RuleActionFactory.many_to_str(repository_rule.actions)
+        model.update_from_dict(repository_rule_values(repository_rule))
         await model.save()
 
+        await invalidate_repository_config(
+            owner=repository_rule.repository_path.owner,
+            name=repository_rule.repository_path.name,
+        )
         return await self.get_or_raise(
             owner=repository_rule.repository_path.owner,
             name=repository_rule.repository_path.name,
             rule_name=repository_rule.name,
         )
 
+    async def create_or_update(self, repository_rule: RepositoryRule) -> RepositoryRule:
+        logger.info("Upserting repository rule", repository_rule=repository_rule)
+        owner = repository_rule.repository_path.owner
+        name = repository_rule.repository_path.name
+
+        try:
+            model = await upsert_returning(
+                RepositoryRuleModel,
+                values={
+                    "repository_id": _repository_id_subquery(owner=owner, name=name),
+                    "name": repository_rule.name,
+                    **repository_rule_values(repository_rule),
+                },
+                conflict_fields=["repository_id", "name"],
+                update_fields=REPOSITORY_RULE_VALUE_FIELDS,
+            )
+        except IntegrityError:
+            await _raise_on_missing_repository(owner=owner, name=name)
+            raise
+
+        assert model is not None
+
+        await invalidate_repository_config(owner=owner, name=name)
+        return self._model_to_domain(
+            model, repository_path=RepositoryPath(owner=owner, name=name)
+        )
+
     async def delete(self, *, owner: str, name: str, rule_name: str) -> bool:
         logger.info(
             "Deleting repository rule", owner=owner, name=name, rule_name=rule_name
@@ -556,6 +1110,8 @@ class RepositoryRuleDatabaseImplementation(RepositoryRuleDatabase):
         found = len(results) > 0
         for result in results:
             await result.delete()
+
+        await invalidate_repository_config(owner=owner, name=name)
         return found
 
     async def get(
@@ -575,14 +1131,18 @@ class RepositoryRuleDatabaseImplementation(RepositoryRuleDatabase):
         ):
             raise UnknownRepositoryRule(owner=owner, name=name, rule_name=rule_name)
 
-    def _model_to_domain(self, model: RepositoryRuleModel) -> RepositoryRule:
+    def _model_to_domain(
+        self,
+        model: RepositoryRuleModel,
+        *,
+        repository_path: RepositoryPath | None = None,
+    ) -> RepositoryRule:
         return RepositoryRule(
-            repository_path=RepositoryPath(
-                owner=model.repository.owner, name=model.repository.name
-            ),
+            repository_path=repository_path
+            or RepositoryPath(owner=model.repository.owner, name=model.repository.name),
             name=model.name,
-            conditions=RuleConditionFactory.from_str_many(model.conditions),
-            actions=RuleActionFactory.from_str_many(model.actions),
+            conditions=RuleConditionFactory.from_list_many(model.conditions),
+            actions=RuleActionFactory.from_list_many(model.actions),
         )
 
 
@@ -593,6 +1153,15 @@ class ExternalAccountDatabaseImplementation(ExternalAccountDatabase):
             for model in await ExternalAccountModel.all().order_by("username")
         ]
 
+    async def iter_all(
+        self, *, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[ExternalAccount]:
+        async for page in iter_pages(
+            ExternalAccountModel.all(), page_size=page_size, key="username"
+        ):
+            for model in page:
+                yield self._model_to_domain(model)
+
     async def get(self, *, username: str) -> ExternalAccount | None:
         model = await ExternalAccountModel.get_or_none(username=username)
         if model is not None:
@@ -624,6 +1193,24 @@ class ExternalAccountDatabaseImplementation(ExternalAccountDatabase):
 
         return self._model_to_domain(model)
 
+    async def create_or_update(
+        self, external_account: ExternalAccount
+    ) -> ExternalAccount:
+        logger.info("Upserting external account", external_account=external_account)
+
+        model = await upsert_returning(
+            ExternalAccountModel,
+            values={
+                "username": external_account.username,
+                "public_key": external_account.public_key,
+                "private_key": external_account.private_key,
+            },
+            conflict_fields=["username"],
+            update_fields=["public_key", "private_key"],
+        )
+        assert model is not None
+        return self._model_to_domain(model)
+
     async def delete(self, *, username: str) -> bool:
         logger.info("Deleting external account", username=username)
         output = await ExternalAccountModel.filter(username=username).delete()
@@ -650,6 +1237,16 @@ class ExternalAccountRightDatabaseImplementation(ExternalAccountRightDatabase):
             )
         ]
 
+    async def iter_all(
+        self, *, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[ExternalAccountRight]:
+        async for page in iter_pages(
+            ExternalAccountRightModel.all().select_related("repository", "account"),
+            page_size=page_size,
+        ):
+            for model in page:
+                yield self._model_to_domain(model)
+
     async def filter(self, *, username: str) -> list[ExternalAccountRight]:
         return [
             self._model_to_domain(model)
@@ -676,6 +1273,28 @@ class ExternalAccountRightDatabaseImplementation(ExternalAccountRightDatabase):
             username=right.username,
         )
 
+    async def get_or_create(self, right: ExternalAccountRight) -> ExternalAccountRight:
+        owner = right.repository_path.owner
+        name = right.repository_path.name
+
+        try:
+            await upsert_returning(
+                ExternalAccountRightModel,
+                values={
+                    "account_id": right.username,
+                    "repository_id": _repository_id_subquery(owner=owner, name=name),
+                },
+                conflict_fields=["account_id", "repository_id"],
+                update_fields=[],
+            )
+        except IntegrityError:
+            await _raise_on_missing_repository(owner=owner, name=name)
+            if not await ExternalAccountModel.exists(username=right.username):
+                raise UnknownExternalAccount(username=right.username)
+            raise
+
+        return right
+
     async def delete(self, *, owner: str, name: str, username: str) -> bool:
         logger.info(
             "Deleting external account right", owner=owner, name=name, username=username
@@ -709,3 +1328,104 @@ class ExternalAccountRightDatabaseImplementation(ExternalAccountRightDatabase):
             ),
             username=model.account.username,
         )
+
+
+class QaStatusJobDatabaseImplementation(QaStatusJobDatabase):
+    async def create(self, job: QaStatusJob) -> QaStatusJob:
+        logger.info("Creating QA status job", job_id=job.id)
+
+        async with transaction():
+            await QaStatusJobModel.create(
+                id=job.id,
+                owner=job.repository_path.owner,
+                name=job.repository_path.name,
+                qa_status=job.qa_status.value,
+                author=job.author,
+                username=job.username,
+                created_at=job.created_at,
+                heartbeat_at=job.created_at,
+            )
+            await QaStatusJobItemModel.bulk_create(
+                [
+                    QaStatusJobItemModel(
+                        job_id=job.id,
+                        number=item.number,
+                        status=item.status.value,
+                        error=item.error,
+                    )
+                    for item in job.items
+                ]
+            )
+
+        return job
+
+    async def get(self, *, job_id: str) -> QaStatusJob | None:
+        try:
+            UUID(job_id)
+        except ValueError:
+            return None
+
+        model = await QaStatusJobModel.get_or_none(id=job_id)
+        if model is None:
+            return None
+
+        items = await QaStatusJobItemModel.filter(job_id=job_id).order_by("number")
+        return self._model_to_domain(model, items)
+
+    async def set_item_status(
+        self,
+        *,
+        job_id: str,
+        number: int,
+        status: QaStatusJobItemStatus,
+        error: str | None = None,
+    ) -> None:
+        await QaStatusJobItemModel.filter(job_id=job_id, number=number).update(
+            status=status.value, error=error
+        )
+
+    async def heartbeat(self, *, job_ids: list[str], at: datetime.datetime) -> None:
+        await QaStatusJobModel.filter(id__in=job_ids).update(heartbeat_at=at)
+
+    async def fail_abandoned(
+        self, *, heartbeat_before: datetime.datetime, error: str
+    ) -> int:
+        jobs = QaStatusJobModel.filter(heartbeat_at__lt=heartbeat_before)
+        count: int = await QaStatusJobItemModel.filter(
+            job_id__in=Subquery(jobs.values("id")),
+            status=QaStatusJobItemStatus.Pending.value,
+        ).update(status=QaStatusJobItemStatus.Failed.value, error=error)
+
+        if count > 0:
+            logger.warning("Failed abandoned QA status job items", count=count)
+        return count
+
+    async def purge(self, *, created_before: datetime.datetime) -> int:
+        jobs = QaStatusJobModel.filter(created_at__lt=created_before)
+
+        # Remove the items first, so that only jobs are counted
+        async with transaction():
+            await QaStatusJobItemModel.filter(
+                job_id__in=Subquery(jobs.values("id"))
+            ).delete()
+            return await jobs.delete()
+
+    def _model_to_domain(
+        self, model: QaStatusJobModel, items: list[QaStatusJobItemModel]
+    ) -> QaStatusJob:
+        return QaStatusJob(
+            id=str(model.id),
+            repository_path=RepositoryPath(owner=model.owner, name=model.name),
+            qa_status=QaStatus(model.qa_status),
+            author=model.author,
+            username=model.username,
+            created_at=model.created_at,
+            items=[
+                QaStatusJobItem(
+                    number=item.number,
+                    status=QaStatusJobItemStatus(item.status),
+                    error=item.error,
+                )
+                for item in items
+            ],
+        )
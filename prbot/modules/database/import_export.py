@@ -1,9 +1,21 @@
-import copy
-import json
+import enum
+import itertools
 import re
-from typing import IO, Any
+from typing import (
+    IO,
+    Annotated,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+)
 
-from pydantic import BaseModel
+import structlog
+from pydantic import BaseModel, Field, TypeAdapter
+from tortoise.transactions import in_transaction
 
 from prbot.core.models import (
     ExternalAccount,
@@ -20,6 +32,8 @@ from prbot.core.models import (
     RuleConditionFactory,
 )
 from prbot.injection import inject_instance
+from prbot.modules.cache import CacheClient
+from prbot.modules.database.bulk import DEFAULT_BATCH_SIZE, BulkImporter, ImportReport
 from prbot.modules.database.repository import (
     ExternalAccountDatabase,
     ExternalAccountRightDatabase,
@@ -28,6 +42,9 @@ from prbot.modules.database.repository import (
     RepositoryDatabase,
     RepositoryRuleDatabase,
 )
+from prbot.modules.database.streaming import JsonStreamReader
+
+logger = structlog.get_logger()
 
 
 class ImportExportData(BaseModel):
@@ -39,6 +56,86 @@ class ImportExportData(BaseModel):
     external_account_rights: list[ExternalAccountRight]
 
 
+class ImportExportFormat(enum.StrEnum):
+    Json = "json"
+    Ndjson = "ndjson"
+
+
+class RepositoryRecord(BaseModel):
+    type: Literal["repository"] = "repository"
+    data: Repository
+
+
+class PullRequestRecord(BaseModel):
+    type: Literal["pull_request"] = "pull_request"
+    data: PullRequest
+
+
+class RepositoryRuleRecord(BaseModel):
+    type: Literal["repository_rule"] = "repository_rule"
+    data: RepositoryRule
+
+
+class MergeRuleRecord(BaseModel):
+    type: Literal["merge_rule"] = "merge_rule"
+    data: MergeRule
+
+
+class ExternalAccountRecord(BaseModel):
+    type: Literal["external_account"] = "external_account"
+    data: ExternalAccount
+
+
+class ExternalAccountRightRecord(BaseModel):
+    type: Literal["external_account_right"] = "external_account_right"
+    data: ExternalAccountRight
+
+
+ImportExportRecord = Annotated[
+    RepositoryRecord
+    | PullRequestRecord
+    | RepositoryRuleRecord
+    | MergeRuleRecord
+    | ExternalAccountRecord
+    | ExternalAccountRightRecord,
+    Field(discriminator="type"),
+]
+_record_adapter: TypeAdapter[ImportExportRecord] = TypeAdapter(ImportExportRecord)
+
+_RECORD_IMPORTERS: dict[str, Callable[[BulkImporter, list[Any]], Awaitable[None]]] = {
+    "repository": BulkImporter.import_repositories,
+    "pull_request": BulkImporter.import_pull_requests,
+    "repository_rule": BulkImporter.import_repository_rules,
+    "merge_rule": BulkImporter.import_merge_rules,
+    "external_account": BulkImporter.import_external_accounts,
+    "external_account_right": BulkImporter.import_external_account_rights,
+}
+
+
+# Sections of a legacy dump, with the sections they need to be read first
+_COMPATIBILITY_SECTIONS = {
+    "repositories",
+    "pull_requests",
+    "merge_rules",
+    "external_accounts",
+    "external_account_rights",
+    "pull_request_rules",
+}
+_COMPATIBILITY_DEPENDENCIES = {
+    "pull_requests": {"repositories"},
+    "merge_rules": {"repositories"},
+    "external_account_rights": {"repositories", "external_accounts"},
+    "pull_request_rules": {"repositories"},
+}
+
+
+def _exported_pull_request(pull_request: PullRequest) -> PullRequest:
+    # A negative ID is a pending summary claim, only meaningful to this database
+    if pull_request.status_comment_id < 0:
+        return pull_request.model_copy(update={"status_comment_id": 0})
+    return pull_request
+
+
 class ImportExportProcessor:
     _repository_db: RepositoryDatabase
     _pull_request_db: PullRequestDatabase
@@ -46,6 +143,7 @@ class ImportExportProcessor:
     _merge_rule_db: MergeRuleDatabase
     _external_account_db: ExternalAccountDatabase
     _external_account_right_db: ExternalAccountRightDatabase
+    _cache_client: CacheClient
 
     def __init__(self) -> None:
         self._repository_db = inject_instance(RepositoryDatabase)
@@ -54,149 +152,256 @@ class ImportExportProcessor:
         self._merge_rule_db = inject_instance(MergeRuleDatabase)
         self._external_account_db = inject_instance(ExternalAccountDatabase)
         self._external_account_right_db = inject_instance(ExternalAccountRightDatabase)
+        self._cache_client = inject_instance(CacheClient)
+
+    async def import_data(
+        self,
+        stream: IO[bytes],
+        *,
+        data_format: ImportExportFormat = ImportExportFormat.Json,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> ImportReport:
+        if data_format == ImportExportFormat.Ndjson:
+            return await self._import_records_to_database(
+                self._generate_records_from_stream(stream), batch_size=batch_size
+            )
 
-    async def import_data(self, stream: IO[bytes]) -> None:
         data = self._generate_data_from_stream(stream)
-        await self._import_data_to_database(data)
+        return await self._import_data_to_database(data, batch_size=batch_size)
+
+    async def import_data_compatibility(
+        self, stream: IO[bytes], *, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> ImportReport:
+        return await self._import_records_to_database(
+            self._generate_records_from_compatibility_stream(stream),
+            batch_size=batch_size,
+        )
 
-    async def import_data_compatibility(self, stream: IO[bytes]) -> None:
-        data = self._convert_compatibility_data_to_data(json.load(stream))
-        await self._import_data_to_database(data)
+    async def export_data(
+        self,
+        stream: IO[bytes],
+        *,
+        data_format: ImportExportFormat = ImportExportFormat.Json,
+    ) -> None:
+        if data_format == ImportExportFormat.Ndjson:
+            async for record in self._generate_records_from_database():
+                stream.write(record.model_dump_json().encode() + b"\n")
+            return
 
-    async def export_data(self, stream: IO[bytes]) -> None:
         data = await self._generate_data_from_database()
         stream.write(data.model_dump_json(indent=4).encode())
 
-    async def _import_data_to_database(self, data: ImportExportData) -> None:
-        for repository in data.repositories:
-            await self._repository_db.create_or_update(repository)
+    async def _import_data_to_database(
+        self, data: ImportExportData, *, batch_size: int
+    ) -> ImportReport:
+        return await self._import_records_to_database(
+            self._generate_records_from_data(data), batch_size=batch_size
+        )
+
+    async def _import_records_to_database(
+        self, records: Iterator[ImportExportRecord], *, batch_size: int
+    ) -> ImportReport:
+        """
+        Import records by batches of a same type, without loading the whole stream.
+
+        Records must be ordered by dependency (e.g. repositories before their pull
+        requests), as they are when exported.
+        """
 
-        for pull_request in data.pull_requests:
-            await self._pull_request_db.create_or_update(pull_request)
+        importer = BulkImporter(batch_size=batch_size)
 
-        for repository_rule in data.repository_rules:
-            await self._repository_rule_db.create_or_update(repository_rule)
+        async with in_transaction():
+            for record_type, group in itertools.groupby(records, key=lambda r: r.type):
+                import_fn = _RECORD_IMPORTERS[record_type]
+                for batch in itertools.batched(group, batch_size):
+                    await import_fn(importer, [record.data for record in batch])
 
-        for merge_rule in data.merge_rules:
-            await self._merge_rule_db.create_or_update(merge_rule)
+        # Imported rows can change any repository configuration
+        await self._cache_client.invalidate_all()
 
-        for external_account in data.external_accounts:
-            await self._external_account_db.create_or_update(external_account)
+        report = importer.report()
+        logger.info(
+            "Imported data",
+            rows=report.rows,
+            duration_seconds=report.duration_seconds,
+            rows_per_second=report.rows_per_second,
+        )
+        return report
+
+    def _generate_records_from_stream(
+        self, stream: IO[bytes]
+    ) -> Iterator[ImportExportRecord]:
+        for line in stream:
+            if line.strip():
+                yield _record_adapter.validate_json(line)
+
+    def _generate_records_from_data(
+        self, data: ImportExportData
+    ) -> Iterator[ImportExportRecord]:
+        yield from (RepositoryRecord(data=r) for r in data.repositories)
+        yield from (PullRequestRecord(data=p) for p in data.pull_requests)
+        yield from (RepositoryRuleRecord(data=r) for r in data.repository_rules)
+        yield from (MergeRuleRecord(data=r) for r in data.merge_rules)
+        yield from (ExternalAccountRecord(data=a) for a in data.external_accounts)
+        yield from (
+            ExternalAccountRightRecord(data=r) for r in data.external_account_rights
+        )
 
-        for external_account_right in data.external_account_rights:
-            await self._external_account_right_db.get_or_create(external_account_right)
+    async def _generate_records_from_database(
+        self,
+    ) -> AsyncIterator[ImportExportRecord]:
+        async for repository in self._repository_db.iter_all():
+            yield RepositoryRecord(data=repository)
+        async for pull_request in self._pull_request_db.iter_all():
+            yield PullRequestRecord(data=_exported_pull_request(pull_request))
+        async for repository_rule in self._repository_rule_db.iter_all():
+            yield RepositoryRuleRecord(data=repository_rule)
+        async for merge_rule in self._merge_rule_db.iter_all():
+            yield MergeRuleRecord(data=merge_rule)
+        async for external_account in self._external_account_db.iter_all():
+            yield ExternalAccountRecord(data=external_account)
+        async for right in self._external_account_right_db.iter_all():
+            yield ExternalAccountRightRecord(data=right)
 
     def _generate_data_from_stream(self, stream: IO[bytes]) -> ImportExportData:
         return ImportExportData.model_validate_json(stream.read())
 
-    def _convert_compatibility_data_to_data(
-        self, previous: dict[str, Any]
-    ) -> ImportExportData:
-        data = ImportExportData(
-            repositories=[],
-            pull_requests=[],
-            repository_rules=[],
-            merge_rules=[],
-            external_accounts=[],
-            external_account_rights=[],
-        )
+    def _generate_records_from_compatibility_stream(
+        self, stream: IO[bytes]
+    ) -> Iterator[ImportExportRecord]:
+        """
+        Convert rows of a legacy dump while walking through it.
+
+        Sections are streamed once the sections they depend on were read,
+        and buffered until then.
+        """
+
         repository_ids: dict[int, RepositoryPath] = {}
+        read_sections: set[str] = set()
+        pending_sections: list[tuple[str, list[dict[str, Any]]]] = []
+
+        def convert_rows(
+            section: str, rows: Iterable[dict[str, Any]]
+        ) -> Iterator[ImportExportRecord]:
+            for row in rows:
+                yield self._convert_compatibility_row(section, row, repository_ids)
+
+        def is_ready(section: str) -> bool:
+            return _COMPATIBILITY_DEPENDENCIES.get(section, set()) <= read_sections
+
+        reader = JsonStreamReader(stream)
+        for section, rows in reader.iter_object_arrays():
+            if section not in _COMPATIBILITY_SECTIONS:
+                continue
+
+            if is_ready(section):
+                yield from convert_rows(section, rows)
+            else:
+                pending_sections.append((section, list(rows)))
+            read_sections.add(section)
+
+            still_pending = []
+            for pending_section, pending_rows in pending_sections:
+                if is_ready(pending_section):
+                    yield from convert_rows(pending_section, pending_rows)
+                else:
+                    still_pending.append((pending_section, pending_rows))
+            pending_sections = still_pending
 
-        # Read repositories
-        for repository_data in previous["repositories"]:
+        for pending_section, pending_rows in pending_sections:
+            yield from convert_rows(pending_section, pending_rows)
+
+    def _convert_compatibility_row(
+        self,
+        section: str,
+        row: dict[str, Any],
+        repository_ids: dict[int, RepositoryPath],
+    ) -> ImportExportRecord:
+        if section == "repositories":
             repository = Repository(
-                owner=repository_data["owner"],
-                name=repository_data["name"],
-                manual_interaction=repository_data["manual_interaction"],
-                pr_title_validation_regex=re.compile(
-                    repository_data["pr_title_validation_regex"]
-                ),
-                default_strategy=MergeStrategy(repository_data["default_strategy"]),
-                default_automerge=repository_data["default_automerge"],
-                default_enable_qa=repository_data["default_enable_qa"],
-                default_enable_checks=repository_data["default_enable_checks"],
+                owner=row["owner"],
+                name=row["name"],
+                manual_interaction=row["manual_interaction"],
+                pr_title_validation_regex=re.compile(row["pr_title_validation_regex"]),
+                default_strategy=MergeStrategy(row["default_strategy"]),
+                default_automerge=row["default_automerge"],
+                default_enable_qa=row["default_enable_qa"],
+                default_enable_checks=row["default_enable_checks"],
             )
+            repository_ids[row["id"]] = repository.path()
+            return RepositoryRecord(data=repository)
 
-            repository_ids[repository_data["id"]] = repository.path()
-            data.repositories.append(repository)
-
-        # Read pull requests
-        for pull_request_data in previous["pull_requests"]:
-            status_comment_id = pull_request_data["status_comment_id"]
-            if status_comment_id > 2**63:
+        elif section == "pull_requests":
+            status_comment_id = row["status_comment_id"]
+            if status_comment_id > 2**63 or status_comment_id < 0:
                 status_comment_id = 0
 
-            pull_request = PullRequest(
-                repository_path=copy.deepcopy(
-                    repository_ids[pull_request_data["repository_id"]]
-                ),
-                number=pull_request_data["number"],
-                qa_status=QaStatus(pull_request_data["qa_status"]),
-                status_comment_id=status_comment_id,
-                checks_enabled=pull_request_data["checks_enabled"],
-                automerge=pull_request_data["automerge"],
-                locked=pull_request_data["locked"],
-                strategy_override=MergeStrategy(pull_request_data["strategy_override"])
-                if pull_request_data["strategy_override"]
-                else None,
+            return PullRequestRecord(
+                data=PullRequest(
+                    repository_path=repository_ids[row["repository_id"]],
+                    number=row["number"],
+                    qa_status=QaStatus(row["qa_status"]),
+                    status_comment_id=status_comment_id,
+                    checks_enabled=row["checks_enabled"],
+                    automerge=row["automerge"],
+                    locked=row["locked"],
+                    strategy_override=MergeStrategy(row["strategy_override"])
+                    if row["strategy_override"]
+                    else None,
+                )
             )
-            data.pull_requests.append(pull_request)
-
-        # Read merge rules
-        for merge_rule_data in previous["merge_rules"]:
-            merge_rule = MergeRule(
-                repository_path=copy.deepcopy(
-                    repository_ids[merge_rule_data["repository_id"]]
-                ),
-                base_branch=RuleBranchFactory.from_str(merge_rule_data["base_branch"]),
-                head_branch=RuleBranchFactory.from_str(merge_rule_data["head_branch"]),
-                strategy=MergeStrategy(merge_rule_data["strategy"]),
+
+        elif section == "merge_rules":
+            return MergeRuleRecord(
+                data=MergeRule(
+                    repository_path=repository_ids[row["repository_id"]],
+                    base_branch=RuleBranchFactory.from_str(row["base_branch"]),
+                    head_branch=RuleBranchFactory.from_str(row["head_branch"]),
+                    strategy=MergeStrategy(row["strategy"]),
+                )
             )
-            data.merge_rules.append(merge_rule)
-
-        # External accounts
-        for external_account_data in previous["external_accounts"]:
-            external_account = ExternalAccount(
-                username=external_account_data["username"],
-                public_key=external_account_data["public_key"],
-                private_key=external_account_data["private_key"],
+
+        elif section == "external_accounts":
+            return ExternalAccountRecord(
+                data=ExternalAccount(
+                    username=row["username"],
+                    public_key=row["public_key"],
+                    private_key=row["private_key"],
+                )
             )
-            data.external_accounts.append(external_account)
-
-        # External account rights
-        for external_account_right_data in previous["external_account_rights"]:
-            right = ExternalAccountRight(
-                repository_path=copy.deepcopy(
-                    repository_ids[external_account_right_data["repository_id"]]
-                ),
-                username=external_account_right_data["username"],
+
+        elif section == "external_account_rights":
+            return ExternalAccountRightRecord(
+                data=ExternalAccountRight(
+                    repository_path=repository_ids[row["repository_id"]],
+                    username=row["username"],
+                )
             )
-            data.external_account_rights.append(right)
-
-        # Repository rules
-        for pull_request_rule_data in previous["pull_request_rules"]:
-            repository_rule = RepositoryRule(
-                repository_path=copy.deepcopy(
-                    repository_ids[pull_request_rule_data["repository_id"]]
-                ),
-                name=pull_request_rule_data["name"],
-                conditions=[
-                    RuleConditionFactory.from_dict(condition)
-                    for condition in pull_request_rule_data["conditions"]
-                ],
-                actions=[
-                    RuleActionFactory.from_dict(action)
-                    for action in pull_request_rule_data["actions"]
-                ],
+
+        elif section == "pull_request_rules":
+            return RepositoryRuleRecord(
+                data=RepositoryRule(
+                    repository_path=repository_ids[row["repository_id"]],
+                    name=row["name"],
+                    conditions=[
+                        RuleConditionFactory.from_dict(condition)
+                        for condition in row["conditions"]
+                    ],
+                    actions=[
+                        RuleActionFactory.from_dict(action) for action in row["actions"]
+                    ],
+                )
             )
-            data.repository_rules.append(repository_rule)
 
-        return data
+        raise ValueError(f"Unknown compatibility section: {section}")
 
     async def _generate_data_from_database(self) -> ImportExportData:
         return ImportExportData(
             repositories=await self._repository_db.all(),
-            pull_requests=await self._pull_request_db.all(),
+            pull_requests=[
+                _exported_pull_request(pull_request)
+                for pull_request in await self._pull_request_db.all()
+            ],
             repository_rules=await self._repository_rule_db.all(),
             merge_rules=await self._merge_rule_db.all(),
             external_accounts=await self._external_account_db.all(),
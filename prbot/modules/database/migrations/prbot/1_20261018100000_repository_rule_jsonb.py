@@ -0,0 +1,44 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "repository_rule" ALTER COLUMN "conditions" TYPE JSONB USING "conditions"::JSONB;
+ALTER TABLE "repository_rule" ALTER COLUMN "actions" TYPE JSONB USING "actions"::JSONB;
+ALTER TABLE "repository_rule" ADD "author" VARCHAR(255);
+ALTER TABLE "repository_rule" ADD "base_branch" VARCHAR(255);
+ALTER TABLE "repository_rule" ADD "head_branch" VARCHAR(255);
+UPDATE "repository_rule" SET
+    "author" = (
+        SELECT "condition"->>'value'
+        FROM jsonb_array_elements("conditions") WITH ORDINALITY AS c("condition", "position")
+        WHERE "condition"->>'type' = 'author'
+        ORDER BY "position" LIMIT 1
+    ),
+    "base_branch" = (
+        SELECT CASE WHEN "condition"->'value'->>'type' = 'named' THEN "condition"->'value'->>'value' END
+        FROM jsonb_array_elements("conditions") WITH ORDINALITY AS c("condition", "position")
+        WHERE "condition"->>'type' = 'base_branch'
+        ORDER BY "position" LIMIT 1
+    ),
+    "head_branch" = (
+        SELECT CASE WHEN "condition"->'value'->>'type' = 'named' THEN "condition"->'value'->>'value' END
+        FROM jsonb_array_elements("conditions") WITH ORDINALITY AS c("condition", "position")
+        WHERE "condition"->>'type' = 'head_branch'
+        ORDER BY "position" LIMIT 1
+    );
+CREATE INDEX "idx_repository__reposit_author" ON "repository_rule" ("repository_id", "author");
+CREATE INDEX "idx_repository__reposit_base_branch" ON "repository_rule" ("repository_id", "base_branch");
+CREATE INDEX "idx_repository__reposit_head_branch" ON "repository_rule" ("repository_id", "head_branch");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX "idx_repository__reposit_head_branch";
+DROP INDEX "idx_repository__reposit_base_branch";
+DROP INDEX "idx_repository__reposit_author";
+ALTER TABLE "repository_rule" DROP COLUMN "head_branch";
+ALTER TABLE "repository_rule" DROP COLUMN "base_branch";
+ALTER TABLE "repository_rule" DROP COLUMN "author";
+ALTER TABLE "repository_rule" ALTER COLUMN "actions" TYPE TEXT USING "actions"::TEXT;
+ALTER TABLE "repository_rule" ALTER COLUMN "conditions" TYPE TEXT USING "conditions"::TEXT;"""
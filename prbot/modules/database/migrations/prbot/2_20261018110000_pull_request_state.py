@@ -0,0 +1,24 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "pull_request_state" (
+    "pull_request_id" INT NOT NULL PRIMARY KEY REFERENCES "pull_request" ("id") ON DELETE CASCADE,
+    "step_label" VARCHAR(255) NOT NULL,
+    "check_status" VARCHAR(255) NOT NULL,
+    "qa_status" VARCHAR(255) NOT NULL,
+    "review_decision" VARCHAR(255),
+    "mergeable" BOOL NOT NULL,
+    "merged" BOOL NOT NULL,
+    "head_sha" VARCHAR(255) NOT NULL,
+    "updated_at" TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX "idx_pull_reques_step_la_state" ON "pull_request_state" ("step_label");
+CREATE INDEX "idx_pull_reques_qa_stat_state" ON "pull_request_state" ("qa_status");
+CREATE INDEX "idx_pull_reques_check_s_state" ON "pull_request_state" ("check_status");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "pull_request_state";"""
@@ -0,0 +1,21 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "pull_request_snapshot" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "owner" VARCHAR(255) NOT NULL,
+    "name" VARCHAR(255) NOT NULL,
+    "number" INT NOT NULL,
+    "head_sha" VARCHAR(255) NOT NULL,
+    "updated_at" TIMESTAMPTZ NOT NULL,
+    "stored_at" TIMESTAMPTZ NOT NULL,
+    "data" JSONB NOT NULL,
+    CONSTRAINT "uid_pull_reques_owner_snapshot" UNIQUE ("owner", "name", "number")
+);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "pull_request_snapshot";"""
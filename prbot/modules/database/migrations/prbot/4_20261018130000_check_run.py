@@ -0,0 +1,29 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "check_run" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "owner" VARCHAR(255) NOT NULL,
+    "name" VARCHAR(255) NOT NULL,
+    "head_sha" VARCHAR(255) NOT NULL,
+    "check_name" VARCHAR(255) NOT NULL,
+    "started_at" TIMESTAMPTZ NOT NULL,
+    "data" JSONB NOT NULL,
+    CONSTRAINT "uid_check_run_owner_check_name" UNIQUE ("owner", "name", "head_sha", "check_name")
+);
+CREATE TABLE IF NOT EXISTS "commit_checks" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "owner" VARCHAR(255) NOT NULL,
+    "name" VARCHAR(255) NOT NULL,
+    "head_sha" VARCHAR(255) NOT NULL,
+    "listed_at" TIMESTAMPTZ NOT NULL,
+    CONSTRAINT "uid_commit_chec_owner_head_sha" UNIQUE ("owner", "name", "head_sha")
+);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "commit_checks";
+DROP TABLE IF EXISTS "check_run";"""
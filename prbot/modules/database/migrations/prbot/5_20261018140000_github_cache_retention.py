@@ -0,0 +1,13 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE INDEX "idx_pull_reques_stored__1f6a3c" ON "pull_request_snapshot" ("stored_at");
+CREATE INDEX "idx_commit_chec_listed__7b2d94" ON "commit_checks" ("listed_at");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX "idx_commit_chec_listed__7b2d94";
+DROP INDEX "idx_pull_reques_stored__1f6a3c";"""
@@ -0,0 +1,29 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "qa_status_job" (
+    "id" UUID NOT NULL PRIMARY KEY,
+    "owner" VARCHAR(255) NOT NULL,
+    "name" VARCHAR(255) NOT NULL,
+    "qa_status" VARCHAR(255) NOT NULL,
+    "author" VARCHAR(255) NOT NULL,
+    "username" VARCHAR(255) NOT NULL,
+    "created_at" TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX "idx_qa_status_j_created_4c1e7a" ON "qa_status_job" ("created_at");
+CREATE TABLE IF NOT EXISTS "qa_status_job_item" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "number" INT NOT NULL,
+    "status" VARCHAR(255) NOT NULL,
+    "error" TEXT,
+    "job_id" UUID NOT NULL REFERENCES "qa_status_job" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_qa_status_j_job_id_8e2b15" UNIQUE ("job_id", "number")
+);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "qa_status_job_item";
+DROP TABLE IF EXISTS "qa_status_job";"""
@@ -0,0 +1,15 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "qa_status_job" ADD "heartbeat_at" TIMESTAMPTZ;
+UPDATE "qa_status_job" SET "heartbeat_at" = "created_at";
+ALTER TABLE "qa_status_job" ALTER COLUMN "heartbeat_at" SET NOT NULL;
+CREATE INDEX "idx_qa_status_j_heartbe_5d8e21" ON "qa_status_job" ("heartbeat_at");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX "idx_qa_status_j_heartbe_5d8e21";
+ALTER TABLE "qa_status_job" DROP COLUMN "heartbeat_at";"""
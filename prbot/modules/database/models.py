@@ -1,3 +1,6 @@
+from typing import Any
+from uuid import UUID
+
 from tortoise import fields
 from tortoise.models import Model
 
@@ -39,14 +42,114 @@ class PullRequestModel(Model):
         unique_together = [("repository", "number")]
 
 
+class PullRequestStateModel(Model):
+    pull_request = fields.OneToOneField(
+        "prbot.PullRequestModel", related_name="state", primary_key=True
+    )
+    step_label = fields.CharField(max_length=255)
+    check_status = fields.CharField(max_length=255)
+    qa_status = fields.CharField(max_length=255)
+    review_decision = fields.CharField(max_length=255, null=True)
+    mergeable = fields.BooleanField()
+    merged = fields.BooleanField()
+    head_sha = fields.CharField(max_length=255)
+    updated_at = fields.DatetimeField()
+
+    # For typing
+    pull_request_id: int
+
+    class Meta:
+        table = "pull_request_state"
+        indexes = [("step_label",), ("qa_status",), ("check_status",)]
+
+
+class PullRequestSnapshotModel(Model):
+    id = fields.IntField(primary_key=True)
+    owner = fields.CharField(max_length=255)
+    name = fields.CharField(max_length=255)
+    number = fields.IntField()
+    head_sha = fields.CharField(max_length=255)
+    # Upstream update date, used to reject out-of-order events
+    updated_at = fields.DatetimeField()
+    stored_at = fields.DatetimeField(db_index=True)
+    data: dict[str, Any] = fields.JSONField()
+
+    class Meta:
+        table = "pull_request_snapshot"
+        unique_together = [("owner", "name", "number")]
+
+
+class CheckRunModel(Model):
+    id = fields.IntField(primary_key=True)
+    owner = fields.CharField(max_length=255)
+    name = fields.CharField(max_length=255)
+    head_sha = fields.CharField(max_length=255)
+    # Only the last run of each check is kept
+    check_name = fields.CharField(max_length=255)
+    started_at = fields.DatetimeField()
+    data: dict[str, Any] = fields.JSONField()
+
+    class Meta:
+        table = "check_run"
+        unique_together = [("owner", "name", "head_sha", "check_name")]
+
+
+class CommitChecksModel(Model):
+    """Commits whose check runs were fully listed once, then kept up to date."""
+
+    id = fields.IntField(primary_key=True)
+    owner = fields.CharField(max_length=255)
+    name = fields.CharField(max_length=255)
+    head_sha = fields.CharField(max_length=255)
+    listed_at = fields.DatetimeField(db_index=True)
+
+    class Meta:
+        table = "commit_checks"
+        unique_together = [("owner", "name", "head_sha")]
+
+
+class QaStatusJobModel(Model):
+    id = fields.UUIDField(primary_key=True)
+    owner = fields.CharField(max_length=255)
+    name = fields.CharField(max_length=255)
+    qa_status = fields.CharField(max_length=255)
+    author = fields.CharField(max_length=255)
+    username = fields.CharField(max_length=255)
+    created_at = fields.DatetimeField(db_index=True)
+    # Refreshed by the worker running the job, stale once it stopped
+    heartbeat_at = fields.DatetimeField(db_index=True)
+
+    class Meta:
+        table = "qa_status_job"
+
+
+class QaStatusJobItemModel(Model):
+    id = fields.IntField(primary_key=True)
+    job = fields.ForeignKeyField("prbot.QaStatusJobModel", related_name="items")
+    number = fields.IntField()
+    status = fields.CharField(max_length=255)
+    error = fields.TextField(null=True)
+
+    # For typing
+    job_id: UUID
+
+    class Meta:
+        table = "qa_status_job_item"
+        unique_together = [("job", "number")]
+
+
 class RepositoryRuleModel(Model):
     id = fields.IntField(primary_key=True)
     repository = fields.ForeignKeyField(
         "prbot.RepositoryModel", related_name="repository_rules"
     )
     name = fields.CharField(max_length=255)
-    conditions = fields.TextField()
-    actions = fields.TextField()
+    conditions: list[dict[str, Any]] = fields.JSONField()
+    actions: list[dict[str, Any]] = fields.JSONField()
+    # Projection of the first author and named branch conditions, NULL means any
+    author = fields.CharField(max_length=255, null=True)
+    base_branch = fields.CharField(max_length=255, null=True)
+    head_branch = fields.CharField(max_length=255, null=True)
 
     # For typing
     repository_id: int
@@ -54,6 +157,11 @@ class RepositoryRuleModel(Model):
     class Meta:
         table = "repository_rule"
         unique_together = [("repository", "name")]
+        indexes = [
+            ("repository", "author"),
+            ("repository", "base_branch"),
+            ("repository", "head_branch"),
+        ]
 
 
 class MergeRuleModel(Model):
@@ -0,0 +1,184 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Sequence, TypeVar
+
+from tortoise.backends.base.executor import BaseExecutor
+from tortoise.expressions import Subquery
+from tortoise.models import Model
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
+
+ModelT = TypeVar("ModelT", bound=Model)
+
+# Bind parameters allowed in a single statement by PostgreSQL
+MAX_QUERY_PARAMETERS = 32767
+
+
+def _to_db_value(
+    model: type[Model], executor: BaseExecutor, column: str, value: Any
+) -> Any:
+    # Convert values as the ORM would do, e.g. for dates on SQLite
+    field = model._meta.fields_map.get(column)
+    if field is None:
+        return value
+    return executor._field_to_db(field, value, model)
+
+
+def _is_not_newer(table: Any, version_field: str) -> Any:
+    # Compare an existing row with the one proposed for insertion
+    excluded = type(table)("excluded")
+    return table[version_field] <= excluded[version_field]
+
+
+async def update_returning(queryset: QuerySet[ModelT], **fields: Any) -> list[ModelT]:
+    """
+    Update rows matching a queryset using a single `UPDATE ... RETURNING` statement.
+
+    The queryset filters must only target columns of the updated table
+    (use a `Subquery` to filter on related tables), as joins are not allowed
+    in an `UPDATE` statement.
+    """
+
+    update_query = queryset.update(**fields)
+    query = update_query.as_query()
+
+    model = queryset.model
+    rows = await model._meta.db.execute_query_dict(
+        f"{query.get_sql()} RETURNING *", update_query.values
+    )
+    return [model._init_from_db(**row) for row in rows]
+
+
+async def upsert_returning(
+    model: type[ModelT],
+    *,
+    values: dict[str, Any],
+    conflict_fields: Sequence[str],
+    update_fields: Sequence[str],
+    version_field: str | None = None,
+) -> ModelT | None:
+    """
+    Insert a row, or update it when it conflicts with an existing one, using a single
+    `INSERT ... ON CONFLICT DO UPDATE ... RETURNING` statement.
+
+    `values` are keyed by column name, and can contain a `Subquery`.
+    Without `update_fields`, conflicts are ignored and `None` is returned.
+    With a `version_field`, an existing row is only updated when its version is not
+    greater than the new one, else `None` is returned.
+    """
+
+    db = model._meta.db
+    executor = db.executor_class(model=model, db=db)
+
+    params = []
+    terms = []
+    for column, value in values.items():
+        if isinstance(value, Subquery):
+            terms.append(value)
+        else:
+            terms.append(executor.parameter(len(params)))
+            params.append(_to_db_value(model, executor, column, value))
+
+    table = model._meta.basetable
+    query = (
+        db.query_class.into(table)
+        .columns(*values.keys())
+        .insert(*terms)
+        .on_conflict(*conflict_fields)
+    )
+    if update_fields:
+        for field in update_fields:
+            query = query.do_update(field)
+        if version_field is not None:
+            query = query.where(_is_not_newer(table, version_field))
+    else:
+        query = query.do_nothing()
+
+    rows = await db.execute_query_dict(f"{query.get_sql()} RETURNING *", params)
+    if len(rows) == 0:
+        return None
+
+    return model._init_from_db(**rows[0])
+
+
+async def bulk_upsert(
+    model: type[Model],
+    *,
+    rows: Sequence[dict[str, Any]],
+    conflict_fields: Sequence[str],
+    update_fields: Sequence[str],
+    version_field: str | None = None,
+) -> None:
+    """
+    Insert many rows, or update them when they conflict with existing ones, using
+    multi-row `INSERT ... ON CONFLICT` statements.
+
+    Rows are split in as few statements as the bind parameter limit allows.
+
+    `rows` are keyed by column name and must all have the same columns.
+    A same row must not be present twice, as it cannot be updated twice
+    in the same statement.
+    Without `update_fields`, conflicts are ignored.
+    With a `version_field`, existing rows are only updated when their version is not
+    greater than the new one.
+    """
+
+    if len(rows) == 0:
+        return
+
+    db = model._meta.db
+    executor = db.executor_class(model=model, db=db)
+    columns = list(rows[0].keys())
+    table = model._meta.basetable
+    rows_per_statement = max(1, MAX_QUERY_PARAMETERS // len(columns))
+
+    for start in range(0, len(rows), rows_per_statement):
+        params = []
+        query = db.query_class.into(table).columns(*columns)
+        for row in rows[start : start + rows_per_statement]:
+            terms = []
+            for column in columns:
+                terms.append(executor.parameter(len(params)))
+                params.append(_to_db_value(model, executor, column, row[column]))
+            query = query.insert(*terms)
+
+        query = query.on_conflict(*conflict_fields)
+        if update_fields:
+            for field in update_fields:
+                query = query.do_update(field)
+            if version_field is not None:
+                query = query.where(_is_not_newer(table, version_field))
+        else:
+            query = query.do_nothing()
+
+        await db.execute_query(query.get_sql(), params)
+
+
+async def iter_pages(
+    queryset: QuerySet[ModelT], *, page_size: int, key: str = "id"
+) -> AsyncIterator[list[ModelT]]:
+    """
+    Iterate over a queryset by pages, using keyset pagination on a unique `key`.
+
+    Contrary to `OFFSET`, each page is fetched in constant time.
+    """
+
+    last_key = None
+    while True:
+        page_query = queryset.order_by(key).limit(page_size)
+        if last_key is not None:
+            page_query = page_query.filter(**{f"{key}__gt": last_key})
+
+        page = await page_query
+        if len(page) > 0:
+            yield page
+        if len(page) < page_size:
+            return
+
+        last_key = getattr(page[-1], key)
+
+
+@asynccontextmanager
+async def transaction() -> AsyncGenerator[None, None]:
+    """Run the database calls of a block in a single transaction."""
+    async with in_transaction():
+        yield
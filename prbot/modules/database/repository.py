@@ -1,22 +1,34 @@
+import datetime
 import re
 from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator
 
 import structlog
+from pydantic import BaseModel
 
 from prbot.core.models import (
+    CheckStatus,
     ExternalAccount,
     ExternalAccountRight,
     MergeRule,
     MergeStrategy,
     PullRequest,
+    PullRequestSnapshot,
+    PullRequestState,
     QaStatus,
+    QaStatusJob,
+    QaStatusJobItemStatus,
     Repository,
     RepositoryRule,
     RuleBranch,
 )
+from prbot.core.step.models import StepLabel
+from prbot.modules.github.models import GhCheckRun, GhPullRequest
 
 logger = structlog.get_logger()
 
+DEFAULT_PAGE_SIZE = 500
+
 
 class UnknownRepository(Exception):
     def __init__(self, *, owner: str, name: str) -> None:
@@ -56,6 +68,11 @@ class RepositoryDatabase(ABC):
     @abstractmethod
     async def all(self) -> list[Repository]: ...
 
+    @abstractmethod
+    def iter_all(
+        self, *, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[Repository]: ...
+
     @abstractmethod
     async def create(self, repository: Repository) -> Repository: ...
 
@@ -68,6 +85,14 @@ class RepositoryDatabase(ABC):
     @abstractmethod
     async def get(self, *, owner: str, name: str) -> Repository | None: ...
 
+    @abstractmethod
+    async def patch(self, *, owner: str, name: str, **fields: Any) -> Repository:
+        """
+        Update some fields of a repository in one go, and return the updated repository.
+
+        Raises `UnknownRepository` if the repository does not exist.
+        """
+
     @abstractmethod
     async def set_default_strategy(
         self, *, owner: str, name: str, strategy: MergeStrategy
@@ -115,6 +140,11 @@ class PullRequestDatabase(ABC):
     @abstractmethod
     async def all(self) -> list[PullRequest]: ...
 
+    @abstractmethod
+    def iter_all(
+        self, *, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[PullRequest]: ...
+
     @abstractmethod
     async def filter(self, *, owner: str, name: str) -> list[PullRequest]: ...
 
@@ -123,11 +153,31 @@ class PullRequestDatabase(ABC):
         self, *, owner: str, name: str, number: int
     ) -> PullRequest | None: ...
 
+    @abstractmethod
+    async def patch(
+        self, *, owner: str, name: str, number: int, **fields: Any
+    ) -> PullRequest:
+        """
+        Update some fields of a pull request in one go, and return the updated pull request.
+
+        Raises `UnknownPullRequest` if the pull request does not exist.
+        """
+
     @abstractmethod
     async def set_qa_status(
         self, *, owner: str, name: str, number: int, qa_status: QaStatus
     ) -> None: ...
 
+    @abstractmethod
+    async def set_qa_status_many(
+        self, *, owner: str, name: str, numbers: list[int], qa_status: QaStatus
+    ) -> list[int]:
+        """
+        Set the QA status of several pull requests with a single statement.
+
+        Returns the numbers of the pull requests which exist, and were updated.
+        """
+
     @abstractmethod
     async def set_checks_enabled(
         self, *, owner: str, name: str, number: int, value: bool
@@ -138,6 +188,22 @@ class PullRequestDatabase(ABC):
         self, *, owner: str, name: str, number: int, status_comment_id: int
     ) -> None: ...
 
+    @abstractmethod
+    async def compare_and_set_status_comment_id(
+        self,
+        *,
+        owner: str,
+        name: str,
+        number: int,
+        expected: int,
+        status_comment_id: int,
+    ) -> bool:
+        """
+        Set the status comment ID only if it is still `expected`, atomically.
+
+        Returns whether it was set.
+        """
+
     @abstractmethod
     async def set_merge_strategy(
         self, *, owner: str, name: str, number: int, strategy: MergeStrategy | None
@@ -185,6 +251,11 @@ class MergeRuleDatabase(ABC):
     @abstractmethod
     async def all(self) -> list[MergeRule]: ...
 
+    @abstractmethod
+    def iter_all(
+        self, *, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[MergeRule]: ...
+
     @abstractmethod
     async def create(self, merge_rule: MergeRule) -> MergeRule: ...
 
@@ -230,13 +301,137 @@ class MergeRuleDatabase(ABC):
             return await self.create(merge_rule)
 
 
+class PullRequestStatePage(BaseModel):
+    items: list[PullRequestState]
+    # Cursor to pass to get the next page, or None on the last page
+    next_cursor: int | None
+
+
+class PullRequestStateDatabase(ABC):
+    @abstractmethod
+    async def get(
+        self, *, owner: str, name: str, number: int
+    ) -> PullRequestState | None: ...
+
+    @abstractmethod
+    async def create_or_update(
+        self, pull_request_state: PullRequestState
+    ) -> PullRequestState:
+        """
+        Store the last computed state of a pull request.
+
+        Raises `UnknownPullRequest` if the pull request does not exist.
+        """
+
+    @abstractmethod
+    async def filter(
+        self,
+        *,
+        owner: str | None = None,
+        name: str | None = None,
+        step_label: StepLabel | None = None,
+        check_status: CheckStatus | None = None,
+        qa_status: QaStatus | None = None,
+        username: str | None = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: int | None = None,
+    ) -> PullRequestStatePage:
+        """
+        Get a page of pull request states, optionally filtered.
+
+        With a `username`, only repositories on which this external account
+        has a right are listed.
+        """
+
+
+class PullRequestSnapshotDatabase(ABC):
+    @abstractmethod
+    async def get(
+        self, *, owner: str, name: str, number: int
+    ) -> PullRequestSnapshot | None: ...
+
+    @abstractmethod
+    async def store(
+        self, *, owner: str, name: str, pull_request: GhPullRequest
+    ) -> bool:
+        """
+        Store the upstream data of a pull request, unless a more recent one is stored.
+
+        Returns whether the snapshot was stored.
+        """
+
+    @abstractmethod
+    async def discard_outdated(
+        self, *, owner: str, name: str, number: int, head_sha: str
+    ) -> None:
+        """Remove a snapshot which does not point to the given head commit."""
+
+    @abstractmethod
+    async def purge(self, *, stored_before: datetime.datetime) -> int:
+        """Remove snapshots stored before a date, returning how many were removed."""
+
+
+class CheckRunDatabase(ABC):
+    @abstractmethod
+    async def get_for_commit(
+        self, *, owner: str, name: str, head_sha: str, max_age_seconds: int
+    ) -> list[GhCheckRun] | None:
+        """
+        Get the last run of each check for a commit, or None if its check runs
+        were not fully listed in the last `max_age_seconds`.
+        """
+
+    @abstractmethod
+    async def store(self, *, owner: str, name: str, check_run: GhCheckRun) -> None:
+        """
+        Store a check run, unless a more recent run of the same check is stored.
+
+        Check runs are only stored for commits which were listed,
+        others are ignored until listed.
+        """
+
+    @abstractmethod
+    async def store_listing(
+        self, *, owner: str, name: str, head_sha: str, check_runs: list[GhCheckRun]
+    ) -> None:
+        """
+        Store the full listing of check runs for a commit, with one run per check.
+
+        An empty listing is not stored, as checks might not be created yet.
+        """
+
+    @abstractmethod
+    async def purge(self, *, listed_before: datetime.datetime) -> int:
+        """
+        Remove the check runs of commits listed before a date,
+        returning how many commits were removed.
+        """
+
+
 class RepositoryRuleDatabase(ABC):
     @abstractmethod
     async def all(self) -> list[RepositoryRule]: ...
 
+    @abstractmethod
+    def iter_all(
+        self, *, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[RepositoryRule]: ...
+
     @abstractmethod
     async def filter(self, *, owner: str, name: str) -> list[RepositoryRule]: ...
 
+    @abstractmethod
+    async def filter_candidates(
+        self, *, owner: str, name: str, author: str, base_branch: str, head_branch: str
+    ) -> list[RepositoryRule]:
+        """
+        Get the rules which might match a pull request, using the indexed author
+        and branch projection.
+
+        Pattern and additional conditions are not checked,
+        use a `RuleIndex` on the result to get the matching rules.
+        """
+
     @abstractmethod
     async def create(self, repository_rule: RepositoryRule) -> RepositoryRule: ...
 
@@ -276,6 +471,11 @@ class ExternalAccountDatabase(ABC):
     @abstractmethod
     async def all(self) -> list[ExternalAccount]: ...
 
+    @abstractmethod
+    def iter_all(
+        self, *, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[ExternalAccount]: ...
+
     @abstractmethod
     async def get(self, *, username: str) -> ExternalAccount | None: ...
 
@@ -311,6 +511,11 @@ class ExternalAccountRightDatabase(ABC):
     @abstractmethod
     async def all(self) -> list[ExternalAccountRight]: ...
 
+    @abstractmethod
+    def iter_all(
+        self, *, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AsyncIterator[ExternalAccountRight]: ...
+
     @abstractmethod
     async def create(self, right: ExternalAccountRight) -> ExternalAccountRight: ...
 
@@ -342,3 +547,38 @@ class ExternalAccountRightDatabase(ABC):
         if existing is None:
             return await self.create(right)
         return existing
+
+
+class QaStatusJobDatabase(ABC):
+    @abstractmethod
+    async def create(self, job: QaStatusJob) -> QaStatusJob: ...
+
+    @abstractmethod
+    async def get(self, *, job_id: str) -> QaStatusJob | None: ...
+
+    @abstractmethod
+    async def set_item_status(
+        self,
+        *,
+        job_id: str,
+        number: int,
+        status: QaStatusJobItemStatus,
+        error: str | None = None,
+    ) -> None: ...
+
+    @abstractmethod
+    async def heartbeat(self, *, job_ids: list[str], at: datetime.datetime) -> None:
+        """Record that jobs are still being run."""
+
+    @abstractmethod
+    async def fail_abandoned(
+        self, *, heartbeat_before: datetime.datetime, error: str
+    ) -> int:
+        """
+        Fail the pending items of jobs without heartbeat since a date,
+        returning how many items were failed.
+        """
+
+    @abstractmethod
+    async def purge(self, *, created_before: datetime.datetime) -> int:
+        """Remove jobs created before a date, returning how many were removed."""
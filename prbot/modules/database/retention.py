@@ -0,0 +1,69 @@
+import asyncio
+import datetime
+from typing import NamedTuple
+
+import structlog
+
+from prbot.config.settings import get_global_settings
+from prbot.injection import inject_instance
+
+from .repository import (
+    CheckRunDatabase,
+    PullRequestSnapshotDatabase,
+    QaStatusJobDatabase,
+)
+
+logger = structlog.get_logger()
+
+PURGE_INTERVAL_SECONDS = 3600
+
+
+class PurgeReport(NamedTuple):
+    snapshots: int
+    commits: int
+    jobs: int
+
+
+async def purge_github_cache() -> PurgeReport:
+    """
+    Remove pull request snapshots and check runs older than the retention,
+    and QA status jobs older than theirs.
+    """
+
+    settings = get_global_settings()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    before = now - datetime.timedelta(seconds=settings.github_cache_retention_seconds)
+    jobs_before = now - datetime.timedelta(
+        seconds=settings.qa_status_job_retention_seconds
+    )
+
+    report = PurgeReport(
+        snapshots=await inject_instance(PullRequestSnapshotDatabase).purge(
+            stored_before=before
+        ),
+        commits=await inject_instance(CheckRunDatabase).purge(listed_before=before),
+        jobs=await inject_instance(QaStatusJobDatabase).purge(
+            created_before=jobs_before
+        ),
+    )
+    logger.info(
+        "Purged GitHub cache",
+        snapshots=report.snapshots,
+        commits=report.commits,
+        jobs=report.jobs,
+    )
+    return report
+
+
+async def run_purge_loop() -> None:
+    """Purge the GitHub cache periodically, until cancelled."""
+
+    while True:
+        try:
+            await purge_github_cache()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Could not purge GitHub cache", exc_info=True)
+
+        await asyncio.sleep(PURGE_INTERVAL_SECONDS)
@@ -0,0 +1,145 @@
+import codecs
+import json
+from typing import IO, Any, Iterator
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",:]}"
+
+
+class JsonStreamReader:
+    """
+    Incrementally read JSON values from a binary stream, by chunks.
+
+    Only the current chunk and the value being decoded are kept in memory.
+    """
+
+    _stream: IO[bytes]
+    _chunk_size: int
+    _decoder: json.JSONDecoder
+    _text_decoder: codecs.IncrementalDecoder
+    _buffer: str
+    _position: int
+    _eof: bool
+
+    def __init__(
+        self, stream: IO[bytes], *, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> None:
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def iter_object_arrays(self) -> Iterator[tuple[str, Iterator[Any]]]:
+        """
+        Walk a top-level object, yielding each array member with an iterator
+        over its items.
+
+        Non-array members are skipped.
+        Items which were not consumed are skipped before moving to the next member.
+        """
+
+        self._expect("{")
+        if self._peek() == "}":
+            self._position += 1
+            return
+
+        while True:
+            key = self._read_value()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected an object key, got {key!r}")
+            self._expect(":")
+
+            if self._peek() == "[":
+                items = self._iter_array()
+                yield key, items
+                for _ in items:
+                    pass
+            else:
+                self._read_value()
+
+            if self._peek() == ",":
+                self._position += 1
+                continue
+
+            self._expect("}")
+            return
+
+    def _iter_array(self) -> Iterator[Any]:
+        self._expect("[")
+        if self._peek() == "]":
+            self._position += 1
+            return
+
+        while True:
+            yield self._read_value()
+
+            if self._peek() == ",":
+                self._position += 1
+                continue
+
+            self._expect("]")
+            return
+
+    def _read_value(self) -> Any:
+        self._skip_whitespace()
+
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+                # A value not followed by a delimiter might be truncated (e.g. a number)
+                if self._eof or (
+                    end < len(self._buffer) and self._buffer[end] in _DELIMITERS
+                ):
+                    self._position = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+
+            self._fill()
+
+    def _expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' in JSON stream, got '{found}'")
+        self._position += 1
+
+    def _peek(self) -> str:
+        self._skip_whitespace()
+        if self._position >= len(self._buffer):
+            raise ValueError("Unexpected end of JSON stream")
+        return self._buffer[self._position]
+
+    def _skip_whitespace(self) -> None:
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in _WHITESPACE
+            ):
+                self._position += 1
+
+            if self._position < len(self._buffer) or not self._fill():
+                return
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            self._buffer = self._buffer[self._position :] + self._text_decoder.decode(
+                b"", final=True
+            )
+            self._position = 0
+            return False
+
+        # Drop the consumed part of the buffer
+        self._buffer = self._buffer[self._position :] + self._text_decoder.decode(chunk)
+        self._position = 0
+        return True
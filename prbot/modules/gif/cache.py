@@ -0,0 +1,54 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+
+class GifCacheEntry(NamedTuple):
+    # None when the query had no result
+    url: str | None
+    expires_at: float
+
+    def is_fresh(self) -> bool:
+        return self.expires_at > time.monotonic()
+
+
+class GifCache:
+    """
+    LRU cache of GIF URLs by query, with a TTL.
+
+    Queries without results are cached for a shorter time. Expired entries
+    are kept until evicted, to be used as a fallback when Tenor is unavailable.
+    """
+
+    _entries: OrderedDict[str, GifCacheEntry]
+    _max_size: int
+    _ttl: float
+    _negative_ttl: float
+
+    def __init__(self, *, max_size: int, ttl: float, negative_ttl: float) -> None:
+        self._entries = OrderedDict()
+        self._max_size = max_size
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+
+    def get(self, query: str) -> GifCacheEntry | None:
+        entry = self._entries.get(query)
+        if entry is not None:
+            self._entries.move_to_end(query)
+        return entry
+
+    def set(self, query: str, url: str | None) -> None:
+        self._entries[query] = GifCacheEntry(
+            url=url, expires_at=time.monotonic() + self.ttl(url)
+        )
+        self._entries.move_to_end(query)
+
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def ttl(self, url: str | None) -> float:
+        return self._ttl if url is not None else self._negative_ttl
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
@@ -1,10 +1,19 @@
+import asyncio
 from abc import ABC, abstractmethod
 
+import structlog
+from redis.asyncio import Redis
+
 from prbot.config.settings import get_global_settings
 from prbot.modules.http.client import HttpClient, HttpClientImplementation
 
+from .cache import GifCache, normalize_query
 from .models import TenorGifResponse
 
+logger = structlog.get_logger()
+
+SHARED_CACHE_PREFIX = "prbot:gif:"
+
 
 class GifClient(ABC):
     _client: HttpClient
@@ -21,15 +30,55 @@ class GifClient(ABC):
 
 class GifClientImplementation(GifClient):
     _client: HttpClient
+    _cache: GifCache
+    _shared_cache: Redis | None
+    _timeout: float
 
     def __init__(self, client: HttpClient | None = None) -> None:
+        settings = get_global_settings()
+
         self._client = client or HttpClientImplementation()
         self._client.configure(headers={}, base_url="https://g.tenor.com/v1")
+        self._cache = GifCache(
+            max_size=settings.gif_cache_size,
+            ttl=settings.gif_cache_ttl_seconds,
+            negative_ttl=settings.gif_negative_cache_ttl_seconds,
+        )
+        self._shared_cache = None
+        if settings.gif_shared_cache and not settings.uses_memory_lock():
+            self._shared_cache = Redis.from_url(settings.lock_url)
+        self._timeout = settings.gif_request_timeout_seconds
 
     async def aclose(self) -> None:
         await self._client.aclose()
+        if self._shared_cache is not None:
+            await self._shared_cache.aclose()
 
     async def query_first_match(self, query: str) -> str | None:
+        query = normalize_query(query)
+
+        entry = self._cache.get(query)
+        if entry is not None and entry.is_fresh():
+            return entry.url
+
+        found, url = await self._get_shared(query)
+        if found:
+            self._cache.set(query, url)
+            return url
+
+        try:
+            async with asyncio.timeout(self._timeout):
+                url = await self._search(query)
+        except Exception:
+            logger.warning("Could not query Tenor", query=query, exc_info=True)
+            # Better an expired result than nothing
+            return entry.url if entry is not None else None
+
+        self._cache.set(query, url)
+        await self._set_shared(query, url)
+        return url
+
+    async def _search(self, query: str) -> str | None:
         settings = get_global_settings()
 
         response = await self._client.request(
@@ -49,6 +98,35 @@ class GifClientImplementation(GifClient):
         data = TenorGifResponse.model_validate(response.json())
         return self._find_first_gif(data)
 
+    async def _get_shared(self, query: str) -> tuple[bool, str | None]:
+        if self._shared_cache is None:
+            return False, None
+
+        try:
+            value = await self._shared_cache.get(f"{SHARED_CACHE_PREFIX}{query}")
+        except Exception:
+            logger.warning("Could not read shared GIF cache", exc_info=True)
+            return False, None
+
+        if value is None:
+            return False, None
+
+        # An empty value is a query without results
+        return True, value.decode() or None
+
+    async def _set_shared(self, query: str, url: str | None) -> None:
+        if self._shared_cache is None:
+            return
+
+        try:
+            await self._shared_cache.set(
+                f"{SHARED_CACHE_PREFIX}{query}",
+                url or "",
+                ex=int(self._cache.ttl(url)),
+            )
+        except Exception:
+            logger.warning("Could not write shared GIF cache", exc_info=True)
+
     def _find_first_gif(self, response: TenorGifResponse) -> str | None:
         for result in response.results:
             for media in result.media:
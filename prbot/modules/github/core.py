@@ -1,10 +1,21 @@
+import asyncio
 import datetime
 import enum
-from typing import Any, Callable, Type, TypeVar
+import functools
+import math
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Generic,
+    NamedTuple,
+    Type,
+    TypeVar,
+)
 
 import structlog
-from httpx import Response
-from pydantic import BaseModel
+from httpx import URL, Response
+from pydantic import BaseModel, TypeAdapter
 
 from prbot.modules.github.crypto import generate_github_app_jwt
 from prbot.modules.github.models import GhInstallationAccessTokenResponse
@@ -66,13 +77,17 @@ class GitHubClientNotAuthenticated(GitHubClientError):
 class GitHubCore:
     MAX_BACKOFF_TRIES = 2
     MAX_PER_PAGE = 100
+    MAX_CONCURRENT_PAGES = 4
 
     client: HttpClient
     authentication_type: AuthenticationType
+    # Serializes installation token refreshes between concurrent requests
+    _authentication_lock: asyncio.Lock
 
     def __init__(self, client: HttpClient) -> None:
         self.client = client
         self.authentication_type = AuthenticationTypeAnonymous()
+        self._authentication_lock = asyncio.Lock()
 
     async def aclose(self) -> None:
         await self.client.aclose()
@@ -153,19 +168,46 @@ class GitHubCore:
                 seconds=margin_seconds
             ):
                 # Expired, time to regenerate another.
-                logger.warn(
-                    "Installation token expired",
-                    installation_id=self.authentication_type.installation_id,
-                    expiration=self.authentication_type.expiration,
-                )
-                installation_id = self.authentication_type.installation_id
-                self.downgrade_installation_authentication()
-                await self.upgrade_app_authentication(installation_id=installation_id)
+                await self._refresh_installation_token(self.authentication_type)
 
             self.client.set_authentication_token(self.authentication_type.token)
 
         return await self.client._retry_request(method=method, path=path, **kwargs)
 
+    async def _refresh_installation_token(
+        self, authentication: AuthenticationTypeInstallation
+    ) -> None:
+        async with self._authentication_lock:
+            if self.authentication_type is not authentication:
+                # Already refreshed by a concurrent request
+                return
+
+            logger.warn(
+                "Installation token expired",
+                installation_id=authentication.installation_id,
+                expiration=authentication.expiration,
+            )
+
+            # Authenticate this request only: concurrent requests keep
+            # the installation authentication while the token is generated.
+            app_token = generate_github_app_jwt(
+                private_key=authentication.app.private_key,
+                client_id=authentication.app.client_id,
+            )
+            response = await self.client._retry_request(
+                method="POST",
+                path=f"/app/installations/{authentication.installation_id}/access_tokens",
+                headers={"Authorization": f"Bearer {app_token}"},
+            )
+            data = GhInstallationAccessTokenResponse.model_validate(response.json())
+
+            self.set_installation_authentication(
+                app=authentication.app,
+                installation_id=authentication.installation_id,
+                token=data.token,
+                expiration=data.expires_at,
+            )
+
     async def get_all(
         self,
         *,
@@ -173,40 +215,146 @@ class GitHubCore:
         path: str,
         root_type: Type[GetAllRootT] | None = None,
         extract_fn: Callable[[GetAllRootT], list[GetAllModelT]] | None = None,
+        params: dict[str, Any] | None = None,
     ) -> list[GetAllModelT]:
-        result = []
-        current_page = 1
+        """
+        Fetch every page of a listing.
 
-        while True:
-            response = await self.request(
-                method="GET",
+        When the first page announces the last page, through a `Link` header
+        or a `total_count` member, the remaining pages are fetched concurrently.
+        Otherwise pages are fetched one by one until a page is not full.
+        """
+
+        async def fetch_page(page: int) -> _Page[GetAllModelT]:
+            return await self._get_page(
+                model_type=model_type,
                 path=path,
-                params={"per_page": self.MAX_PER_PAGE, "page": current_page},
+                root_type=root_type,
+                extract_fn=extract_fn,
+                params=params,
+                page=page,
             )
 
-            if root_type and extract_fn:
-                # Parse incoming data from root structure
-                root_value = root_type.model_validate(response.json())
-                data = extract_fn(root_value)
+        first_page = await fetch_page(1)
+        result = list(first_page.items)
+        if len(first_page.items) < self.MAX_PER_PAGE:
+            # We have less than MAX_PER_PAGE items, so we should be good
+            return result
 
-            elif model_type:
-                # Parse incoming data
-                data = [
-                    model_type.model_validate(element) for element in response.json()
-                ]
+        last_page = first_page.last_page
+        if last_page is not None:
+            semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_PAGES)
 
-            if len(data) == 0:
-                # We fetch everything.
-                break
+            async def fetch_bounded(page: int) -> _Page[GetAllModelT]:
+                async with semaphore:
+                    return await fetch_page(page)
 
-            elif len(data) == self.MAX_PER_PAGE:
-                # It's possible we have more things to query.
-                result.extend(data)
-                current_page += 1
+            pages = await asyncio.gather(
+                *(fetch_bounded(page) for page in range(2, last_page + 1))
+            )
+            for next_page in pages:
+                result.extend(next_page.items)
 
-            else:
-                # We have less than MAX_PER_PAGE items, so we should be good
-                result.extend(data)
-                break
+            return result
+
+        async for item in self.iter_all(
+            model_type=model_type,
+            path=path,
+            root_type=root_type,
+            extract_fn=extract_fn,
+            params=params,
+            start_page=2,
+        ):
+            result.append(item)
 
         return result
+
+    async def iter_all(
+        self,
+        *,
+        model_type: Type[GetAllModelT],
+        path: str,
+        root_type: Type[GetAllRootT] | None = None,
+        extract_fn: Callable[[GetAllRootT], list[GetAllModelT]] | None = None,
+        params: dict[str, Any] | None = None,
+        start_page: int = 1,
+    ) -> AsyncIterator[GetAllModelT]:
+        """
+        Iterate over the items of a listing, page by page.
+
+        Only the current page is kept in memory, and the next page is only
+        requested once the current one is consumed: stopping the iteration
+        early skips the remaining requests.
+        """
+
+        current_page = start_page
+        while True:
+            page = await self._get_page(
+                model_type=model_type,
+                path=path,
+                root_type=root_type,
+                extract_fn=extract_fn,
+                params=params,
+                page=current_page,
+            )
+
+            for item in page.items:
+                yield item
+
+            if len(page.items) < self.MAX_PER_PAGE:
+                # We have less than MAX_PER_PAGE items, so we should be good
+                return
+
+            # It's possible we have more things to query.
+            current_page += 1
+
+    async def _get_page(
+        self,
+        *,
+        model_type: Type[GetAllModelT],
+        path: str,
+        root_type: Type[GetAllRootT] | None,
+        extract_fn: Callable[[GetAllRootT], list[GetAllModelT]] | None,
+        params: dict[str, Any] | None,
+        page: int,
+    ) -> "_Page[GetAllModelT]":
+        response = await self.request(
+            method="GET",
+            path=path,
+            params={**(params or {}), "per_page": self.MAX_PER_PAGE, "page": page},
+        )
+
+        # Validate the raw content at once, without decoding it in Python first
+        total_count = None
+        if root_type and extract_fn:
+            # Parse incoming data from root structure
+            root_value = root_type.model_validate_json(response.content)
+            items = extract_fn(root_value)
+            total_count = getattr(root_value, "total_count", None)
+        else:
+            items = _list_adapter(model_type).validate_json(response.content)
+
+        return _Page(items=items, last_page=self._get_last_page(response, total_count))
+
+    def _get_last_page(self, response: Response, total_count: int | None) -> int | None:
+        last_url = response.links.get("last", {}).get("url")
+        if last_url:
+            last_page = URL(last_url).params.get("page")
+            if last_page and last_page.isdigit():
+                return int(last_page)
+
+        if isinstance(total_count, int):
+            return math.ceil(total_count / self.MAX_PER_PAGE)
+
+        return None
+
+
+class _Page(NamedTuple, Generic[GetAllModelT]):
+    items: list[GetAllModelT]
+    # Last page announced by the listing, if any
+    last_page: int | None
+
+
+@functools.cache
+def _list_adapter(model_type: Type[GetAllModelT]) -> TypeAdapter[list[GetAllModelT]]:
+    return TypeAdapter(list[model_type])  # type: ignore[valid-type]
@@ -173,6 +173,13 @@ class GhPullRequest(BaseModel):
         )
 
 
+class GhCheckRunAction(enum.StrEnum):
+    Completed = "completed"
+    Created = "created"
+    RequestedAction = "requested_action"
+    Rerequested = "rerequested"
+
+
 class GhCheckSuiteAction(enum.StrEnum):
     Completed = "completed"
     Requested = "requested"
@@ -249,6 +256,7 @@ class GhApiReviewState(enum.StrEnum):
 
 
 class GhApiCheckSuiteResponse(BaseModel):
+    total_count: int | None = None
     check_runs: list[GhCheckRun]
 
 
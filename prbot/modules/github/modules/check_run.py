@@ -12,4 +12,6 @@ class GitHubCheckRunModule(GitHubModule):
             model_type=GhCheckRun,
             extract_fn=lambda root: root.check_runs,
             path=f"/repos/{owner}/{name}/commits/{commit_sha}/check-runs",
+            # Only the most recent run of each check
+            params={"filter": "latest"},
         )
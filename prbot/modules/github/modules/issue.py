@@ -3,6 +3,7 @@ import structlog
 from prbot.modules.github.models import (
     GhCommentRequest,
     GhCommentResponse,
+    GhIssueComment,
     GhLabelsRequest,
     GhLabelsResponse,
 )
@@ -84,6 +85,19 @@ class GitHubIssueModule(GitHubModule):
         data = GhCommentResponse.model_validate(response.json())
         return data.id
 
+    async def find_comment(
+        self, *, owner: str, name: str, number: int, marker: str
+    ) -> int | None:
+        """Find the first comment containing a marker, and return its ID."""
+        async for comment in self._core.iter_all(
+            model_type=GhIssueComment,
+            path=f"/repos/{owner}/{name}/issues/{number}/comments",
+        ):
+            if marker in comment.body:
+                return comment.id
+
+        return None
+
     async def update_comment(
         self, *, owner: str, name: str, comment_id: int, message: str
     ) -> int:
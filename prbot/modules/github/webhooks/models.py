@@ -1,13 +1,15 @@
 from pydantic import BaseModel
 
+# Event models only declare the members read by prbot,
+# the others are skipped when decoding webhooks.
 from prbot.modules.github.models import (
+    GhCheckRun,
+    GhCheckRunAction,
     GhCheckSuite,
     GhCheckSuiteAction,
     GhIssue,
     GhIssueComment,
     GhIssueCommentAction,
-    GhIssueCommentChanges,
-    GhLabel,
     GhPullRequest,
     GhPullRequestAction,
     GhRepository,
@@ -24,33 +26,30 @@ class GhPingEvent(BaseModel):
     sender: GhUser | None = None
 
 
+class GhCheckRunEvent(BaseModel):
+    action: GhCheckRunAction
+    check_run: GhCheckRun
+    repository: GhRepository
+
+
 class GhCheckSuiteEvent(BaseModel):
     action: GhCheckSuiteAction
     check_suite: GhCheckSuite
     repository: GhRepository
-    organization: GhUser | None = None
-    sender: GhUser
 
 
 class GhIssueCommentEvent(BaseModel):
     action: GhIssueCommentAction
-    changes: GhIssueCommentChanges | None = None
     issue: GhIssue
     comment: GhIssueComment
     repository: GhRepository
-    organization: GhUser | None = None
-    sender: GhUser
 
 
 class GhPullRequestEvent(BaseModel):
     action: GhPullRequestAction
     number: int
     pull_request: GhPullRequest
-    label: GhLabel | None = None
-    requested_reviewer: GhUser | None = None
     repository: GhRepository
-    organization: GhUser | None = None
-    sender: GhUser
 
 
 class GhReviewEvent(BaseModel):
@@ -58,5 +57,3 @@ class GhReviewEvent(BaseModel):
     review: GhReview
     pull_request: GhPullRequest
     repository: GhRepository
-    organization: GhUser | None = None
-    sender: GhUser
@@ -1,11 +1,70 @@
+import asyncio
+import time
+import uuid
+import weakref
 from abc import ABC, abstractmethod
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
+import structlog
 from redis.asyncio import Redis
 
 from prbot.config.settings import get_global_settings
 
+from .metrics import (
+    LOCK_CONTENDED,
+    LOCK_HOLD_SECONDS,
+    LOCK_TIMEOUTS,
+    LOCK_WAIT_SECONDS,
+    lock_metric_name,
+)
+
+logger = structlog.get_logger()
+
+POLL_INTERVAL_SECONDS = 0.05
+# A waiter which did not poll for this long is considered dead
+WAITER_TTL_SECONDS = 2.0
+# Local holders passing the distributed lock along before giving it back,
+# so other processes are not starved by a busy one
+MAX_LOCAL_HANDOFFS = 16
+
+# Take the lock when the ticket is first in line, dropping dead waiters before it.
+# Returns 1 when acquired, 0 when waiting, -1 when the ticket left the queue.
+_ACQUIRE_SCRIPT = """
+while true do
+    local head = redis.call('lindex', KEYS[2], 0)
+    if not head then
+        return -1
+    end
+    if head == ARGV[1] then
+        break
+    end
+    if redis.call('exists', ARGV[3] .. head) == 1 then
+        return 0
+    end
+    redis.call('lpop', KEYS[2])
+end
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    redis.call('lpop', KEYS[2])
+    return 1
+end
+return 0
+"""
+
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
 
 class LockException(Exception):
     def __init__(self, message: str) -> None:
@@ -22,15 +81,57 @@ class LockClient(ABC):
     @asynccontextmanager
     @abstractmethod
     async def lock(self, key: str) -> AsyncGenerator[None, None]:
+        """
+        Hold a lock on a key, waiting in line behind the current holders.
+
+        Raises `LockException` if it could not be acquired within the wait budget.
+        """
         yield
 
 
+class _LocalLock:
+    """In-process tier of a lock, holding the distributed lock for its waiters."""
+
+    lock: asyncio.Lock
+    waiting: int
+    ticket: str | None
+    renewal: asyncio.Task[None] | None
+    handoffs: int
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.waiting = 0
+        self.ticket = None
+        self.renewal = None
+        self.handoffs = 0
+
+
 class LockClientImplementation(LockClient):
+    """
+    Fair distributed lock on Redis.
+
+    Waiters take a ticket in a per-key queue, and only the first in line can
+    take the lock. The lease is extended while the holder is running, so
+    a long operation does not lose its lock, and a crashed one frees it quickly.
+
+    Coroutines of the same process first wait on a local lock, and the
+    distributed lock is handed over between them without going through Redis.
+    """
+
     _client: Redis
+    _wait_timeout: float
+    _lease: float
+    _local_locks: weakref.WeakValueDictionary[str, _LocalLock]
 
     def __init__(self) -> None:
         settings = get_global_settings()
         self._client = Redis.from_url(settings.lock_url)
+        self._wait_timeout = settings.lock_wait_timeout_seconds
+        self._lease = settings.lock_lease_seconds
+        self._acquire_script = self._client.register_script(_ACQUIRE_SCRIPT)
+        self._renew_script = self._client.register_script(_RENEW_SCRIPT)
+        self._release_script = self._client.register_script(_RELEASE_SCRIPT)
+        self._local_locks = weakref.WeakValueDictionary()
 
     async def aclose(self) -> None:
         await self._client.aclose()
@@ -40,16 +141,202 @@ class LockClientImplementation(LockClient):
 
     @asynccontextmanager
     async def lock(self, key: str) -> AsyncGenerator[None, None]:
+        metric_name = lock_metric_name(key)
+        started_at = time.monotonic()
+        deadline = started_at + self._wait_timeout
+
+        # Keep a strong reference while waiting and holding
+        local = self._local_locks.get(key)
+        if local is None:
+            local = _LocalLock()
+            self._local_locks[key] = local
+
+        contended = local.lock.locked()
+        local.waiting += 1
+        try:
+            async with asyncio.timeout(self._wait_timeout):
+                await local.lock.acquire()
+        except BaseException as exc:
+            local.waiting -= 1
+            if not local.lock.locked() and local.waiting == 0:
+                # The previous holder kept the distributed lock for us
+                await asyncio.shield(self._release_remote(key, local))
+
+            if isinstance(exc, TimeoutError):
+                LOCK_TIMEOUTS.labels(metric_name).inc()
+                raise LockException(
+                    f"Could not acquire lock '{key}' in {self._wait_timeout}s."
+                ) from exc
+            raise
+        local.waiting -= 1
+
         try:
-            lock = self._client.lock(key)
-            acquired = await lock.acquire(blocking_timeout=0.1)
+            if local.ticket is None:
+                contended |= await self._acquire_remote(key, local, deadline)
+            else:
+                local.handoffs += 1
+        except BaseException:
+            local.lock.release()
+            raise
+
+        if contended:
+            LOCK_CONTENDED.labels(metric_name).inc()
+
+        acquired_at = time.monotonic()
+        LOCK_WAIT_SECONDS.labels(metric_name).observe(acquired_at - started_at)
+
+        try:
+            yield
+        finally:
+            LOCK_HOLD_SECONDS.labels(metric_name).observe(
+                time.monotonic() - acquired_at
+            )
+            try:
+                if (
+                    local.waiting == 0
+                    or local.handoffs >= MAX_LOCAL_HANDOFFS
+                    or local.renewal is None
+                    or local.renewal.done()
+                ):
+                    await self._release_remote(key, local)
+            finally:
+                local.lock.release()
+
+    async def _acquire_remote(
+        self, key: str, local: _LocalLock, deadline: float
+    ) -> bool:
+        ticket = uuid.uuid4().hex
+        try:
+            contended = await self._acquire(key, ticket, deadline)
+        except LockException:
+            LOCK_TIMEOUTS.labels(lock_metric_name(key)).inc()
+            raise
         except Exception as exc:
             raise LockException(str(exc)) from exc
 
-        if acquired:
+        local.ticket = ticket
+        local.renewal = asyncio.create_task(self._renew(key, ticket))
+        local.handoffs = 0
+        return contended
+
+    async def _release_remote(self, key: str, local: _LocalLock) -> None:
+        ticket, renewal = local.ticket, local.renewal
+        local.ticket, local.renewal = None, None
+        if renewal is not None:
+            renewal.cancel()
+        if ticket is None:
+            return
+
+        try:
+            await self._release_script(keys=[key], args=[ticket])
+        except Exception:
+            # The lease will expire by itself
+            logger.warning("Could not release lock", key=key, exc_info=True)
+
+    async def _acquire(self, key: str, ticket: str, deadline: float) -> bool:
+        """Wait for the distributed lock, returning whether it was contended."""
+        queue_key = f"{key}:queue"
+        waiter_prefix = f"{key}:waiter:"
+        waiter_key = f"{waiter_prefix}{ticket}"
+        lease_ms = int(self._lease * 1000)
+
+        await self._enqueue(queue_key, ticket)
+        contended = False
+        try:
+            while True:
+                await self._client.set(waiter_key, 1, px=int(WAITER_TTL_SECONDS * 1000))
+                result = await self._acquire_script(
+                    keys=[key, queue_key], args=[ticket, lease_ms, waiter_prefix]
+                )
+                if result == 1:
+                    return contended
+                elif result == -1:
+                    # Considered dead after a pause, get back in line
+                    await self._enqueue(queue_key, ticket)
+
+                contended = True
+                if time.monotonic() >= deadline:
+                    await self._client.lrem(queue_key, 0, ticket)  # type: ignore[misc]
+                    raise LockException(
+                        f"Could not acquire lock '{key}' in {self._wait_timeout}s."
+                    )
+
+                await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        finally:
+            await self._client.delete(waiter_key)
+
+    async def _enqueue(self, queue_key: str, ticket: str) -> None:
+        async with self._client.pipeline(transaction=True) as pipeline:
+            pipeline.rpush(queue_key, ticket)
+            # Do not leak queues of keys which are not used anymore
+            pipeline.pexpire(queue_key, int((self._wait_timeout + self._lease) * 1000))
+            await pipeline.execute()
+
+    async def _renew(self, key: str, ticket: str) -> None:
+        lease_ms = int(self._lease * 1000)
+        while True:
+            await asyncio.sleep(self._lease / 3)
             try:
-                yield
-            finally:
-                await lock.release()
-        else:
-            raise LockException("Could not acquire lock.")
+                renewed = await self._renew_script(keys=[key], args=[ticket, lease_ms])
+            except Exception:
+                logger.warning("Could not extend lock lease", key=key, exc_info=True)
+                continue
+
+            if not renewed:
+                logger.error("Lock lease was lost while held", key=key)
+                return
+
+
+class MemoryLockClientImplementation(LockClient):
+    """
+    In-process lock, for single-process deployments without Redis.
+
+    Waiters are served in order by `asyncio.Lock`.
+    """
+
+    _wait_timeout: float
+    _locks: weakref.WeakValueDictionary[str, asyncio.Lock]
+
+    def __init__(self) -> None:
+        self._wait_timeout = get_global_settings().lock_wait_timeout_seconds
+        self._locks = weakref.WeakValueDictionary()
+
+    async def aclose(self) -> None:
+        pass
+
+    async def ping(self) -> bool:
+        return True
+
+    @asynccontextmanager
+    async def lock(self, key: str) -> AsyncGenerator[None, None]:
+        metric_name = lock_metric_name(key)
+
+        # Keep a strong reference while waiting and holding
+        local = self._locks.get(key)
+        if local is None:
+            local = asyncio.Lock()
+            self._locks[key] = local
+
+        if local.locked():
+            LOCK_CONTENDED.labels(metric_name).inc()
+
+        started_at = time.monotonic()
+        try:
+            async with asyncio.timeout(self._wait_timeout):
+                await local.acquire()
+        except TimeoutError as exc:
+            LOCK_TIMEOUTS.labels(metric_name).inc()
+            raise LockException(
+                f"Could not acquire lock '{key}' in {self._wait_timeout}s."
+            ) from exc
+
+        acquired_at = time.monotonic()
+        LOCK_WAIT_SECONDS.labels(metric_name).observe(acquired_at - started_at)
+
+        try:
+            yield
+        finally:
+            LOCK_HOLD_SECONDS.labels(metric_name).observe(
+                time.monotonic() - acquired_at
+            )
+            local.release()
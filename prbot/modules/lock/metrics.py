@@ -0,0 +1,24 @@
+from prometheus_client import Counter, Histogram
+
+LOCK_CONTENDED = Counter(
+    "prbot_lock_contended_total",
+    "Lock acquisitions which had to wait for another holder",
+    ["name"],
+)
+LOCK_TIMEOUTS = Counter(
+    "prbot_lock_timeouts_total",
+    "Lock acquisitions which gave up after the wait budget",
+    ["name"],
+)
+LOCK_WAIT_SECONDS = Histogram(
+    "prbot_lock_wait_seconds", "Time spent waiting to acquire a lock", ["name"]
+)
+LOCK_HOLD_SECONDS = Histogram(
+    "prbot_lock_hold_seconds", "Time a lock was held", ["name"]
+)
+
+
+def lock_metric_name(key: str) -> str:
+    """Get the kind of a lock key (e.g. "automerge"), to bound metric labels."""
+
+    return key.split(".", 1)[0]
@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
@@ -9,7 +10,10 @@ from tortoise.contrib.fastapi import RegisterTortoise
 
 from prbot.config.log import setup_logging
 from prbot.config.sentry import setup_sentry
-from prbot.injection import setup
+from prbot.core.qa_status.processor import QaStatusProcessor
+from prbot.injection import inject_instance, setup
+from prbot.modules.cache import CacheClient
+from prbot.modules.database.retention import run_purge_loop
 from prbot.modules.database.settings import get_orm_configuration
 from prbot.server.routers import crash as crash_router
 from prbot.server.routers import external as external_router
@@ -34,7 +38,26 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         add_exception_handlers=True,
     ):
         setup.setup_injections()
-        yield
+
+        # Receive configuration changes from other workers and the CLI
+        cache_client = inject_instance(CacheClient)
+        cache_listener = asyncio.create_task(cache_client.listen())
+        # Remove expired GitHub data stored from webhooks
+        purge_task = asyncio.create_task(run_purge_loop())
+        # Fail the QA status jobs left pending by a stopped worker, then
+        # keep the ones of this worker alive
+        qa_status_processor = inject_instance(QaStatusProcessor)
+        await qa_status_processor.fail_abandoned()
+        heartbeat_task = asyncio.create_task(qa_status_processor.run_heartbeat_loop())
+        try:
+            yield
+        finally:
+            purge_task.cancel()
+            # Let the QA status jobs of this worker finish their syncs
+            await qa_status_processor.join()
+            heartbeat_task.cancel()
+            cache_listener.cancel()
+            await cache_client.aclose()
 
 
 app = FastAPI(title="prbot", lifespan=lifespan)
@@ -1,14 +1,21 @@
 from typing import Annotated
 
 import structlog
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel
 from sentry_sdk import set_tag
 
-from prbot.core.commands.commands import CommandContext, SetQa
-from prbot.core.models import ExternalAccount, QaStatus
-from prbot.core.sync.processor import SyncProcessor
+from prbot.core.models import CheckStatus, ExternalAccount, QaStatus, QaStatusJob
+from prbot.core.qa_status.processor import QaStatusProcessor
+from prbot.core.step.models import StepLabel
 from prbot.injection import inject_instance
+from prbot.modules.database.repository import (
+    DEFAULT_PAGE_SIZE,
+    ExternalAccountRightDatabase,
+    PullRequestStateDatabase,
+    PullRequestStatePage,
+    QaStatusJobDatabase,
+)
 from prbot.server.authentication import get_current_user
 
 router = APIRouter()
@@ -22,14 +29,14 @@ class QaStatusRequest(BaseModel):
     status: bool | None
 
 
-@router.post("/external/set-qa-status")
+@router.post("/external/set-qa-status", status_code=202)
 async def set_qa_status(
     external_account: Annotated[ExternalAccount, Depends(get_current_user)],
     qa_status_request: QaStatusRequest,
-) -> Response:
-    sync_processor = inject_instance(SyncProcessor)
+    response: Response,
+) -> QaStatusJob:
+    qa_status_processor = inject_instance(QaStatusProcessor)
 
-    # Create a command and send it
     qa_status = QaStatus.Waiting
     if qa_status_request.status is True:
         qa_status = QaStatus.Pass
@@ -51,21 +58,65 @@ async def set_qa_status(
     # Note: This code only supports a list of PR numbers on a specific repository,
     #       not PR numbers on various repositories.
     owner, name = qa_status_request.repository_path.split("/")
-    for pull_request_number in qa_status_request.pull_request_numbers:
-        ctx = CommandContext(
-            owner=owner,
-            name=name,
-            number=pull_request_number,
-            author=qa_status_request.author,
-            command=None,
-            comment_id=None,
-        )
-        qa_command = SetQa(qa_status)
-        await qa_command.process(ctx)
 
-        # Sync!
-        await sync_processor.process(
-            owner=owner, name=name, number=pull_request_number, force_creation=False
+    # The QA status is set right away, replies and syncs run in the background
+    job = await qa_status_processor.start(
+        owner=owner,
+        name=name,
+        numbers=qa_status_request.pull_request_numbers,
+        qa_status=qa_status,
+        author=qa_status_request.author,
+        username=external_account.username,
+    )
+
+    response.headers["Location"] = f"/external/qa-status-jobs/{job.id}"
+    return job
+
+
+@router.get("/external/qa-status-jobs/{job_id}")
+async def get_qa_status_job(
+    external_account: Annotated[ExternalAccount, Depends(get_current_user)],
+    job_id: str,
+) -> QaStatusJob:
+    job_db = inject_instance(QaStatusJobDatabase)
+    job = await job_db.get(job_id=job_id)
+    # Jobs of other accounts are not disclosed
+    if job is None or job.username != external_account.username:
+        raise HTTPException(status_code=404, detail="Unknown QA status job")
+
+    return job
+
+
+@router.get("/external/pull-request-states")
+async def list_pull_request_states(
+    external_account: Annotated[ExternalAccount, Depends(get_current_user)],
+    owner: str | None = None,
+    name: str | None = None,
+    step_label: StepLabel | None = None,
+    check_status: CheckStatus | None = None,
+    qa_status: QaStatus | None = None,
+    limit: Annotated[int, Query(ge=1, le=DEFAULT_PAGE_SIZE)] = 100,
+    cursor: int | None = None,
+) -> PullRequestStatePage:
+    if owner is not None and name is not None:
+        right_db = inject_instance(ExternalAccountRightDatabase)
+        right = await right_db.get(
+            owner=owner, name=name, username=external_account.username
         )
+        if right is None:
+            raise HTTPException(
+                status_code=403, detail="No right on the requested repository"
+            )
 
-    return Response(status_code=204)
+    # Only list repositories on which the account has a right
+    pull_request_state_db = inject_instance(PullRequestStateDatabase)
+    return await pull_request_state_db.filter(
+        owner=owner,
+        name=name,
+        step_label=step_label,
+        check_status=check_status,
+        qa_status=qa_status,
+        username=external_account.username,
+        limit=limit,
+        cursor=cursor,
+    )
@@ -1,6 +1,3 @@
-import json
-from typing import Any
-
 from fastapi import APIRouter, HTTPException, Request, Response
 from fastapi.responses import JSONResponse
 
@@ -12,7 +9,7 @@ from prbot.server.crypto import compute_hash
 router = APIRouter()
 
 
-async def parse_webhook_request(request: Request) -> tuple[GhEventType, dict[str, Any]]:
+async def parse_webhook_request(request: Request) -> tuple[GhEventType, bytes]:
     # Validate webhook signature
     github_event = request.headers.get("X-GitHub-Event", "")
     if github_event == "":
@@ -44,15 +41,15 @@ async def parse_webhook_request(request: Request) -> tuple[GhEventType, dict[str
             detail="Body signature does not match the X-Hub-Signature-256 header",
         )
 
-    json_body = json.loads(body)
-    return event_type, json_body
+    # Decoded by the event model, straight from bytes
+    return event_type, body
 
 
 @router.post("/webhook")
 async def webhook(request: Request) -> Response:
-    event_type, json_body = await parse_webhook_request(request)
+    event_type, body = await parse_webhook_request(request)
 
     processor = EventProcessor()
-    await processor.process_event(event_type, json_body)
+    await processor.process_raw_event(event_type, body)
 
     return JSONResponse(status_code=200, content={"message": "OK"})
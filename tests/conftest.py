@@ -10,31 +10,49 @@ from prbot.core.commands.processor import (
     CommandProcessor,
     CommandProcessorImplementation,
 )
+from prbot.core.qa_status.processor import (
+    QaStatusProcessor,
+    QaStatusProcessorImplementation,
+)
 from prbot.core.sync.processor import SyncProcessor, SyncProcessorImplementation
 from prbot.core.sync.sync_state import (
     PullRequestSyncStateBuilder,
     PullRequestSyncStateBuilderImplementation,
 )
 from prbot.injection import inject_instance
+from prbot.modules.cache import CacheClient
+from prbot.modules.database.config_cache import (
+    RepositoryConfigCache,
+    RepositoryConfigCacheImplementation,
+)
 from prbot.modules.database.implementations import (
+    CheckRunDatabaseImplementation,
     ExternalAccountDatabaseImplementation,
     ExternalAccountRightDatabaseImplementation,
     MergeRuleDatabaseImplementation,
     PullRequestDatabaseImplementation,
+    PullRequestSnapshotDatabaseImplementation,
+    PullRequestStateDatabaseImplementation,
+    QaStatusJobDatabaseImplementation,
     RepositoryDatabaseImplementation,
     RepositoryRuleDatabaseImplementation,
 )
 from prbot.modules.database.repository import (
+    CheckRunDatabase,
     ExternalAccountDatabase,
     ExternalAccountRightDatabase,
     MergeRuleDatabase,
     PullRequestDatabase,
+    PullRequestSnapshotDatabase,
+    PullRequestStateDatabase,
+    QaStatusJobDatabase,
     RepositoryDatabase,
     RepositoryRuleDatabase,
 )
 from prbot.modules.gif.client import GifClient, GifClientImplementation
 from prbot.modules.github.client import GitHubClient, GitHubClientImplementation
 from prbot.modules.lock import LockClient
+from tests.utils.cache import FakeCacheClient
 from tests.utils.http import FakeHttpClient
 from tests.utils.lock import FakeLockClient
 
@@ -74,16 +92,26 @@ async def database() -> AsyncGenerator[None, None]:
 async def injector() -> AsyncGenerator[InjectorFixture, None]:
     def default_bind(binder: inject.Binder) -> None:
         binder.bind(LockClient, FakeLockClient())
+        binder.bind(CacheClient, FakeCacheClient())
 
         # Database
         binder.bind(RepositoryDatabase, RepositoryDatabaseImplementation())
         binder.bind(PullRequestDatabase, PullRequestDatabaseImplementation())
+        binder.bind(PullRequestStateDatabase, PullRequestStateDatabaseImplementation())
+        binder.bind(
+            PullRequestSnapshotDatabase, PullRequestSnapshotDatabaseImplementation()
+        )
+        binder.bind(CheckRunDatabase, CheckRunDatabaseImplementation())
+        binder.bind(QaStatusJobDatabase, QaStatusJobDatabaseImplementation())
         binder.bind(MergeRuleDatabase, MergeRuleDatabaseImplementation())
         binder.bind(RepositoryRuleDatabase, RepositoryRuleDatabaseImplementation())
         binder.bind(ExternalAccountDatabase, ExternalAccountDatabaseImplementation())
         binder.bind(
             ExternalAccountRightDatabase, ExternalAccountRightDatabaseImplementation()
         )
+        binder.bind_to_constructor(
+            RepositoryConfigCache, lambda: RepositoryConfigCacheImplementation()
+        )
 
         # Modules
         binder.bind_to_constructor(
@@ -106,6 +134,10 @@ async def injector() -> AsyncGenerator[InjectorFixture, None]:
             PullRequestSyncStateBuilder,
             lambda: PullRequestSyncStateBuilderImplementation(),
         )
+        binder.bind_to_constructor(
+            QaStatusProcessor,
+            lambda: QaStatusProcessorImplementation(),
+        )
 
     inject.configure(default_bind, clear=True, allow_override=True)
 
@@ -148,6 +180,13 @@ def get_fake_gif_http_client() -> FakeHttpClient:
     return core_client
 
 
+def get_fake_cache_client() -> FakeCacheClient:
+    client = inject_instance(CacheClient)
+    assert isinstance(client, FakeCacheClient)
+
+    return client
+
+
 def get_fake_lock_client() -> FakeLockClient:
     client = inject_instance(LockClient)
     assert isinstance(client, FakeLockClient)
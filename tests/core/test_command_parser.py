@@ -94,3 +94,17 @@ async def test_parse_error(text: str) -> None:
     parser = CommandParser()
     with pytest.raises(CommandParseError):
         parser.parse(text)
+
+
+async def test_parse_body() -> None:
+    parser = CommandParser()
+    commands = parser.parse_body("Hello!\nbot qa+\nbotanist\nbot foo\n> bot ping")
+
+    assert [line for line, _ in commands] == ["bot qa+", "bot foo"]
+    assert commands[0][1] == SetQa(QaStatus.Pass)
+    assert isinstance(commands[1][1], CommandParseError)
+
+
+async def test_parse_body_without_prefix() -> None:
+    parser = CommandParser()
+    assert parser.parse_body("Hello!\nbot\nrobot qa+") == []
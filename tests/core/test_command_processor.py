@@ -9,6 +9,10 @@ from prbot.core.commands.commands import (
     SetQa,
     UnassignReviewers,
 )
+from prbot.core.commands.processor import (
+    UNEXPECTED_ERROR_MESSAGE,
+    CommandProcessorImplementation,
+)
 from prbot.core.message import generate_message_footer
 from prbot.core.models import PullRequest, QaStatus, Repository
 from prbot.injection import inject_instance
@@ -86,6 +90,7 @@ async def test_set_qa_pass(arrange: Arrange, command_ctx: CommandContext) -> Non
     arrange.with_comment("QA status is marked as **pass** by **foo**.")
 
     output = await SetQa(QaStatus.Pass).process(command_ctx)
+    await command_ctx.flush()
     assert output.needs_sync is True
 
     pr = await arrange.with_pull_request()
@@ -97,6 +102,7 @@ async def test_set_qa_fail(arrange: Arrange, command_ctx: CommandContext) -> Non
     arrange.with_comment("QA status is marked as **fail** by **foo**.")
 
     output = await SetQa(QaStatus.Fail).process(command_ctx)
+    await command_ctx.flush()
     assert output.needs_sync is True
 
     pr = await arrange.with_pull_request()
@@ -108,6 +114,7 @@ async def test_set_qa_waiting(arrange: Arrange, command_ctx: CommandContext) ->
     arrange.with_comment("QA status is marked as **waiting** by **foo**.")
 
     output = await SetQa(QaStatus.Waiting).process(command_ctx)
+    await command_ctx.flush()
     assert output.needs_sync is True
 
     pr = await arrange.with_pull_request()
@@ -119,6 +126,7 @@ async def test_set_qa_skipped(arrange: Arrange, command_ctx: CommandContext) ->
     arrange.with_comment("QA status is marked as **skipped** by **foo**.")
 
     output = await SetQa(QaStatus.Skipped).process(command_ctx)
+    await command_ctx.flush()
     assert output.needs_sync is True
 
     pr = await arrange.with_pull_request()
@@ -132,6 +140,7 @@ async def test_set_checks_enabled(
     arrange.with_comment("Checks were enabled by **foo**.")
 
     output = await SetChecksEnabled(True).process(command_ctx)
+    await command_ctx.flush()
     assert output.needs_sync is True
 
     pr = await arrange.with_pull_request()
@@ -145,6 +154,7 @@ async def test_set_checks_disabled(
     arrange.with_comment("Checks were disabled by **foo**.")
 
     output = await SetChecksEnabled(False).process(command_ctx)
+    await command_ctx.flush()
     assert output.needs_sync is True
 
     pr = await arrange.with_pull_request()
@@ -158,6 +168,7 @@ async def test_set_automerge_enabled(
     arrange.with_comment("Pull request automerge is enabled.")
 
     output = await SetAutomerge(True).process(command_ctx)
+    await command_ctx.flush()
     assert output.needs_sync is True
 
     pr = await arrange.with_pull_request()
@@ -171,6 +182,7 @@ async def test_set_automerge_disabled(
     arrange.with_comment("Pull request automerge is disabled.")
 
     output = await SetAutomerge(False).process(command_ctx)
+    await command_ctx.flush()
     assert output.needs_sync is True
 
     pr = await arrange.with_pull_request()
@@ -182,6 +194,7 @@ async def test_set_locked(arrange: Arrange, command_ctx: CommandContext) -> None
     arrange.with_comment("Pull request is now locked.")
 
     output = await SetLocked(True, comment=None).process(command_ctx)
+    await command_ctx.flush()
     assert output.needs_sync is True
 
     pr = await arrange.with_pull_request()
@@ -195,6 +208,7 @@ async def test_set_locked_with_comment(
     arrange.with_comment("Pull request is now locked: foobar.")
 
     output = await SetLocked(True, comment="foobar").process(command_ctx)
+    await command_ctx.flush()
     assert output.needs_sync is True
 
     pr = await arrange.with_pull_request()
@@ -206,6 +220,7 @@ async def test_set_unlocked(arrange: Arrange, command_ctx: CommandContext) -> No
     arrange.with_comment("Pull request is now unlocked.")
 
     output = await SetLocked(False, comment=None).process(command_ctx)
+    await command_ctx.flush()
     assert output.needs_sync is True
 
     pr = await arrange.with_pull_request()
@@ -226,6 +241,7 @@ async def test_assign_reviewers(arrange: Arrange, command_ctx: CommandContext) -
     )
 
     output = await AssignReviewers(["foo"]).process(command_ctx)
+    await command_ctx.flush()
     assert output.needs_sync is True
 
 
@@ -245,4 +261,102 @@ async def test_unassign_reviewers(
     )
 
     output = await UnassignReviewers(["foo"]).process(command_ctx)
+    await command_ctx.flush()
+    assert output.needs_sync is True
+
+
+async def test_process_comment(arrange: Arrange, command_ctx: CommandContext) -> None:
+    # A single reaction and reply for every command of the comment
+    arrange.with_reaction(GhReactionType.Confused)
+    arrange.fake_client_api.expect(
+        HttpExpectation()
+        .with_input(method="POST", url="/repos/owner/name/issues/1/comments")
+        .with_input_json(
+            {
+                "body": (
+                    "> bot qa+\n\nQA status is marked as **pass** by **foo**.\n\n"
+                    '> bot foo\n\nInvalid command: Unknown command "foo"\n\n'
+                    "> bot automerge+\n\nPull request automerge is enabled."
+                    f"\n{generate_message_footer()}"
+                )
+            }
+        )
+        .with_output_status(200)
+        .with_output_json({"id": 2})
+    )
+
+    output = await CommandProcessorImplementation().process(
+        owner="owner",
+        name="name",
+        number=1,
+        author="foo",
+        body="Hello!\nbot qa+\nbot foo\nbot automerge+",
+        comment_id=1,
+    )
     assert output.needs_sync is True
+
+    pr = await arrange.with_pull_request()
+    assert pr.qa_status == QaStatus.Pass
+    assert pr.automerge is True
+
+
+async def test_process_comment_unexpected_error(
+    arrange: Arrange, command_ctx: CommandContext
+) -> None:
+    arrange.with_reaction(GhReactionType.Confused)
+    arrange.fake_client_api.expect(
+        HttpExpectation()
+        .with_input(
+            method="POST",
+            url="/repos/owner/name/pulls/1/requested_reviewers",
+            json=GhReviewersAddRequest(reviewers=["bar"]).model_dump(),
+        )
+        .with_output_status(200)
+    )
+    arrange.fake_client_api.expect(
+        HttpExpectation()
+        .with_input(
+            method="POST",
+            url="/repos/owner/name/issues/1/labels",
+            json={"labels": ["foo"]},
+        )
+        .with_output_exception(ValueError("Boom"))
+    )
+    arrange.fake_client_api.expect(
+        HttpExpectation()
+        .with_input(method="POST", url="/repos/owner/name/issues/1/comments")
+        .with_input_json(
+            {
+                "body": (
+                    "> bot qa+\n\nQA status is marked as **pass** by **foo**.\n\n"
+                    f"> bot labels+ foo\n\n{UNEXPECTED_ERROR_MESSAGE}"
+                    f"\n{generate_message_footer()}"
+                )
+            }
+        )
+        .with_output_status(200)
+        .with_output_json({"id": 2})
+    )
+
+    # Changes made before the error are kept, and still replied to
+    output = await CommandProcessorImplementation().process(
+        owner="owner",
+        name="name",
+        number=1,
+        author="foo",
+        body="bot qa+\nbot r+ bar\nbot labels+ foo",
+        comment_id=1,
+    )
+    assert output.needs_sync is True
+
+    pr = await arrange.with_pull_request()
+    assert pr.qa_status == QaStatus.Pass
+
+
+async def test_process_comment_without_commands(
+    arrange: Arrange, command_ctx: CommandContext
+) -> None:
+    output = await CommandProcessorImplementation().process(
+        owner="owner", name="name", number=1, author="foo", body="Hello!\nbye"
+    )
+    assert output.needs_sync is False
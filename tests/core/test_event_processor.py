@@ -1,3 +1,4 @@
+import datetime
 from unittest import mock
 
 import inject
@@ -7,8 +8,16 @@ from prbot.core.commands.processor import CommandProcessor
 from prbot.core.sync.processor import SyncProcessor
 from prbot.core.webhooks.models import GhEventType
 from prbot.core.webhooks.processor import EventProcessor
+from prbot.injection import inject_instance
+from prbot.modules.database.repository import (
+    CheckRunDatabase,
+    PullRequestSnapshotDatabase,
+)
 from prbot.modules.github.models import (
+    GhBranchShort,
+    GhCheckConclusion,
     GhPullRequestAction,
+    GhPullRequestShort,
 )
 from tests.conftest import InjectorFixture
 from tests.utils.webhooks.webhooks import GhEventBuilder
@@ -43,6 +52,91 @@ async def test_pull_request_opened(
     processor = EventProcessor()
     await processor.process_event(GhEventType.PullRequest, event.model_dump())
 
-    # Make sure we sync
-    assert mock_step_processor.process.called
-    assert mock_command_processor.process.called
+    # Body commands are applied before the only sync, replies are sent after it
+    assert mock_step_processor.method_calls[0][0] == "prepare"
+    assert mock_command_processor.apply.called
+    mock_step_processor.process.assert_called_once()
+    reply = mock_command_processor.apply.return_value.reply
+    reply.assert_called_once()
+
+
+async def test_pull_request_snapshot(injector: InjectorFixture) -> None:
+    snapshot_db = inject_instance(PullRequestSnapshotDatabase)
+
+    def config(binder: inject.Binder) -> None:
+        binder.bind(SyncProcessor, mock.AsyncMock(SyncProcessor))
+
+    injector(config)
+    processor = EventProcessor()
+
+    # Pull request events are stored
+    event = (
+        GhEventBuilder()
+        .pull_request()
+        .with_action(GhPullRequestAction.Synchronize)
+        .build()
+    )
+    await processor.process_event(GhEventType.PullRequest, event.model_dump())
+
+    snapshot = await snapshot_db.get(owner="foo", name="bar", number=1)
+    assert snapshot is not None
+    assert snapshot.pull_request == event.pull_request
+
+    # Review events carry a reduced pull request and do not replace it
+    review_event = (
+        GhEventBuilder()
+        .review()
+        .with_pull_request(event.pull_request.model_copy(update={"title": "Reduced"}))
+        .build()
+    )
+    review_event.pull_request.updated_at += datetime.timedelta(minutes=1)
+    await processor.process_event(
+        GhEventType.PullRequestReview, review_event.model_dump()
+    )
+    snapshot = await snapshot_db.get(owner="foo", name="bar", number=1)
+    assert snapshot is not None
+    assert snapshot.pull_request == event.pull_request
+
+    # A check suite on another commit discards the snapshot
+    check_suite_event = (
+        GhEventBuilder()
+        .check_suite()
+        .with_pull_request(
+            GhPullRequestShort(
+                number=1,
+                base=GhBranchShort(ref="foo", sha="abc"),
+                head=GhBranchShort(ref="bar", sha="ghi"),
+            )
+        )
+        .build()
+    )
+    await processor.process_event(
+        GhEventType.CheckSuite, check_suite_event.model_dump()
+    )
+    assert await snapshot_db.get(owner="foo", name="bar", number=1) is None
+
+
+async def test_check_run(injector: InjectorFixture) -> None:
+    check_run_db = inject_instance(CheckRunDatabase)
+    mock_sync_processor = mock.AsyncMock(SyncProcessor)
+
+    def config(binder: inject.Binder) -> None:
+        binder.bind(SyncProcessor, mock_sync_processor)
+
+    injector(config)
+
+    event = GhEventBuilder().check_run().build()
+    await check_run_db.store_listing(
+        owner="foo", name="bar", head_sha="def", check_runs=[event.check_run]
+    )
+
+    event.check_run.conclusion = GhCheckConclusion.Failure
+    processor = EventProcessor()
+    await processor.process_event(GhEventType.CheckRun, event.model_dump())
+
+    assert await check_run_db.get_for_commit(
+        owner="foo", name="bar", head_sha="def", max_age_seconds=60
+    ) == [event.check_run]
+
+    # Sync waits for the check suite
+    assert not mock_sync_processor.process.called
@@ -0,0 +1,179 @@
+import pytest
+
+from prbot.core.models import (
+    GlobRuleBranch,
+    MergeRule,
+    MergeStrategy,
+    NamedRuleBranch,
+    RegexRuleBranch,
+    RepositoryPath,
+    RepositoryRule,
+    RuleActionSetAutomerge,
+    RuleBranchFactory,
+    RuleCondition,
+    RuleConditionAuthor,
+    RuleConditionBaseBranch,
+    RuleConditionHeadBranch,
+    WildcardRuleBranch,
+)
+from prbot.core.rule_index import MergeRuleIndex, RuleIndex
+
+
+def rule(name: str, conditions: list[RuleCondition]) -> RepositoryRule:
+    return RepositoryRule(
+        repository_path=RepositoryPath(owner="owner", name="name"),
+        name=name,
+        conditions=conditions,
+        actions=[RuleActionSetAutomerge(value=True)],
+    )
+
+
+def test_match_all_conditions() -> None:
+    author_and_base = rule(
+        "AuthorAndBase",
+        [
+            RuleConditionAuthor(value="foo"),
+            RuleConditionBaseBranch(value=NamedRuleBranch(value="main")),
+        ],
+    )
+    any_head = rule("AnyHead", [RuleConditionHeadBranch(value=WildcardRuleBranch())])
+    contradiction = rule(
+        "Contradiction",
+        [RuleConditionAuthor(value="foo"), RuleConditionAuthor(value="bar")],
+    )
+    no_conditions = rule("NoConditions", [])
+
+    index = RuleIndex([author_and_base, any_head, contradiction, no_conditions])
+    # Rules which can never match are not indexed
+    assert len(index) == 2
+
+    assert index.match(author="foo", base_branch="main", head_branch="a") == [
+        author_and_base,
+        any_head,
+    ]
+    # Only one condition of the first rule matches
+    assert index.match(author="foo", base_branch="dev", head_branch="a") == [any_head]
+    assert index.match(author="bar", base_branch="main", head_branch="a") == [any_head]
+
+
+def test_match_contradictory_branches() -> None:
+    two_names = rule(
+        "TwoNames",
+        [
+            RuleConditionBaseBranch(value=NamedRuleBranch(value="main")),
+            RuleConditionBaseBranch(value=NamedRuleBranch(value="dev")),
+        ],
+    )
+    name_outside_glob = rule(
+        "NameOutsideGlob",
+        [
+            RuleConditionHeadBranch(value=GlobRuleBranch(value="feature/*")),
+            RuleConditionHeadBranch(value=NamedRuleBranch(value="fix/a")),
+        ],
+    )
+    name_inside_glob = rule(
+        "NameInsideGlob",
+        [
+            RuleConditionHeadBranch(value=GlobRuleBranch(value="feature/*")),
+            RuleConditionHeadBranch(value=NamedRuleBranch(value="feature/a")),
+            RuleConditionAuthor(value="foo"),
+            RuleConditionAuthor(value="foo"),
+        ],
+    )
+
+    index = RuleIndex([two_names, name_outside_glob, name_inside_glob])
+
+    assert len(index) == 1
+    assert index.match(author="foo", base_branch="main", head_branch="feature/a") == [
+        name_inside_glob
+    ]
+    assert index.match(author="foo", base_branch="main", head_branch="feature/b") == []
+
+
+def test_match_keeps_rule_order() -> None:
+    rules = [
+        rule(f"Rule{i}", [RuleConditionHeadBranch(value=NamedRuleBranch(value="a"))])
+        for i in range(10)
+    ]
+
+    assert RuleIndex(rules).match(author="x", base_branch="y", head_branch="a") == rules
+
+
+def merge_rule(base: str, head: str, strategy: MergeStrategy) -> MergeRule:
+    return MergeRule(
+        repository_path=RepositoryPath(owner="owner", name="name"),
+        base_branch=RuleBranchFactory.from_str(base),
+        head_branch=RuleBranchFactory.from_str(head),
+        strategy=strategy,
+    )
+
+
+def test_branch_factory() -> None:
+    assert RuleBranchFactory.from_str("main") == NamedRuleBranch(value="main")
+    assert RuleBranchFactory.from_str("*") == WildcardRuleBranch()
+    assert RuleBranchFactory.from_str("feature/*") == GlobRuleBranch(value="feature/*")
+    assert RuleBranchFactory.from_str("re:release-[0-9]+") == RegexRuleBranch(
+        value="release-[0-9]+"
+    )
+    assert RuleBranchFactory.from_str("re:release").get_name() == "re:release"
+
+    with pytest.raises(ValueError):
+        RuleBranchFactory.from_str("re:(")
+
+
+def test_match_branch_patterns() -> None:
+    glob_head = rule(
+        "GlobHead", [RuleConditionHeadBranch(value=GlobRuleBranch(value="feat/*"))]
+    )
+    regex_base = rule(
+        "RegexBase",
+        [RuleConditionBaseBranch(value=RegexRuleBranch(value="release-[0-9]+"))],
+    )
+    two_heads = rule(
+        "TwoHeads",
+        [
+            RuleConditionHeadBranch(value=GlobRuleBranch(value="feat/*")),
+            RuleConditionHeadBranch(value=GlobRuleBranch(value="*-wip")),
+        ],
+    )
+
+    index = RuleIndex([glob_head, regex_base, two_heads])
+
+    assert index.match(author="a", base_branch="main", head_branch="feat/a/b") == [
+        glob_head
+    ]
+    assert index.match(author="a", base_branch="release-12", head_branch="fix") == [
+        regex_base
+    ]
+    assert index.match(author="a", base_branch="main", head_branch="feat/a-wip") == [
+        glob_head,
+        two_heads,
+    ]
+    assert index.match(author="a", base_branch="release-", head_branch="feat") == []
+
+
+def test_merge_rule_most_specific() -> None:
+    fallback = merge_rule("*", "*", MergeStrategy.Merge)
+    features = merge_rule("main", "feature/*", MergeStrategy.Squash)
+    fixes = merge_rule("main", "feature/fix-*", MergeStrategy.Rebase)
+    exact = merge_rule("main", "feature/fix-1", MergeStrategy.Merge)
+    releases = merge_rule("re:release/[0-9.]+", "*", MergeStrategy.Rebase)
+
+    index = MergeRuleIndex([fallback, features, fixes, exact, releases])
+
+    assert index.match(base_branch="main", head_branch="feature/a") == features
+    assert index.match(base_branch="main", head_branch="feature/fix-2") == fixes
+    assert index.match(base_branch="main", head_branch="feature/fix-1") == exact
+    assert index.match(base_branch="release/1.2", head_branch="a") == releases
+    assert index.match(base_branch="dev", head_branch="feature/a") == fallback
+    assert MergeRuleIndex([features]).match(base_branch="dev", head_branch="a") is None
+
+
+def test_merge_rule_many_patterns() -> None:
+    rules = [
+        merge_rule("main", f"team-{i}/*", MergeStrategy.Squash) for i in range(2000)
+    ]
+    index = MergeRuleIndex(rules)
+
+    assert index.match(base_branch="main", head_branch="team-1234/foo") == rules[1234]
+    assert index.match(base_branch="main", head_branch="other/foo") is None
@@ -1,33 +1,65 @@
+import datetime
+import time
+
+import httpx
 import pytest
 
 from prbot.core.models import PullRequest, Repository
+from prbot.core.summary.builder import SUMMARY_MARKER
 from prbot.core.summary.processor import SummaryProcessor
 from prbot.injection import inject_instance
 from prbot.modules.database.repository import PullRequestDatabase, RepositoryDatabase
-from prbot.modules.github.models import GhCommentResponse
-from tests.conftest import (
-    get_fake_github_http_client,
-    get_fake_lock_client,
-)
+from prbot.modules.github.models import GhCommentResponse, GhIssueComment, GhUser
+from tests.conftest import get_fake_github_http_client
 from tests.utils.http import HttpExpectation
-from tests.utils.lock import LockExpectation
 from tests.utils.sync_state import dummy_sync_state
 
 pytestmark = pytest.mark.anyio
 
 
-async def test_summary_creation_ok() -> None:
-    fake_github = get_fake_github_http_client()
-    fake_lock = get_fake_lock_client()
-
-    # Setup database
+async def create_pull_request(*, status_comment_id: int = 0) -> None:
     repository_db = inject_instance(RepositoryDatabase)
     pull_request_db = inject_instance(PullRequestDatabase)
     repository = await repository_db.create(Repository(owner="owner", name="name"))
     await pull_request_db.create(
-        PullRequest(number=1, repository_path=repository.path())
+        PullRequest(
+            number=1,
+            repository_path=repository.path(),
+            status_comment_id=status_comment_id,
+        )
+    )
+
+
+async def get_status_comment_id() -> int:
+    pull_request_db = inject_instance(PullRequestDatabase)
+    pull_request = await pull_request_db.get_or_raise(
+        owner="owner", name="name", number=1
     )
+    return pull_request.status_comment_id
+
+
+def issue_comment(*, id: int, body: str) -> GhIssueComment:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return GhIssueComment(
+        id=id, user=GhUser(login="bot"), created_at=now, updated_at=now, body=body
+    )
+
+
+def expect_comments(comments: list[GhIssueComment]) -> None:
+    get_fake_github_http_client().expect(
+        HttpExpectation()
+        .with_input(method="GET", url="/repos/owner/name/issues/1/comments")
+        .with_input_params(per_page=100, page=1)
+        .with_output_status(200)
+        .with_output_models(comments)
+    )
+
 
+async def test_summary_creation_ok() -> None:
+    fake_github = get_fake_github_http_client()
+    await create_pull_request()
+
+    # Existing comments are not listed for a new summary
     fake_github.expect(
         HttpExpectation()
         .with_input(
@@ -39,26 +71,102 @@ async def test_summary_creation_ok() -> None:
         .with_output_model(GhCommentResponse(id=1))
     )
 
-    fake_lock.expect(
-        LockExpectation().with_input_action("lock").with_output_function(lambda k: None)
+    processor = SummaryProcessor()
+    summary = await processor.process(sync_state=dummy_sync_state(status_comment_id=0))
+
+    assert summary is not None
+    assert summary.startswith(SUMMARY_MARKER)
+    assert await get_status_comment_id() == 1
+
+
+async def test_summary_creation_recovers_comment() -> None:
+    fake_github = get_fake_github_http_client()
+    # Abandoned claim
+    await create_pull_request(status_comment_id=-int(time.time()) + 3600)
+
+    expect_comments(
+        [
+            issue_comment(id=2, body="Hello"),
+            issue_comment(id=3, body=f"{SUMMARY_MARKER}\nOld summary"),
+        ]
+    )
+    fake_github.expect(
+        HttpExpectation()
+        .with_input(
+            method="PATCH",
+            url="/repos/owner/name/issues/comments/3",
+            json=HttpExpectation.IGNORE,
+        )
+        .with_output_status(200)
+        .with_output_model(GhCommentResponse(id=3))
     )
 
     processor = SummaryProcessor()
-    await processor.process(sync_state=dummy_sync_state(status_comment_id=0))
+    status_comment_id = await get_status_comment_id()
+    await processor.process(
+        sync_state=dummy_sync_state(status_comment_id=status_comment_id)
+    )
 
+    assert await get_status_comment_id() == 3
 
-async def test_summary_creation_ko() -> None:
-    fake_lock = get_fake_lock_client()
 
-    def failed_lock(k: str) -> None:
-        raise RuntimeError("oh noes")
+async def test_summary_creation_after_abandoned_claim() -> None:
+    fake_github = get_fake_github_http_client()
+    await create_pull_request(status_comment_id=-int(time.time()) + 3600)
+
+    expect_comments([issue_comment(id=2, body="Hello")])
+    fake_github.expect(
+        HttpExpectation()
+        .with_input(
+            method="POST",
+            url="/repos/owner/name/issues/1/comments",
+            json=HttpExpectation.IGNORE,
+        )
+        .with_output_status(200)
+        .with_output_model(GhCommentResponse(id=1))
+    )
+
+    processor = SummaryProcessor()
+    status_comment_id = await get_status_comment_id()
+    await processor.process(
+        sync_state=dummy_sync_state(status_comment_id=status_comment_id)
+    )
+
+    assert await get_status_comment_id() == 1
 
-    fake_lock.expect(
-        LockExpectation().with_input_action("lock").with_output_function(failed_lock)
+
+async def test_summary_creation_already_claimed() -> None:
+    # No GitHub call expected, the claim holder creates the comment
+    await create_pull_request(status_comment_id=-int(time.time()))
+
+    processor = SummaryProcessor()
+    assert (
+        await processor.process(sync_state=dummy_sync_state(status_comment_id=0))
+        is None
+    )
+
+
+async def test_summary_creation_ko() -> None:
+    fake_github = get_fake_github_http_client()
+    await create_pull_request()
+
+    fake_github.expect(
+        HttpExpectation()
+        .with_input(
+            method="POST",
+            url="/repos/owner/name/issues/1/comments",
+            json=HttpExpectation.IGNORE,
+        )
+        .with_times(2)
+        .with_output_status(500)
     )
 
     processor = SummaryProcessor()
-    await processor.process(sync_state=dummy_sync_state(status_comment_id=0))
+    with pytest.raises(httpx.HTTPStatusError):
+        await processor.process(sync_state=dummy_sync_state(status_comment_id=0))
+
+    # Released for the next sync
+    assert await get_status_comment_id() == 0
 
 
 async def test_summary_update() -> None:
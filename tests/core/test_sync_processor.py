@@ -1,17 +1,26 @@
-from typing import override
+import asyncio
+from typing import Any, override
 from unittest import mock
 
 import inject
 import pytest
 
 from prbot.core.models import Repository
+from prbot.core.step.models import StepLabel
 from prbot.core.sync.processor import (
     SyncProcessorImplementation,
     SyncProcessorResultSuccess,
 )
-from prbot.core.sync.sync_state import PullRequestSyncStateBuilder
+from prbot.core.sync.sync_state import (
+    PullRequestSyncState,
+    PullRequestSyncStateBuilder,
+)
 from prbot.injection import inject_instance
-from prbot.modules.database.repository import PullRequestDatabase, RepositoryDatabase
+from prbot.modules.database.repository import (
+    PullRequestDatabase,
+    PullRequestStateDatabase,
+    RepositoryDatabase,
+)
 from prbot.modules.github.client import GitHubClient
 from prbot.modules.github.core import GitHubCore
 from prbot.modules.github.models import GhCommitStatusState, GhRepository, GhUser
@@ -21,8 +30,10 @@ from prbot.modules.github.modules.issue import GitHubIssueModule
 from prbot.modules.github.modules.pull_request import GitHubPullRequestModule
 from prbot.modules.github.modules.reaction import GitHubReactionModule
 from prbot.modules.github.modules.repository import GitHubRepositoryModule
-from tests.conftest import InjectorFixture
+from tests.conftest import InjectorFixture, get_fake_lock_client
+from tests.utils.github import dummy_gh_pull_request
 from tests.utils.http import FakeHttpClient
+from tests.utils.lock import LockExpectation
 from tests.utils.sync_state import (
     create_local_builder,
     dummy_sync_state,
@@ -121,6 +132,177 @@ async def test_sync_processor(injector: InjectorFixture) -> None:
         owner="owner", name="name", comment_id=1, message=result.summary
     )
 
+    # Computed state is stored
+    page = await inject_instance(PullRequestStateDatabase).filter()
+    assert [(state.number, state.step_label) for state in page.items] == [
+        (1, StepLabel.AwaitingMerge)
+    ]
+
+
+@pytest.mark.parametrize("merged", [False, True])
+async def test_sync_processor_automerge(
+    injector: InjectorFixture, merged: bool
+) -> None:
+    gh_client = MockGitHubClient()
+    gh_client.repositories_mock.get.return_value = GhRepository(
+        owner=GhUser(login="foo"), name="bar", full_name="foo/bar"
+    )
+    gh_client.pull_requests_mock.get.return_value = dummy_gh_pull_request(merged=merged)
+
+    def bind(binder: inject.Binder) -> None:
+        binder.bind(GitHubClient, gh_client)
+        binder.bind_to_constructor(
+            PullRequestSyncStateBuilder,
+            lambda: create_local_builder(dummy_sync_state(automerge=True)),
+        )
+
+    injector(bind)
+
+    get_fake_lock_client().expect(
+        LockExpectation().with_input_action("lock").with_output_function(lambda k: None)
+    )
+
+    sync_processor = SyncProcessorImplementation()
+    result = await sync_processor.process(
+        owner="owner", name="name", number=1, force_creation=True
+    )
+    assert isinstance(result, SyncProcessorResultSuccess)
+
+    # Merging again after waiting for the lock would fail upstream
+    gh_client.pull_requests_mock.get.assert_called_with(
+        owner="owner", name="name", number=1
+    )
+    assert gh_client.pull_requests_mock.merge.called is not merged
+
+
+class BlockingBuilder(PullRequestSyncStateBuilder):
+    def __init__(self, head_shas: list[str]) -> None:
+        self.head_shas = head_shas
+        self.builds = 0
+        self.release = asyncio.Event()
+
+    async def build(
+        self, *, owner: str, name: str, number: int
+    ) -> PullRequestSyncState:
+        head_sha = self.head_shas[min(self.builds, len(self.head_shas) - 1)]
+        self.builds += 1
+        await self.release.wait()
+        return dummy_sync_state(head_sha=head_sha)
+
+
+def bind_sync_processor(
+    injector: InjectorFixture, builder: BlockingBuilder
+) -> MockGitHubClient:
+    gh_client = MockGitHubClient()
+    gh_client.repositories_mock.get.return_value = GhRepository(
+        owner=GhUser(login="owner"), name="name", full_name="owner/name"
+    )
+
+    def bind(binder: inject.Binder) -> None:
+        binder.bind(GitHubClient, gh_client)
+        binder.bind(PullRequestSyncStateBuilder, builder)
+
+    injector(bind)
+    return gh_client
+
+
+async def test_sync_processor_coalesces_concurrent_requests(
+    injector: InjectorFixture,
+) -> None:
+    builder = BlockingBuilder(["123456"])
+    bind_sync_processor(injector, builder)
+
+    sync_processor = SyncProcessorImplementation()
+    tasks = [
+        asyncio.create_task(
+            sync_processor.process(
+                owner="owner", name="name", number=1, force_creation=True
+            )
+        )
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    builder.release.set()
+    results = await asyncio.gather(*tasks)
+
+    # One run, then a single one for the requests received meanwhile
+    assert builder.builds == 2
+    assert all(isinstance(result, SyncProcessorResultSuccess) for result in results)
+
+
+async def test_sync_processor_caller_cancelled(injector: InjectorFixture) -> None:
+    builder = BlockingBuilder(["123456"])
+    bind_sync_processor(injector, builder)
+
+    sync_processor = SyncProcessorImplementation()
+    first = asyncio.create_task(
+        sync_processor.process(
+            owner="owner", name="name", number=1, force_creation=True
+        )
+    )
+    while builder.builds == 0:
+        await asyncio.sleep(0)
+
+    second = asyncio.create_task(
+        sync_processor.process(
+            owner="owner", name="name", number=1, force_creation=False
+        )
+    )
+    await asyncio.sleep(0)
+
+    # e.g. the webhook request of the first sync was aborted
+    first.cancel()
+    builder.release.set()
+
+    # Queued requests are still synced
+    assert isinstance(await second, SyncProcessorResultSuccess)
+    assert builder.builds == 2
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+async def test_sync_processor_superseded_by_new_head(
+    injector: InjectorFixture,
+) -> None:
+    builder = BlockingBuilder(["aaaaaa", "bbbbbb"])
+    builder.release.set()
+    gh_client = bind_sync_processor(injector, builder)
+
+    status_release = asyncio.Event()
+
+    async def update_status(**kwargs: Any) -> None:
+        await status_release.wait()
+
+    gh_client.commit_statuses_mock.update.side_effect = update_status
+
+    sync_processor = SyncProcessorImplementation()
+    first = asyncio.create_task(
+        sync_processor.process(
+            owner="owner", name="name", number=1, force_creation=True
+        )
+    )
+    while not gh_client.commit_statuses_mock.update.called:
+        await asyncio.sleep(0)
+
+    second = asyncio.create_task(
+        sync_processor.process(
+            owner="owner",
+            name="name",
+            number=1,
+            force_creation=False,
+            head_sha="bbbbbb",
+        )
+    )
+    await asyncio.sleep(0)
+    status_release.set()
+    results = await asyncio.gather(first, second)
+
+    # The stale run stopped before updating labels or the summary
+    assert gh_client.issues_mock.replace_labels.call_count == 1
+    for result in results:
+        assert isinstance(result, SyncProcessorResultSuccess)
+        assert result.sync_state.head_sha == "bbbbbb"
+
 
 async def test_manual_interaction() -> None:
     repository_db = inject_instance(RepositoryDatabase)
@@ -4,6 +4,7 @@ from typing import Any, Callable, Coroutine
 
 import pytest
 
+from prbot.config.settings import Settings
 from prbot.core.models import (
     CheckStatus,
     MergeRule,
@@ -26,9 +27,12 @@ from prbot.core.sync.sync_state import (
     PullRequestSyncStateBuilderImplementation,
 )
 from prbot.injection import inject_instance
+from prbot.modules.database.config_cache import RepositoryConfigCache
 from prbot.modules.database.repository import (
+    CheckRunDatabase,
     MergeRuleDatabase,
     PullRequestDatabase,
+    PullRequestSnapshotDatabase,
     RepositoryDatabase,
     RepositoryRuleDatabase,
     UnknownPullRequest,
@@ -126,6 +130,74 @@ async def test_checks_skipped() -> None:
     )
 
 
+async def test_upstream_pull_request_snapshot(bot_settings: Settings) -> None:
+    fake_github = get_fake_github_http_client()
+    snapshot_db = inject_instance(PullRequestSnapshotDatabase)
+    await snapshot_db.store(
+        owner="owner", name="name", pull_request=dummy_gh_pull_request(title="Stored")
+    )
+
+    builder = PullRequestSyncStateBuilderImplementation()
+
+    # Fresh snapshot, no API call
+    upstream_pr = await builder._get_upstream_pull_request(
+        owner="owner", name="name", number=1
+    )
+    assert upstream_pr.title == "Stored"
+
+    # Expired snapshot, fetched again and stored
+    bot_settings.github_pull_request_snapshot_ttl_seconds = 0
+    fake_github.expect(
+        HttpExpectation()
+        .with_input(method="GET", url="/repos/owner/name/pulls/1")
+        .with_output_status(200)
+        .with_output_model(dummy_gh_pull_request(title="Fetched"))
+    )
+    upstream_pr = await builder._get_upstream_pull_request(
+        owner="owner", name="name", number=1
+    )
+    assert upstream_pr.title == "Fetched"
+
+    snapshot = await snapshot_db.get(owner="owner", name="name", number=1)
+    assert snapshot is not None
+    assert snapshot.pull_request.title == "Fetched"
+
+
+async def test_checks_listed_once() -> None:
+    fake_github = get_fake_github_http_client()
+    fake_github.expect(
+        HttpExpectation()
+        .with_input(method="GET", url="/repos/owner/name/commits/123456/check-runs")
+        .with_input_params(filter="latest", per_page=100, page=1)
+        .with_output_status(200)
+        .with_output_model(
+            GhApiCheckSuiteResponse(check_runs=[dummy_gh_check_run(conclusion=None)])
+        )
+    )
+
+    builder = PullRequestSyncStateBuilderImplementation()
+    assert (
+        await builder._get_checks_result(
+            owner="owner", name="name", commit_sha="123456"
+        )
+        == CheckStatus.Waiting
+    )
+
+    # Then updated by webhooks, without listing again
+    check_run_db = inject_instance(CheckRunDatabase)
+    await check_run_db.store(
+        owner="owner",
+        name="name",
+        check_run=dummy_gh_check_run(conclusion=GhCheckConclusion.Success),
+    )
+    assert (
+        await builder._get_checks_result(
+            owner="owner", name="name", commit_sha="123456"
+        )
+        == CheckStatus.Pass
+    )
+
+
 async def test_checks_empty() -> None:
     fake_github = get_fake_github_http_client()
     repository_db = inject_instance(RepositoryDatabase)
@@ -144,7 +216,7 @@ async def test_checks_empty() -> None:
     fake_github.expect(
         HttpExpectation()
         .with_input(method="GET", url="/repos/owner/name/commits/123456/check-runs")
-        .with_input_params(per_page=100, page=1)
+        .with_input_params(filter="latest", per_page=100, page=1)
         .with_output_status(200)
         .with_output_model(GhApiCheckSuiteResponse(check_runs=[]))
     )
@@ -280,7 +352,7 @@ async def test_sync_state_builder() -> None:
     fake_github.expect(
         HttpExpectation()
         .with_input(method="GET", url="/repos/owner/name/commits/654321/check-runs")
-        .with_input_params(per_page=100, page=1)
+        .with_input_params(filter="latest", per_page=100, page=1)
         .with_output_status(200)
         .with_output_model(
             GhApiCheckSuiteResponse(
@@ -383,11 +455,11 @@ async def test_sync_state_builder() -> None:
 async def test_resolve_repository_rules() -> None:
     async def check(pr: GhPullRequest, rules: list[RepositoryRule]) -> None:
         builder = PullRequestSyncStateBuilderImplementation()
-        assert (
-            await builder._resolve_repository_rules(
-                owner="owner", name="name", upstream_pr=pr
-            )
-        ) == rules
+        config = await inject_instance(RepositoryConfigCache).get(
+            owner="owner", name="name"
+        )
+        assert config is not None
+        assert builder._resolve_repository_rules(config=config, upstream_pr=pr) == rules
 
     repository_db = inject_instance(RepositoryDatabase)
     repository_rule_db = inject_instance(RepositoryRuleDatabase)
@@ -0,0 +1,109 @@
+import fakeredis
+import pytest
+from redis.asyncio import Redis
+
+from prbot.core.models import (
+    MergeRule,
+    MergeStrategy,
+    NamedRuleBranch,
+    Repository,
+    WildcardRuleBranch,
+)
+from prbot.injection import inject_instance
+from prbot.modules import cache as cache_module
+from prbot.modules.cache import CacheClientImplementation, LocalCache
+from prbot.modules.database.config_cache import (
+    RepositoryConfig,
+    RepositoryConfigCache,
+    repository_config_key,
+)
+from prbot.modules.database.repository import MergeRuleDatabase, RepositoryDatabase
+from tests.conftest import get_fake_cache_client
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_get_unknown() -> None:
+    config_cache = inject_instance(RepositoryConfigCache)
+
+    assert await config_cache.get(owner="owner", name="name") is None
+
+
+async def test_get_invalidated_on_write() -> None:
+    repository_db = inject_instance(RepositoryDatabase)
+    merge_rule_db = inject_instance(MergeRuleDatabase)
+    config_cache = inject_instance(RepositoryConfigCache)
+
+    repository = await repository_db.create(Repository(owner="owner", name="name"))
+    assert await config_cache.get(owner="owner", name="name") == RepositoryConfig(
+        repository=repository, rules=[], merge_rules=[]
+    )
+
+    merge_rule = await merge_rule_db.create(
+        MergeRule(
+            repository_path=repository.path(),
+            base_branch=WildcardRuleBranch(),
+            head_branch=NamedRuleBranch(value="foo"),
+            strategy=MergeStrategy.Squash,
+        )
+    )
+    repository = await repository_db.patch(
+        owner="owner", name="name", default_automerge=True
+    )
+
+    config = await config_cache.get(owner="owner", name="name")
+    assert config is not None
+    assert config == RepositoryConfig(
+        repository=repository, rules=[], merge_rules=[merge_rule]
+    )
+    assert config.match_merge_rule(base_branch="main", head_branch="foo") == merge_rule
+    assert (
+        get_fake_cache_client().invalidated_keys
+        == [repository_config_key(owner="owner", name="name")] * 3
+    )
+
+
+async def test_local_cache_skips_values_invalidated_while_loading() -> None:
+    cache = LocalCache()
+
+    async def load() -> int:
+        cache.invalidate("key")
+        return 1
+
+    async def reload() -> int:
+        return 2
+
+    assert await cache.get_or_load("key", load) == 1
+    assert await cache.get_or_load("key", reload) == 2
+    assert await cache.get_or_load("key", load) == 2
+
+
+async def test_local_cache_expiration() -> None:
+    cache = LocalCache(ttl=0)
+
+    async def load() -> int:
+        return 1
+
+    async def reload() -> int:
+        return 2
+
+    assert await cache.get_or_load("key", load) == 1
+    assert await cache.get_or_load("key", reload) == 2
+
+
+async def test_broadcast_cache_expiration(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Redis, "from_url", lambda url: fakeredis.FakeAsyncRedis())
+    monkeypatch.setattr(cache_module, "LOCAL_CACHE_TTL_SECONDS", 0)
+    client = CacheClientImplementation()
+    client._listening = True
+
+    async def load() -> int:
+        return 1
+
+    async def reload() -> int:
+        return 2
+
+    # Values reloaded before a write was committed do not stay forever
+    assert await client.get_or_load("key", load) == 1
+    assert await client.get_or_load("key", reload) == 2
+    await client.aclose()
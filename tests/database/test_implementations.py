@@ -0,0 +1,553 @@
+import datetime
+import re
+
+import pytest
+
+from prbot.core.models import (
+    CheckStatus,
+    ExternalAccount,
+    ExternalAccountRight,
+    MergeStrategy,
+    PullRequest,
+    PullRequestState,
+    QaStatus,
+    QaStatusJob,
+    QaStatusJobItem,
+    QaStatusJobItemStatus,
+    Repository,
+    RepositoryPath,
+    RepositoryRule,
+    RuleActionSetAutomerge,
+    RuleBranchFactory,
+    RuleConditionAuthor,
+    RuleConditionBaseBranch,
+    RuleConditionHeadBranch,
+)
+from prbot.core.step.models import StepLabel
+from prbot.injection import inject_instance
+from prbot.modules.database.repository import (
+    CheckRunDatabase,
+    ExternalAccountDatabase,
+    ExternalAccountRightDatabase,
+    PullRequestDatabase,
+    PullRequestSnapshotDatabase,
+    PullRequestStateDatabase,
+    QaStatusJobDatabase,
+    RepositoryDatabase,
+    RepositoryRuleDatabase,
+    UnknownExternalAccount,
+    UnknownPullRequest,
+    UnknownRepository,
+)
+from prbot.modules.github.models import GhCheckConclusion, GhReviewDecision
+from tests.utils.github import dummy_gh_check_run, dummy_gh_pull_request
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def repository() -> Repository:
+    repository_db = inject_instance(RepositoryDatabase)
+    return await repository_db.create(Repository(owner="owner", name="name"))
+
+
+@pytest.fixture
+async def pull_request(repository: Repository) -> PullRequest:
+    pull_request_db = inject_instance(PullRequestDatabase)
+    return await pull_request_db.create(
+        PullRequest(repository_path=repository.path(), number=1)
+    )
+
+
+async def test_repository_patch(repository: Repository) -> None:
+    repository_db = inject_instance(RepositoryDatabase)
+
+    updated = await repository_db.patch(
+        owner="owner",
+        name="name",
+        default_strategy=MergeStrategy.Rebase,
+        pr_title_validation_regex=re.compile("^foo"),
+        manual_interaction=True,
+    )
+
+    assert updated == repository.model_copy(
+        update={
+            "default_strategy": MergeStrategy.Rebase,
+            "pr_title_validation_regex": re.compile("^foo"),
+            "manual_interaction": True,
+        }
+    )
+    assert await repository_db.get(owner="owner", name="name") == updated
+
+
+async def test_repository_patch_unknown() -> None:
+    repository_db = inject_instance(RepositoryDatabase)
+
+    with pytest.raises(UnknownRepository):
+        await repository_db.set_default_automerge(
+            owner="owner", name="name", value=True
+        )
+
+
+async def test_pull_request_patch(pull_request: PullRequest) -> None:
+    pull_request_db = inject_instance(PullRequestDatabase)
+
+    updated = await pull_request_db.patch(
+        owner="owner",
+        name="name",
+        number=1,
+        qa_status=QaStatus.Pass,
+        automerge=True,
+        strategy_override=MergeStrategy.Squash,
+    )
+
+    assert updated == pull_request.model_copy(
+        update={
+            "qa_status": QaStatus.Pass,
+            "automerge": True,
+            "strategy_override": MergeStrategy.Squash,
+        }
+    )
+    assert await pull_request_db.get(owner="owner", name="name", number=1) == updated
+
+
+async def test_pull_request_set_qa_status_many(pull_request: PullRequest) -> None:
+    pull_request_db = inject_instance(PullRequestDatabase)
+    await pull_request_db.create(
+        PullRequest(repository_path=pull_request.repository_path, number=2)
+    )
+
+    # Unknown pull requests are not returned
+    assert await pull_request_db.set_qa_status_many(
+        owner="owner", name="name", numbers=[1, 2, 3], qa_status=QaStatus.Pass
+    ) == [1, 2]
+    assert (
+        await pull_request_db.set_qa_status_many(
+            owner="owner", name="other", numbers=[1], qa_status=QaStatus.Pass
+        )
+        == []
+    )
+
+    for number in [1, 2]:
+        updated = await pull_request_db.get_or_raise(
+            owner="owner", name="name", number=number
+        )
+        assert updated.qa_status == QaStatus.Pass
+
+
+async def test_pull_request_patch_unknown(repository: Repository) -> None:
+    pull_request_db = inject_instance(PullRequestDatabase)
+
+    with pytest.raises(UnknownPullRequest):
+        await pull_request_db.set_qa_status(
+            owner="owner", name="name", number=1, qa_status=QaStatus.Pass
+        )
+
+    with pytest.raises(UnknownPullRequest):
+        await pull_request_db.set_locked(
+            owner="owner", name="other", number=1, locked=True
+        )
+
+
+async def test_pull_request_patch_read_only_field(pull_request: PullRequest) -> None:
+    pull_request_db = inject_instance(PullRequestDatabase)
+
+    with pytest.raises(ValueError):
+        await pull_request_db.patch(
+            owner="owner",
+            name="name",
+            number=1,
+            repository_path=RepositoryPath(owner="x", name="y"),
+        )
+
+
+async def test_repository_create_or_update() -> None:
+    repository_db = inject_instance(RepositoryDatabase)
+
+    repository = Repository(owner="owner", name="name")
+    assert await repository_db.create_or_update(repository) == repository
+
+    repository = repository.model_copy(
+        update={"default_automerge": True, "default_strategy": MergeStrategy.Squash}
+    )
+    assert await repository_db.create_or_update(repository) == repository
+    assert await repository_db.all() == [repository]
+
+
+async def test_pull_request_create_or_update(repository: Repository) -> None:
+    pull_request_db = inject_instance(PullRequestDatabase)
+
+    pull_request = PullRequest(repository_path=repository.path(), number=1)
+    assert await pull_request_db.create_or_update(pull_request) == pull_request
+
+    pull_request = pull_request.model_copy(
+        update={"qa_status": QaStatus.Fail, "status_comment_id": 1234}
+    )
+    assert await pull_request_db.create_or_update(pull_request) == pull_request
+    assert await pull_request_db.all() == [pull_request]
+
+
+async def test_pull_request_create_or_update_unknown_repository() -> None:
+    pull_request_db = inject_instance(PullRequestDatabase)
+
+    with pytest.raises(UnknownRepository):
+        await pull_request_db.create_or_update(
+            PullRequest(repository_path=RepositoryPath(owner="a", name="b"), number=1)
+        )
+
+
+async def test_external_account_right_get_or_create(repository: Repository) -> None:
+    external_account_db = inject_instance(ExternalAccountDatabase)
+    external_account_right_db = inject_instance(ExternalAccountRightDatabase)
+
+    right = ExternalAccountRight(repository_path=repository.path(), username="foo")
+    with pytest.raises(UnknownExternalAccount):
+        await external_account_right_db.get_or_create(right)
+
+    await external_account_db.create_or_update(
+        ExternalAccount(username="foo", public_key="foo", private_key="foo")
+    )
+    assert await external_account_right_db.get_or_create(right) == right
+    assert await external_account_right_db.get_or_create(right) == right
+    assert await external_account_right_db.all() == [right]
+
+
+async def test_repository_rule_filter_candidates(repository: Repository) -> None:
+    rule_db = inject_instance(RepositoryRuleDatabase)
+
+    def make_rule(name: str, *, author: str, base: str, head: str) -> RepositoryRule:
+        return RepositoryRule(
+            repository_path=repository.path(),
+            name=name,
+            conditions=[
+                RuleConditionAuthor(value=author),
+                RuleConditionBaseBranch(value=RuleBranchFactory.from_str(base)),
+                RuleConditionHeadBranch(value=RuleBranchFactory.from_str(head)),
+            ],
+            actions=[RuleActionSetAutomerge(value=True)],
+        )
+
+    exact = await rule_db.create(make_rule("exact", author="me", base="main", head="f"))
+    glob = await rule_db.create(
+        make_rule("glob", author="me", base="release/*", head="*")
+    )
+    await rule_db.create(make_rule("other-author", author="you", base="main", head="f"))
+    await rule_db.create_or_update(
+        make_rule("other-base", author="me", base="develop", head="*")
+    )
+    without_conditions = await rule_db.create(
+        RepositoryRule(
+            repository_path=repository.path(),
+            name="without-conditions",
+            conditions=[],
+            actions=[],
+        )
+    )
+
+    # Patterns are not projected, so they are candidates for any branch
+    assert await rule_db.filter_candidates(
+        owner="owner", name="name", author="me", base_branch="main", head_branch="f"
+    ) == [exact, glob, without_conditions]
+    assert await rule_db.filter_candidates(
+        owner="owner",
+        name="name",
+        author="me",
+        base_branch="release/1.0",
+        head_branch="f",
+    ) == [glob, without_conditions]
+
+    # Projection is kept up to date on updates
+    await rule_db.update(make_rule("exact", author="you", base="main", head="f"))
+    assert await rule_db.filter_candidates(
+        owner="owner", name="name", author="me", base_branch="main", head_branch="f"
+    ) == [glob, without_conditions]
+
+
+async def test_pull_request_state_create_or_update(pull_request: PullRequest) -> None:
+    pull_request_state_db = inject_instance(PullRequestStateDatabase)
+
+    state = PullRequestState(
+        repository_path=pull_request.repository_path,
+        number=pull_request.number,
+        step_label=StepLabel.AwaitingQa,
+        check_status=CheckStatus.Pass,
+        qa_status=QaStatus.Waiting,
+        review_decision=GhReviewDecision.Approved,
+        mergeable=True,
+        merged=False,
+        head_sha="123456",
+        updated_at=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+    )
+    assert await pull_request_state_db.create_or_update(state) == state
+
+    updated = state.model_copy(
+        update={"step_label": StepLabel.AwaitingMerge, "qa_status": QaStatus.Pass}
+    )
+    assert await pull_request_state_db.create_or_update(updated) == updated
+    assert (
+        await pull_request_state_db.get(owner="owner", name="name", number=1) == updated
+    )
+
+    with pytest.raises(UnknownPullRequest):
+        await pull_request_state_db.create_or_update(
+            state.model_copy(update={"number": 2})
+        )
+
+
+async def test_pull_request_state_filter(repository: Repository) -> None:
+    pull_request_db = inject_instance(PullRequestDatabase)
+    pull_request_state_db = inject_instance(PullRequestStateDatabase)
+
+    states = []
+    for number in range(1, 6):
+        await pull_request_db.create(
+            PullRequest(repository_path=repository.path(), number=number)
+        )
+        states.append(
+            await pull_request_state_db.create_or_update(
+                PullRequestState(
+                    repository_path=repository.path(),
+                    number=number,
+                    step_label=StepLabel.AwaitingQa
+                    if number % 2
+                    else StepLabel.AwaitingReview,
+                    check_status=CheckStatus.Pass,
+                    qa_status=QaStatus.Waiting,
+                    review_decision=None,
+                    mergeable=True,
+                    merged=False,
+                    head_sha="123456",
+                    updated_at=datetime.datetime(
+                        2024, 1, 1, tzinfo=datetime.timezone.utc
+                    ),
+                )
+            )
+        )
+
+    page = await pull_request_state_db.filter(
+        owner="owner", step_label=StepLabel.AwaitingQa, limit=2
+    )
+    assert page.items == [states[0], states[2]]
+    assert page.next_cursor is not None
+
+    page = await pull_request_state_db.filter(
+        owner="owner",
+        step_label=StepLabel.AwaitingQa,
+        limit=2,
+        cursor=page.next_cursor,
+    )
+    assert page.items == [states[4]]
+    assert page.next_cursor is None
+
+    page = await pull_request_state_db.filter(owner="other")
+    assert page.items == []
+
+
+async def test_pull_request_snapshot_store() -> None:
+    snapshot_db = inject_instance(PullRequestSnapshotDatabase)
+    updated_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+    pull_request = dummy_gh_pull_request(updated_at=updated_at)
+    assert await snapshot_db.store(
+        owner="owner", name="name", pull_request=pull_request
+    )
+
+    newer = dummy_gh_pull_request(
+        title="Newer", updated_at=updated_at + datetime.timedelta(seconds=1)
+    )
+    assert await snapshot_db.store(owner="owner", name="name", pull_request=newer)
+
+    # Out-of-order events are rejected
+    assert not await snapshot_db.store(
+        owner="owner", name="name", pull_request=pull_request
+    )
+
+    snapshot = await snapshot_db.get(owner="owner", name="name", number=1)
+    assert snapshot is not None
+    assert snapshot.pull_request == newer
+
+
+async def test_pull_request_snapshot_discard_outdated() -> None:
+    snapshot_db = inject_instance(PullRequestSnapshotDatabase)
+    await snapshot_db.store(
+        owner="owner", name="name", pull_request=dummy_gh_pull_request()
+    )
+
+    await snapshot_db.discard_outdated(
+        owner="owner", name="name", number=1, head_sha="123456"
+    )
+    assert await snapshot_db.get(owner="owner", name="name", number=1) is not None
+
+    await snapshot_db.discard_outdated(
+        owner="owner", name="name", number=1, head_sha="abcdef"
+    )
+    assert await snapshot_db.get(owner="owner", name="name", number=1) is None
+
+
+async def test_check_run_store() -> None:
+    check_run_db = inject_instance(CheckRunDatabase)
+    started_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    first = dummy_gh_check_run(name="a", started_at=started_at, conclusion=None)
+    second = dummy_gh_check_run(name="b", started_at=started_at)
+
+    # Nothing listed yet
+    await check_run_db.store(owner="owner", name="name", check_run=first)
+    assert (
+        await check_run_db.get_for_commit(
+            owner="owner", name="name", head_sha="123456", max_age_seconds=60
+        )
+        is None
+    )
+
+    await check_run_db.store_listing(
+        owner="owner", name="name", head_sha="123456", check_runs=[first, second]
+    )
+
+    # Completed, then an out-of-order event of a previous run
+    completed = first.model_copy(update={"conclusion": GhCheckConclusion.Success})
+    await check_run_db.store(owner="owner", name="name", check_run=completed)
+    await check_run_db.store(
+        owner="owner",
+        name="name",
+        check_run=first.model_copy(
+            update={"started_at": started_at - datetime.timedelta(minutes=1)}
+        ),
+    )
+
+    assert await check_run_db.get_for_commit(
+        owner="owner", name="name", head_sha="123456", max_age_seconds=60
+    ) == [completed, second]
+
+    # Expired listing
+    assert (
+        await check_run_db.get_for_commit(
+            owner="owner", name="name", head_sha="123456", max_age_seconds=0
+        )
+        is None
+    )
+
+
+async def test_check_run_store_unlisted_commit() -> None:
+    check_run_db = inject_instance(CheckRunDatabase)
+    started_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    first = dummy_gh_check_run(name="a", started_at=started_at)
+    second = dummy_gh_check_run(name="b", started_at=started_at)
+
+    # Commits which were never listed are not stored
+    await check_run_db.store(owner="owner", name="name", check_run=first)
+    await check_run_db.store_listing(
+        owner="owner", name="name", head_sha="123456", check_runs=[second]
+    )
+
+    assert await check_run_db.get_for_commit(
+        owner="owner", name="name", head_sha="123456", max_age_seconds=60
+    ) == [second]
+
+
+async def test_github_cache_purge() -> None:
+    snapshot_db = inject_instance(PullRequestSnapshotDatabase)
+    check_run_db = inject_instance(CheckRunDatabase)
+
+    await snapshot_db.store(
+        owner="owner", name="name", pull_request=dummy_gh_pull_request()
+    )
+    await check_run_db.store_listing(
+        owner="owner", name="name", head_sha="123456", check_runs=[dummy_gh_check_run()]
+    )
+
+    past = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)
+    assert await snapshot_db.purge(stored_before=past) == 0
+    assert await check_run_db.purge(listed_before=past) == 0
+
+    future = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    assert await snapshot_db.purge(stored_before=future) == 1
+    assert await check_run_db.purge(listed_before=future) == 1
+
+    assert await snapshot_db.get(owner="owner", name="name", number=1) is None
+    assert (
+        await check_run_db.get_for_commit(
+            owner="owner", name="name", head_sha="123456", max_age_seconds=3600
+        )
+        is None
+    )
+
+    # Check runs of the purged commit are removed with it
+    await check_run_db.store_listing(
+        owner="owner",
+        name="name",
+        head_sha="123456",
+        check_runs=[dummy_gh_check_run(name="other")],
+    )
+    assert [
+        check_run.name
+        for check_run in await check_run_db.get_for_commit(
+            owner="owner", name="name", head_sha="123456", max_age_seconds=3600
+        )
+        or []
+    ] == ["other"]
+
+
+async def test_qa_status_job() -> None:
+    job_db = inject_instance(QaStatusJobDatabase)
+    job = await job_db.create(
+        QaStatusJob(
+            id="a6f3c3f2-2f5e-4a55-9b0e-7f1f0c3f4d21",
+            repository_path=RepositoryPath(owner="owner", name="name"),
+            qa_status=QaStatus.Pass,
+            author="me",
+            username="account",
+            created_at=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+            items=[
+                QaStatusJobItem(number=2, status=QaStatusJobItemStatus.Pending),
+                QaStatusJobItem(
+                    number=1, status=QaStatusJobItemStatus.Failed, error="Unknown"
+                ),
+            ],
+        )
+    )
+    assert not job.done
+
+    await job_db.set_item_status(
+        job_id=job.id, number=2, status=QaStatusJobItemStatus.Done
+    )
+
+    stored = await job_db.get(job_id=job.id)
+    assert stored is not None
+    assert stored.done
+    assert stored.items == [
+        QaStatusJobItem(number=1, status=QaStatusJobItemStatus.Failed, error="Unknown"),
+        QaStatusJobItem(number=2, status=QaStatusJobItemStatus.Done),
+    ]
+    assert await job_db.get(job_id="unknown") is None
+
+    # Only pending items of jobs without recent heartbeat are failed
+    await job_db.create(
+        job.model_copy(
+            update={
+                "id": "0c1d9b8e-5b1a-4c2e-8f3a-2d6e4b7c9a10",
+                "items": [
+                    QaStatusJobItem(number=1, status=QaStatusJobItemStatus.Done),
+                    QaStatusJobItem(number=2, status=QaStatusJobItemStatus.Pending),
+                ],
+            }
+        )
+    )
+    await job_db.heartbeat(
+        job_ids=["0c1d9b8e-5b1a-4c2e-8f3a-2d6e4b7c9a10"],
+        at=job.created_at.replace(month=3),
+    )
+    cutoff = job.created_at.replace(month=2)
+    assert await job_db.fail_abandoned(heartbeat_before=cutoff, error="Stopped") == 0
+    cutoff = job.created_at.replace(month=4)
+    assert await job_db.fail_abandoned(heartbeat_before=cutoff, error="Stopped") == 1
+    stored = await job_db.get(job_id="0c1d9b8e-5b1a-4c2e-8f3a-2d6e4b7c9a10")
+    assert stored is not None
+    assert stored.items == [
+        QaStatusJobItem(number=1, status=QaStatusJobItemStatus.Done),
+        QaStatusJobItem(number=2, status=QaStatusJobItemStatus.Failed, error="Stopped"),
+    ]
+
+    past = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+    assert await job_db.purge(created_before=past) == 0
+    assert await job_db.purge(created_before=job.created_at.replace(year=2025)) == 2
+    assert await job_db.get(job_id=job.id) is None
@@ -1,3 +1,4 @@
+import json
 from io import BytesIO
 
 import pytest
@@ -11,13 +12,19 @@ from prbot.core.models import (
     PullRequest,
     QaStatus,
     Repository,
+    RepositoryPath,
     RepositoryRule,
     RuleActionSetQaStatus,
     RuleConditionAuthor,
     WildcardRuleBranch,
 )
 from prbot.injection import inject_instance
-from prbot.modules.database.import_export import ImportExportData, ImportExportProcessor
+from prbot.modules.database import queries
+from prbot.modules.database.import_export import (
+    ImportExportData,
+    ImportExportFormat,
+    ImportExportProcessor,
+)
 from prbot.modules.database.repository import (
     ExternalAccountDatabase,
     ExternalAccountRightDatabase,
@@ -25,6 +32,7 @@ from prbot.modules.database.repository import (
     PullRequestDatabase,
     RepositoryDatabase,
     RepositoryRuleDatabase,
+    UnknownRepository,
 )
 
 pytestmark = pytest.mark.anyio
@@ -111,6 +119,23 @@ async def test_export_data_values(
     assert ImportExportData.model_validate_json(stream.getvalue()) == initial_data
 
 
+async def test_export_data_summary_claim(
+    initial_data: ImportExportData, with_initialized_db: None
+) -> None:
+    pull_request_db = inject_instance(PullRequestDatabase)
+    await pull_request_db.set_status_comment_id(
+        owner="owner", name="name", number=1, status_comment_id=-1234
+    )
+    processor = ImportExportProcessor()
+
+    # Pending summary claims are not exported
+    for data_format in ImportExportFormat:
+        stream = BytesIO()
+        await processor.export_data(stream, data_format=data_format)
+        assert b'"status_comment_id":-1234' not in stream.getvalue().replace(b" ", b"")
+        assert b'"status_comment_id":0' in stream.getvalue().replace(b" ", b"")
+
+
 async def test_import_data_new(initial_data: ImportExportData) -> None:
     repository_db = inject_instance(RepositoryDatabase)
     pull_request_db = inject_instance(PullRequestDatabase)
@@ -161,3 +186,214 @@ async def test_import_data_existing(
     assert [await external_account_right_db.all()] == [
         initial_data.external_account_rights
     ]
+
+
+async def test_import_data_batched(initial_data: ImportExportData) -> None:
+    repository_db = inject_instance(RepositoryDatabase)
+    pull_request_db = inject_instance(PullRequestDatabase)
+
+    repository = initial_data.repositories[0]
+    pull_requests = [
+        PullRequest(repository_path=repository.path(), number=number)
+        for number in range(1, 6)
+    ]
+    data = initial_data.model_copy(
+        update={
+            # Duplicates are merged, the last value wins
+            "repositories": [
+                repository,
+                repository.model_copy(update={"default_automerge": True}),
+            ],
+            "pull_requests": pull_requests,
+        }
+    )
+
+    stream = BytesIO()
+    stream.write(data.model_dump_json().encode())
+    stream.seek(0)
+
+    processor = ImportExportProcessor()
+    report = await processor.import_data(stream, batch_size=2)
+
+    assert report.rows == {
+        "repositories": 1,
+        "pull_requests": 5,
+        "repository_rules": 1,
+        "merge_rules": 1,
+        "external_accounts": 1,
+        "external_account_rights": 1,
+    }
+    assert report.total_rows == 10
+    assert await repository_db.all() == [data.repositories[1]]
+    assert await pull_request_db.all() == pull_requests
+
+
+async def test_import_data_parameter_limit(
+    initial_data: ImportExportData, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pull_request_db = inject_instance(PullRequestDatabase)
+
+    # A batch larger than what a single statement can bind
+    monkeypatch.setattr(queries, "MAX_QUERY_PARAMETERS", 20)
+
+    repository = initial_data.repositories[0]
+    pull_requests = [
+        PullRequest(repository_path=repository.path(), number=number)
+        for number in range(1, 11)
+    ]
+    data = initial_data.model_copy(update={"pull_requests": pull_requests})
+
+    stream = BytesIO()
+    stream.write(data.model_dump_json().encode())
+    stream.seek(0)
+
+    processor = ImportExportProcessor()
+    report = await processor.import_data(stream, batch_size=1000)
+
+    assert report.rows["pull_requests"] == 10
+    assert await pull_request_db.all() == pull_requests
+
+
+async def test_import_data_unknown_repository(initial_data: ImportExportData) -> None:
+    repository_db = inject_instance(RepositoryDatabase)
+
+    data = initial_data.model_copy(
+        update={
+            "pull_requests": [
+                PullRequest(
+                    repository_path=RepositoryPath(owner="other", name="other"),
+                    number=1,
+                )
+            ]
+        }
+    )
+
+    stream = BytesIO()
+    stream.write(data.model_dump_json().encode())
+    stream.seek(0)
+
+    processor = ImportExportProcessor()
+    with pytest.raises(UnknownRepository):
+        await processor.import_data(stream)
+
+    # Import is transactional
+    assert await repository_db.all() == []
+
+
+async def test_export_import_ndjson(
+    initial_data: ImportExportData, with_initialized_db: None
+) -> None:
+    repository_db = inject_instance(RepositoryDatabase)
+    pull_request_db = inject_instance(PullRequestDatabase)
+    external_account_right_db = inject_instance(ExternalAccountRightDatabase)
+
+    stream = BytesIO()
+    processor = ImportExportProcessor()
+    await processor.export_data(stream, data_format=ImportExportFormat.Ndjson)
+
+    lines = stream.getvalue().splitlines()
+    assert [json.loads(line)["type"] for line in lines] == [
+        "repository",
+        "pull_request",
+        "repository_rule",
+        "merge_rule",
+        "external_account",
+        "external_account_right",
+    ]
+
+    await pull_request_db.delete(owner="owner", name="name", number=1)
+    stream.seek(0)
+    report = await processor.import_data(
+        stream, data_format=ImportExportFormat.Ndjson, batch_size=1
+    )
+
+    assert report.total_rows == 6
+    assert await repository_db.all() == initial_data.repositories
+    assert await pull_request_db.all() == initial_data.pull_requests
+    assert await external_account_right_db.all() == initial_data.external_account_rights
+
+
+async def test_iter_all_pages() -> None:
+    repository_db = inject_instance(RepositoryDatabase)
+
+    repositories = [Repository(owner="owner", name=f"name{i}") for i in range(5)]
+    for repository in repositories:
+        await repository_db.create(repository)
+
+    assert [r async for r in repository_db.iter_all(page_size=2)] == repositories
+
+
+async def test_import_data_compatibility(initial_data: ImportExportData) -> None:
+    repository_db = inject_instance(RepositoryDatabase)
+    pull_request_db = inject_instance(PullRequestDatabase)
+    merge_rule_db = inject_instance(MergeRuleDatabase)
+    repository_rule_db = inject_instance(RepositoryRuleDatabase)
+    external_account_db = inject_instance(ExternalAccountDatabase)
+    external_account_right_db = inject_instance(ExternalAccountRightDatabase)
+
+    # Dependent sections come first, to check they are buffered
+    legacy_data = {
+        "external_account_rights": [{"repository_id": 42, "username": "foo"}],
+        "pull_requests": [
+            {
+                "repository_id": 42,
+                "number": 1,
+                "qa_status": "waiting",
+                "status_comment_id": 0,
+                "checks_enabled": True,
+                "automerge": False,
+                "locked": False,
+                "strategy_override": None,
+            }
+        ],
+        "repositories": [
+            {
+                "id": 42,
+                "owner": "owner",
+                "name": "name",
+                "manual_interaction": False,
+                "pr_title_validation_regex": "",
+                "default_strategy": "merge",
+                "default_automerge": False,
+                "default_enable_qa": True,
+                "default_enable_checks": True,
+            }
+        ],
+        "merge_rules": [
+            {
+                "repository_id": 42,
+                "base_branch": "*",
+                "head_branch": "foo",
+                "strategy": "rebase",
+            }
+        ],
+        "external_accounts": [
+            {"username": "foo", "public_key": "foo", "private_key": "foo"}
+        ],
+        "pull_request_rules": [
+            {
+                "repository_id": 42,
+                "name": "Foo",
+                "conditions": [
+                    condition.model_dump(mode="json")
+                    for condition in initial_data.repository_rules[0].conditions
+                ],
+                "actions": [
+                    action.model_dump(mode="json")
+                    for action in initial_data.repository_rules[0].actions
+                ],
+            }
+        ],
+    }
+
+    stream = BytesIO(json.dumps(legacy_data).encode())
+    processor = ImportExportProcessor()
+    report = await processor.import_data_compatibility(stream, batch_size=1)
+
+    assert report.total_rows == 6
+    assert await repository_db.all() == initial_data.repositories
+    assert await pull_request_db.all() == initial_data.pull_requests
+    assert await merge_rule_db.all() == initial_data.merge_rules
+    assert await repository_rule_db.all() == initial_data.repository_rules
+    assert await external_account_db.all() == initial_data.external_accounts
+    assert await external_account_right_db.all() == initial_data.external_account_rights
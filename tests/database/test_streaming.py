@@ -0,0 +1,43 @@
+from io import BytesIO
+from typing import Any
+
+import pytest
+
+from prbot.modules.database.streaming import JsonStreamReader
+
+
+def read_arrays(data: bytes, *, chunk_size: int) -> dict[str, list[Any]]:
+    reader = JsonStreamReader(BytesIO(data), chunk_size=chunk_size)
+    return {key: list(items) for key, items in reader.iter_object_arrays()}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_iter_object_arrays(chunk_size: int) -> None:
+    data = (
+        '{"a": [1, 23456, {"b": "é"}], "skipped": {"c": [1]},'
+        ' "empty": [], "d": ["x" ,true, null, 1.5e3]}'
+    ).encode()
+
+    assert read_arrays(data, chunk_size=chunk_size) == {
+        "a": [1, 23456, {"b": "é"}],
+        "empty": [],
+        "d": ["x", True, None, 1500.0],
+    }
+
+
+def test_iter_object_arrays_skips_unconsumed_items() -> None:
+    reader = JsonStreamReader(BytesIO(b'{"a": [1, 2, 3], "b": [4]}'), chunk_size=2)
+
+    keys = [key for key, _ in reader.iter_object_arrays()]
+
+    assert keys == ["a", "b"]
+
+
+def test_iter_object_arrays_empty_object() -> None:
+    assert read_arrays(b" {} ", chunk_size=1) == {}
+
+
+@pytest.mark.parametrize("data", [b"[1, 2]", b'{"a": [1, 2}', b'{"a": [1, 2]'])
+def test_iter_object_arrays_invalid(data: bytes) -> None:
+    with pytest.raises(ValueError):
+        read_arrays(data, chunk_size=4)
@@ -0,0 +1,112 @@
+import httpx
+import pytest
+
+from prbot.config.settings import Settings
+from prbot.injection import inject_instance
+from prbot.modules.gif.cache import GifCache
+from prbot.modules.gif.client import GifClient, GifClientImplementation
+from prbot.modules.gif.models import TenorGifObject, TenorGifResponse, TenorGifResult
+from tests.utils.http import FakeHttpClient, HttpExpectation
+
+pytestmark = pytest.mark.anyio
+
+
+def get_fake_gif_http_client() -> FakeHttpClient:
+    client = inject_instance(GifClient)
+    assert isinstance(client, GifClientImplementation)
+    assert isinstance(client._client, FakeHttpClient)
+
+    return client._client
+
+
+def search_expectation(query: str) -> HttpExpectation:
+    return (
+        HttpExpectation()
+        .with_input_method("GET")
+        .with_input_url("/search")
+        .with_input_params(
+            q=query,
+            key="nope",
+            limit=3,
+            locale="en_US",
+            contentfilter="low",
+            media_filter="basic",
+            ar_range="all",
+        )
+    )
+
+
+def gif_response(*urls: str) -> TenorGifResponse:
+    return TenorGifResponse(
+        results=[
+            TenorGifResult(media=[{"tinygif": TenorGifObject(url=url)}]) for url in urls
+        ]
+    )
+
+
+async def test_query_cached() -> None:
+    get_fake_gif_http_client().expect(
+        search_expectation("hello world")
+        .with_output_status(200)
+        .with_output_model(gif_response("https://gif/1"))
+    )
+
+    client = inject_instance(GifClient)
+    assert await client.query_first_match("Hello world") == "https://gif/1"
+    # Same normalized query, from the cache
+    assert await client.query_first_match("  hello   WORLD ") == "https://gif/1"
+
+
+async def test_query_without_result_cached() -> None:
+    get_fake_gif_http_client().expect(
+        search_expectation("nothing")
+        .with_output_status(200)
+        .with_output_model(gif_response())
+    )
+
+    client = inject_instance(GifClient)
+    assert await client.query_first_match("nothing") is None
+    assert await client.query_first_match("nothing") is None
+
+
+async def test_query_error_uses_expired_result(bot_settings: Settings) -> None:
+    bot_settings.gif_cache_ttl_seconds = 0
+    fake_http = get_fake_gif_http_client()
+    fake_http.expect(
+        search_expectation("hello")
+        .with_output_status(200)
+        .with_output_model(gif_response("https://gif/1"))
+    )
+    client = GifClientImplementation(fake_http)
+    assert await client.query_first_match("hello") == "https://gif/1"
+    fake_http.expect(
+        search_expectation("hello").with_output_exception(
+            httpx.ConnectTimeout("Too slow")
+        )
+    )
+
+    assert await client.query_first_match("hello") == "https://gif/1"
+
+
+async def test_query_error_without_result() -> None:
+    get_fake_gif_http_client().expect(
+        search_expectation("hello").with_output_exception(
+            httpx.ConnectTimeout("Too slow")
+        )
+    )
+
+    client = inject_instance(GifClient)
+    assert await client.query_first_match("hello") is None
+
+
+def test_cache_eviction() -> None:
+    cache = GifCache(max_size=2, ttl=60, negative_ttl=10)
+    cache.set("a", "https://gif/a")
+    cache.set("b", None)
+    assert cache.get("a") is not None
+
+    # Least recently used first
+    cache.set("c", "https://gif/c")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
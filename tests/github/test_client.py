@@ -1,13 +1,21 @@
+import asyncio
 import datetime
+from typing import Any
 
 import httpx
 import pytest
 
 from prbot.injection import inject_instance
 from prbot.modules.github.client import GitHubClient
-from prbot.modules.github.core import AuthenticationTypeApp
-from prbot.modules.github.models import GhLabelsResponse, GhRepository, GhUser
+from prbot.modules.github.core import AuthenticationTypeApp, GitHubCore
+from prbot.modules.github.models import (
+    GhApiCheckSuiteResponse,
+    GhLabelsResponse,
+    GhRepository,
+    GhUser,
+)
 from tests.conftest import get_fake_github_http_client
+from tests.utils.github import dummy_gh_check_run
 from tests.utils.http import (
     HttpExpectation,
 )
@@ -111,6 +119,87 @@ async def test_pagniation() -> None:
     assert len(labels) == 150
 
 
+async def test_pagination_link_last_page() -> None:
+    fake_github = get_fake_github_http_client()
+    client = inject_instance(GitHubClient)
+
+    last_link = (
+        "<https://api.github.com/repos/foo/bar/issues/1/labels?per_page=100&page=3>; "
+        'rel="last"'
+    )
+    for page, count in ((1, 100), (2, 100), (3, 20)):
+        fake_github.expect(
+            HttpExpectation()
+            .with_input(method="GET", url="/repos/foo/bar/issues/1/labels")
+            .with_input_params(per_page=100, page=page)
+            .with_output_status(200)
+            .with_output_headers(link=last_link)
+            .with_output_models(
+                [GhLabelsResponse(name=f"LabelP{page}L{x}") for x in range(count)]
+            )
+        )
+
+    labels = await client.issues().labels(owner="foo", name="bar", number=1)
+    assert len(labels) == 220
+    # Pages are kept in order
+    assert labels[0] == "LabelP1L0"
+    assert labels[100] == "LabelP2L0"
+    assert labels[-1] == "LabelP3L19"
+
+
+async def test_pagination_iter_all_stops_early() -> None:
+    fake_github = get_fake_github_http_client()
+    core = GitHubCore(fake_github)
+    core.set_user_authentication(personal_token="token")
+
+    # The second page is never requested
+    fake_github.expect(
+        HttpExpectation()
+        .with_input(method="GET", url="/repos/foo/bar/issues/1/labels")
+        .with_input_params(per_page=100, page=1)
+        .with_output_status(200)
+        .with_output_models([GhLabelsResponse(name=f"LabelP1L{x}") for x in range(100)])
+    )
+
+    found = None
+    async for label in core.iter_all(
+        model_type=GhLabelsResponse, path="/repos/foo/bar/issues/1/labels"
+    ):
+        if label.name == "LabelP1L42":
+            found = label
+            break
+
+    assert found is not None
+
+
+async def test_pagination_total_count() -> None:
+    fake_github = get_fake_github_http_client()
+    client = inject_instance(GitHubClient)
+
+    for page, count in ((1, 100), (2, 100), (3, 1)):
+        fake_github.expect(
+            HttpExpectation()
+            .with_input(method="GET", url="/repos/foo/bar/commits/abc/check-runs")
+            .with_input_params(filter="latest", per_page=100, page=page)
+            .with_output_status(200)
+            .with_output_model(
+                GhApiCheckSuiteResponse(
+                    total_count=201,
+                    check_runs=[
+                        dummy_gh_check_run(name=f"check-{page}-{x}")
+                        for x in range(count)
+                    ],
+                )
+            )
+        )
+
+    check_runs = await client.check_runs().for_commit(
+        owner="foo", name="bar", commit_sha="abc"
+    )
+    assert len(check_runs) == 201
+    assert check_runs[-1].name == "check-3-0"
+
+
 async def test_app_authentication() -> None:
     fake_github = get_fake_github_http_client()
     client = inject_instance(GitHubClient)
@@ -199,3 +288,50 @@ async def test_app_authentication_expiration() -> None:
 
     # Make a simple call
     await client.repositories().get(owner="foo", name="bar")
+
+
+async def test_installation_token_refresh_concurrent() -> None:
+    fake_github = get_fake_github_http_client()
+    core = inject_instance(GitHubClient).core()
+    core.set_installation_authentication(
+        app=AuthenticationTypeApp(client_id="foobar", private_key=dummy_private_key()),
+        installation_id=123456,
+        token="expired",
+        expiration=datetime.datetime.now(datetime.timezone.utc)
+        - datetime.timedelta(minutes=60),
+    )
+
+    # The token is only refreshed once
+    fake_github.expect(
+        HttpExpectation()
+        .with_input(method="POST", url="/app/installations/123456/access_tokens")
+        .with_output_status(200)
+        .with_output_json(
+            {
+                "token": "fresh",
+                "expires_at": (
+                    datetime.datetime.now(datetime.timezone.utc)
+                    + datetime.timedelta(minutes=60)
+                ).isoformat(),
+            }
+        )
+    )
+
+    used_tokens = []
+
+    def record_token() -> dict[str, Any]:
+        used_tokens.append(fake_github.authentication_token)
+        return {}
+
+    paths = [f"/repos/foo/bar{x}" for x in range(3)]
+    for path in paths:
+        fake_github.expect(
+            HttpExpectation()
+            .with_input(method="GET", url=path)
+            .with_output_status(200)
+            .with_output_json_fn(record_token)
+        )
+
+    await asyncio.gather(*(core.request(method="GET", path=path) for path in paths))
+    # No request is sent with the app token while refreshing
+    assert used_tokens == ["fresh"] * 3
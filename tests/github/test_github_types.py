@@ -5,6 +5,8 @@ from typing import Any, Type, cast
 import pytest
 from pydantic import BaseModel
 
+from prbot.core.webhooks.models import GhEventType
+from prbot.core.webhooks.processor import parse_webhook_event
 from prbot.modules.github.webhooks.models import (
     GhCheckSuiteEvent,
     GhIssueCommentEvent,
@@ -42,3 +44,22 @@ def test_parse(
     model_class: Type[BaseModel], filename: str, webhook_factory: WebhookPathFactory
 ) -> None:
     model_class.model_validate(webhook_factory.fetch(filename))
+
+
+@pytest.mark.parametrize(
+    "event_type,filename",
+    [
+        (GhEventType.Ping, "ping_event.json"),
+        (GhEventType.CheckSuite, "check_suite_completed.json"),
+        (GhEventType.IssueComment, "issue_comment_created.json"),
+        (GhEventType.PullRequest, "pull_request_labeled.json"),
+        (GhEventType.PullRequest, "pull_request_opened.json"),
+        (GhEventType.PullRequestReview, "pull_request_review_submitted.json"),
+    ],
+)
+def test_parse_raw(
+    event_type: GhEventType, filename: str, webhook_factory: WebhookPathFactory
+) -> None:
+    body = (FIXTURES_PATH / filename).read_bytes()
+    event = parse_webhook_event(event_type, body)
+    assert event == type(event).model_validate(webhook_factory.fetch(filename))
@@ -0,0 +1,235 @@
+import asyncio
+import gc
+from typing import Any
+
+import fakeredis
+import inject
+import pytest
+from redis.asyncio import Redis
+
+from prbot.config.settings import Settings
+from prbot.injection import inject_instance
+from prbot.injection.setup import _setup_binder
+from prbot.modules import lock as lock_module
+from prbot.modules.cache import CacheClient, MemoryCacheClientImplementation
+from prbot.modules.lock import (
+    LockClient,
+    LockClientImplementation,
+    MemoryLockClientImplementation,
+)
+
+pytestmark = pytest.mark.anyio
+
+KEY = "sync.owner.name.1"
+QUEUE_KEY = f"{KEY}:queue"
+
+
+@pytest.fixture
+def redis(monkeypatch: pytest.MonkeyPatch) -> Redis:
+    # Clients share a fake server, which runs the Lua scripts
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        Redis,
+        "from_url",
+        lambda url: fakeredis.FakeAsyncRedis(server=server),
+    )
+    return fakeredis.FakeAsyncRedis(server=server)
+
+
+async def wait_for_queue(redis: Redis, length: int) -> None:
+    async with asyncio.timeout(1):
+        while await redis.llen(QUEUE_KEY) < length:  # type: ignore[misc]
+            await asyncio.sleep(0.01)
+
+
+class RemoteCalls:
+    def __init__(self) -> None:
+        self.acquired: list[str] = []
+        self.released: list[str] = []
+
+
+def stub_remote(client: LockClientImplementation) -> RemoteCalls:
+    # Only the local tier is tested, Redis is never reached
+    calls = RemoteCalls()
+
+    async def acquire(key: str, ticket: str, deadline: float) -> bool:
+        calls.acquired.append(ticket)
+        return False
+
+    async def release(*, keys: list[str], args: list[Any]) -> int:
+        calls.released.append(args[0])
+        return 1
+
+    client._acquire = acquire  # type: ignore[method-assign]
+    client._release_script = release  # type: ignore[assignment]
+    return calls
+
+
+async def test_local_waiters_share_remote_lock() -> None:
+    client = LockClientImplementation()
+    calls = stub_remote(client)
+    holders: list[int] = []
+
+    async def run(index: int) -> None:
+        async with client.lock("sync.owner.name.1"):
+            assert holders == []
+            holders.append(index)
+            await asyncio.sleep(0)
+            holders.remove(index)
+
+    await asyncio.gather(*(run(index) for index in range(5)))
+
+    assert len(calls.acquired) == 1
+    assert calls.released == calls.acquired
+
+
+async def test_local_handoffs_are_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(lock_module, "MAX_LOCAL_HANDOFFS", 2)
+    client = LockClientImplementation()
+    calls = stub_remote(client)
+
+    async def run() -> None:
+        async with client.lock("sync.owner.name.1"):
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(run() for _ in range(6)))
+
+    assert len(calls.acquired) == 2
+    assert calls.released == calls.acquired
+
+
+async def test_local_lock_timeout(bot_settings: Settings) -> None:
+    bot_settings.lock_wait_timeout_seconds = 0.01
+    client = LockClientImplementation()
+    calls = stub_remote(client)
+
+    async with client.lock("sync.owner.name.1"):
+        with pytest.raises(lock_module.LockException):
+            async with client.lock("sync.owner.name.1"):
+                pass
+
+    assert calls.released == calls.acquired
+
+
+async def test_local_locks_are_dropped() -> None:
+    client = LockClientImplementation()
+    stub_remote(client)
+
+    async with client.lock("sync.owner.name.1"):
+        assert len(client._local_locks) == 1
+
+    gc.collect()
+    assert len(client._local_locks) == 0
+
+
+async def test_remote_lock_fifo(redis: Redis, bot_settings: Settings) -> None:
+    bot_settings.lock_wait_timeout_seconds = 2
+    # One client per process, so that waiters go through Redis
+    holder, first, second = (LockClientImplementation() for _ in range(3))
+    order: list[str] = []
+
+    async def run(client: LockClientImplementation, name: str) -> None:
+        async with client.lock(KEY):
+            order.append(name)
+
+    async with holder.lock(KEY):
+        first_task = asyncio.create_task(run(first, "first"))
+        await wait_for_queue(redis, 1)
+        second_task = asyncio.create_task(run(second, "second"))
+        await wait_for_queue(redis, 2)
+
+    await asyncio.gather(first_task, second_task)
+    assert order == ["first", "second"]
+    assert await redis.exists(KEY) == 0
+
+    for client in (holder, first, second):
+        await client.aclose()
+
+
+async def test_remote_lock_skips_dead_waiters(
+    redis: Redis, bot_settings: Settings
+) -> None:
+    bot_settings.lock_wait_timeout_seconds = 0.2
+    client = LockClientImplementation()
+
+    # A waiter which is still polling keeps its place
+    await redis.rpush(QUEUE_KEY, "alive")  # type: ignore[misc]
+    await redis.set(f"{KEY}:waiter:alive", 1)
+    with pytest.raises(lock_module.LockException):
+        async with client.lock(KEY):
+            pass
+
+    # A waiter which stopped polling is dropped
+    await redis.delete(f"{KEY}:waiter:alive")
+    async with client.lock(KEY):
+        assert await redis.lrange(QUEUE_KEY, 0, -1) == []  # type: ignore[misc]
+
+    await client.aclose()
+
+
+async def test_remote_lock_lease_renewal(redis: Redis, bot_settings: Settings) -> None:
+    bot_settings.lock_lease_seconds = 0.1
+    client = LockClientImplementation()
+
+    async with client.lock(KEY):
+        ticket = await redis.get(KEY)
+        await asyncio.sleep(0.35)
+
+        # Held for several leases
+        assert ticket is not None
+        assert await redis.get(KEY) == ticket
+
+    assert await redis.exists(KEY) == 0
+    await client.aclose()
+
+
+async def test_remote_lock_stale_ticket(redis: Redis) -> None:
+    client = LockClientImplementation()
+
+    async with client.lock(KEY):
+        ticket = await redis.get(KEY)
+
+        # A previous holder can neither release nor extend the lock
+        assert await client._release_script(keys=[KEY], args=["stale"]) == 0
+        assert await client._renew_script(keys=[KEY], args=["stale", 1000]) == 0
+        assert await redis.get(KEY) == ticket
+
+    await client.aclose()
+
+
+async def test_memory_lock() -> None:
+    client = MemoryLockClientImplementation()
+    holders: list[int] = []
+
+    async def run(index: int) -> None:
+        async with client.lock("sync.owner.name.1"):
+            assert holders == []
+            holders.append(index)
+            await asyncio.sleep(0)
+            holders.remove(index)
+
+    await asyncio.gather(*(run(index) for index in range(5)))
+
+    gc.collect()
+    assert len(client._locks) == 0
+
+
+async def test_memory_lock_timeout(bot_settings: Settings) -> None:
+    bot_settings.lock_wait_timeout_seconds = 0.01
+    client = MemoryLockClientImplementation()
+
+    async with client.lock("sync.owner.name.1"):
+        with pytest.raises(lock_module.LockException):
+            async with client.lock("sync.owner.name.1"):
+                pass
+
+    async with client.lock("sync.owner.name.1"):
+        pass
+
+
+async def test_memory_url_binds_memory_clients(bot_settings: Settings) -> None:
+    bot_settings.lock_url = "memory://"
+    inject.configure(_setup_binder, clear=True, allow_override=True)
+
+    assert isinstance(inject_instance(LockClient), MemoryLockClientImplementation)
+    assert isinstance(inject_instance(CacheClient), MemoryCacheClientImplementation)
@@ -0,0 +1,289 @@
+import asyncio
+import datetime
+from typing import Any, AsyncGenerator
+from unittest import mock
+
+import inject
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from prbot.core.message import generate_message_footer
+from prbot.core.models import (
+    CheckStatus,
+    ExternalAccount,
+    ExternalAccountRight,
+    PullRequest,
+    PullRequestState,
+    QaStatus,
+    QaStatusJob,
+    QaStatusJobItem,
+    QaStatusJobItemStatus,
+    Repository,
+    RepositoryPath,
+)
+from prbot.core.qa_status import processor as qa_status_module
+from prbot.core.qa_status.processor import QaStatusProcessor
+from prbot.core.step.models import StepLabel
+from prbot.core.sync.processor import SyncProcessor
+from prbot.injection import inject_instance
+from prbot.modules.database.repository import (
+    ExternalAccountDatabase,
+    ExternalAccountRightDatabase,
+    PullRequestDatabase,
+    PullRequestStateDatabase,
+    QaStatusJobDatabase,
+    RepositoryDatabase,
+)
+from prbot.server.authentication import get_current_user
+from prbot.server.routers import external as external_router
+from tests.conftest import InjectorFixture, get_fake_github_http_client
+from tests.utils.http import HttpExpectation
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def account() -> ExternalAccount:
+    account_db = inject_instance(ExternalAccountDatabase)
+    return await account_db.create(
+        ExternalAccount(username="account", public_key="", private_key="")
+    )
+
+
+@pytest.fixture
+async def client(account: ExternalAccount) -> AsyncGenerator[AsyncClient, None]:
+    app = FastAPI()
+    app.include_router(external_router.router)
+    app.dependency_overrides[get_current_user] = lambda: account
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+
+
+async def create_state(repository_path: RepositoryPath) -> PullRequestState:
+    repository_db = inject_instance(RepositoryDatabase)
+    pull_request_db = inject_instance(PullRequestDatabase)
+    pull_request_state_db = inject_instance(PullRequestStateDatabase)
+
+    await repository_db.create(
+        Repository(owner=repository_path.owner, name=repository_path.name)
+    )
+    await pull_request_db.create(PullRequest(repository_path=repository_path, number=1))
+    return await pull_request_state_db.create_or_update(
+        PullRequestState(
+            repository_path=repository_path,
+            number=1,
+            step_label=StepLabel.AwaitingQa,
+            check_status=CheckStatus.Pass,
+            qa_status=QaStatus.Waiting,
+            review_decision=None,
+            mergeable=True,
+            merged=False,
+            head_sha="123456",
+            updated_at=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+        )
+    )
+
+
+async def test_list_pull_request_states_allowed(
+    client: AsyncClient, account: ExternalAccount
+) -> None:
+    right_db = inject_instance(ExternalAccountRightDatabase)
+
+    allowed_path = RepositoryPath(owner="owner", name="allowed")
+    allowed_state = await create_state(allowed_path)
+    await create_state(RepositoryPath(owner="owner", name="forbidden"))
+    await right_db.create(
+        ExternalAccountRight(repository_path=allowed_path, username=account.username)
+    )
+
+    # Only repositories with a right are listed
+    response = await client.get("/external/pull-request-states")
+    assert response.status_code == 200
+    assert response.json()["items"] == [allowed_state.model_dump(mode="json")]
+
+    response = await client.get(
+        "/external/pull-request-states", params={"owner": "owner", "name": "allowed"}
+    )
+    assert response.status_code == 200
+    assert response.json()["items"] == [allowed_state.model_dump(mode="json")]
+
+
+async def test_list_pull_request_states_forbidden(client: AsyncClient) -> None:
+    await create_state(RepositoryPath(owner="owner", name="forbidden"))
+
+    response = await client.get(
+        "/external/pull-request-states",
+        params={"owner": "owner", "name": "forbidden"},
+    )
+    assert response.status_code == 403
+
+    response = await client.get("/external/pull-request-states")
+    assert response.status_code == 200
+    assert response.json()["items"] == []
+
+
+async def test_set_qa_status(client: AsyncClient, injector: InjectorFixture) -> None:
+    async def sync(*, number: int, **kwargs: Any) -> None:
+        if number == 2:
+            raise RuntimeError("Sync failed")
+
+    sync_processor = mock.AsyncMock(SyncProcessor)
+    sync_processor.process.side_effect = sync
+
+    def config(binder: inject.Binder) -> None:
+        binder.bind(SyncProcessor, sync_processor)
+
+    injector(config)
+
+    repository_db = inject_instance(RepositoryDatabase)
+    pull_request_db = inject_instance(PullRequestDatabase)
+    repository = await repository_db.create(Repository(owner="owner", name="name"))
+    for number in [1, 2]:
+        await pull_request_db.create(
+            PullRequest(repository_path=repository.path(), number=number)
+        )
+        get_fake_github_http_client().expect(
+            HttpExpectation()
+            .with_input(
+                method="POST", url=f"/repos/owner/name/issues/{number}/comments"
+            )
+            .with_input_json(
+                {
+                    "body": "QA status is marked as **pass** by **me**.\n"
+                    + generate_message_footer()
+                }
+            )
+            .with_output_status(200)
+            .with_output_json({"id": number})
+        )
+
+    response = await client.post(
+        "/external/set-qa-status",
+        json={
+            "repository_path": "owner/name",
+            "pull_request_numbers": [1, 2, 3],
+            "author": "me",
+            "status": True,
+        },
+    )
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    assert response.headers["Location"] == f"/external/qa-status-jobs/{job_id}"
+
+    # The QA status is set before the syncs
+    for number in [1, 2]:
+        pull_request = await pull_request_db.get_or_raise(
+            owner="owner", name="name", number=number
+        )
+        assert pull_request.qa_status == QaStatus.Pass
+
+    await inject_instance(QaStatusProcessor).join()
+
+    response = await client.get(f"/external/qa-status-jobs/{job_id}")
+    assert response.status_code == 200
+    job = response.json()
+    assert job["done"]
+    assert [(item["number"], item["status"]) for item in job["items"]] == [
+        (1, QaStatusJobItemStatus.Done),
+        (2, QaStatusJobItemStatus.Failed),
+        (3, QaStatusJobItemStatus.Failed),
+    ]
+    assert job["items"][1]["error"] == "Sync failed"
+    assert sync_processor.process.call_count == 2
+
+
+async def test_get_qa_status_job_unknown(client: AsyncClient) -> None:
+    response = await client.get("/external/qa-status-jobs/unknown")
+    assert response.status_code == 404
+
+
+async def test_qa_status_job_abandoned(
+    client: AsyncClient, injector: InjectorFixture, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(qa_status_module, "HEARTBEAT_INTERVAL_SECONDS", 0.02)
+    monkeypatch.setattr(qa_status_module, "ABANDONED_AFTER_SECONDS", 0.2)
+
+    synced = asyncio.Event()
+
+    async def sync(**kwargs: Any) -> None:
+        await synced.wait()
+
+    sync_processor = mock.AsyncMock(SyncProcessor)
+    sync_processor.process.side_effect = sync
+
+    def config(binder: inject.Binder) -> None:
+        binder.bind(SyncProcessor, sync_processor)
+
+    injector(config)
+
+    # Left pending by a worker which stopped
+    job_db = inject_instance(QaStatusJobDatabase)
+    abandoned = await job_db.create(
+        QaStatusJob(
+            id="a6f3c3f2-2f5e-4a55-9b0e-7f1f0c3f4d21",
+            repository_path=RepositoryPath(owner="owner", name="name"),
+            qa_status=QaStatus.Pass,
+            author="me",
+            username="account",
+            created_at=datetime.datetime.now(datetime.timezone.utc)
+            - datetime.timedelta(minutes=5),
+            items=[QaStatusJobItem(number=1, status=QaStatusJobItemStatus.Pending)],
+        )
+    )
+
+    processor = inject_instance(QaStatusProcessor)
+    assert await processor.fail_abandoned() == 1
+
+    response = await client.get(f"/external/qa-status-jobs/{abandoned.id}")
+    job = response.json()
+    assert job["done"]
+    assert job["items"][0]["status"] == QaStatusJobItemStatus.Failed
+    assert job["items"][0]["error"] == qa_status_module.ABANDONED_ITEM_ERROR
+
+    # A job of this worker is kept alive while it runs
+    repository = await inject_instance(RepositoryDatabase).create(
+        Repository(owner="owner", name="name")
+    )
+    await inject_instance(PullRequestDatabase).create(
+        PullRequest(repository_path=repository.path(), number=2)
+    )
+    get_fake_github_http_client().expect(
+        HttpExpectation()
+        .with_input(method="POST", url="/repos/owner/name/issues/2/comments")
+        .with_input_json(
+            {
+                "body": "QA status is marked as **pass** by **me**.\n"
+                + generate_message_footer()
+            }
+        )
+        .with_output_status(200)
+        .with_output_json({"id": 2})
+    )
+    running = await processor.start(
+        owner="owner",
+        name="name",
+        numbers=[2],
+        qa_status=QaStatus.Pass,
+        author="me",
+        username="account",
+    )
+
+    heartbeat_task = asyncio.create_task(processor.run_heartbeat_loop())
+    await asyncio.sleep(0.5)
+
+    stored = await job_db.get(job_id=running.id)
+    assert stored is not None
+    assert stored.items[0].status == QaStatusJobItemStatus.Pending
+
+    synced.set()
+    await processor.join()
+    heartbeat_task.cancel()
+
+    stored = await job_db.get(job_id=running.id)
+    assert stored is not None
+    assert stored.done
+    assert stored.items[0].status == QaStatusJobItemStatus.Done
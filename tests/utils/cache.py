@@ -0,0 +1,32 @@
+from typing import Awaitable, Callable, TypeVar
+
+from prbot.modules.cache import INVALIDATE_ALL, CacheClient, LocalCache
+
+T = TypeVar("T")
+
+
+class FakeCacheClient(CacheClient):
+    """In-process cache, without broadcast."""
+
+    _local: LocalCache
+    invalidated_keys: list[str]
+
+    def __init__(self) -> None:
+        self._local = LocalCache()
+        self.invalidated_keys = []
+
+    async def aclose(self) -> None:
+        pass
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[T]]) -> T:
+        return await self._local.get_or_load(key, loader)
+
+    async def invalidate(self, key: str) -> None:
+        self._local.invalidate(key)
+        self.invalidated_keys.append(key)
+
+    async def invalidate_all(self) -> None:
+        await self.invalidate(INVALIDATE_ALL)
+
+    async def listen(self) -> None:
+        pass
@@ -1,3 +1,4 @@
+import asyncio
 import json
 from typing import Any, Callable, Iterable, Self, TypeVar
 
@@ -20,6 +21,7 @@ class HttpExpectation(Expectation):
         self._input["json"] = None
         self._output["status"] = None
         self._output["content"] = None
+        self._output["headers"] = None
         self._output["exception"] = None
 
     def with_input_method(self, method: str) -> Self:
@@ -55,7 +57,7 @@ class HttpExpectation(Expectation):
         return self
 
     def with_output_json_fn(self, fn: Callable[..., dict[str, Any]]) -> Self:
-        self._output["content"] = fn
+        self._output["content"] = lambda: json.dumps(fn()).encode("utf-8")
         return self
 
     def with_output_model(self, base_model: BaseModel) -> Self:
@@ -68,6 +70,10 @@ class HttpExpectation(Expectation):
         )
         return self
 
+    def with_output_headers(self, **headers: str) -> Self:
+        self._output["headers"] = headers
+        return self
+
     def with_output_exception(self, exception: Exception) -> Self:
         self._output["exception"] = exception
         return self
@@ -76,8 +82,11 @@ class HttpExpectation(Expectation):
 class FakeHttpClient(HttpClient):
     _expectations: ExpectationHandler[HttpExpectation]
 
+    authentication_token: str | None
+
     def __init__(self) -> None:
         self._expectations = ExpectationHandler()
+        self.authentication_token = None
 
     def expect(self, expectation: HttpExpectation) -> Self:
         self._expectations.add(expectation)
@@ -89,7 +98,8 @@ class FakeHttpClient(HttpClient):
     def clear_expectations(self) -> None:
         self._expectations.clear()
 
-    def set_authentication_token(self, token: str) -> None: ...
+    def set_authentication_token(self, token: str) -> None:
+        self.authentication_token = token
 
     def configure(self, *, headers: dict[str, Any], base_url: str) -> None: ...
 
@@ -115,8 +125,12 @@ class FakeHttpClient(HttpClient):
         if callable(content):
             content = content()
 
+        # Let concurrent requests interleave, as with a real client
+        await asyncio.sleep(0)
+
         return Response(
             status_code=found_expectation._output["status"],
             request=Request(method=method, url=path),
             content=content,
+            headers=found_expectation._output["headers"],
         )
@@ -7,6 +7,8 @@ from prbot.modules.github.models import (
     GhBranch,
     GhBranchShort,
     GhCheckConclusion,
+    GhCheckRun,
+    GhCheckRunAction,
     GhCheckStatus,
     GhCheckSuite,
     GhCheckSuiteAction,
@@ -25,6 +27,7 @@ from prbot.modules.github.models import (
     GhUser,
 )
 from prbot.modules.github.webhooks.models import (
+    GhCheckRunEvent,
     GhCheckSuiteEvent,
     GhIssueCommentEvent,
     GhPingEvent,
@@ -92,13 +95,9 @@ class GhPullRequestEventBuilder:
                 requested_reviewers=[],
                 labels=[],
             ),
-            label=None,
-            requested_reviewer=None,
             repository=GhRepository(
                 name="bar", full_name="foo/bar", owner=GhUser(login="foo")
             ),
-            organization=None,
-            sender=GhUser(login="foo"),
         )
 
     def with_action(self, action: GhPullRequestAction) -> Self:
@@ -129,7 +128,6 @@ class GhIssueCommentEventBuilder:
     def __init__(self) -> None:
         self._event = GhIssueCommentEvent(
             action=GhIssueCommentAction.Created,
-            changes=None,
             issue=GhIssue(
                 number=1,
                 title="Foo",
@@ -150,8 +148,6 @@ class GhIssueCommentEventBuilder:
             repository=GhRepository(
                 name="bar", full_name="foo/bar", owner=GhUser(login="foo")
             ),
-            organization=None,
-            sender=GhUser(login="foo"),
         )
 
     def with_repository(self, repository: GhRepository) -> Self:
@@ -176,7 +172,6 @@ class GhReviewEventBuilder:
     def __init__(self) -> None:
         self._event = GhReviewEvent(
             action=GhReviewAction.Submitted,
-            organization=None,
             pull_request=GhPullRequest(
                 number=1,
                 state=GhPullRequestState.Open,
@@ -200,7 +195,6 @@ class GhReviewEventBuilder:
                 submitted_at=now(),
                 user=GhUser(login="rev"),
             ),
-            sender=GhUser(login="rev"),
         )
 
     def with_repository(self, repository: GhRepository) -> Self:
@@ -252,11 +246,9 @@ class GhCheckSuiteEventBuilder:
                 status=GhCheckStatus.InProgress,
                 updated_at=now(),
             ),
-            organization=None,
             repository=GhRepository(
                 name="bar", full_name="foo/bar", owner=GhUser(login="foo")
             ),
-            sender=GhUser(login="foo"),
         )
 
     def with_app(self, application: GhApplication) -> Self:
@@ -285,6 +277,47 @@ class GhCheckSuiteEventBuilder:
         return copy.deepcopy(self._event)
 
 
+class GhCheckRunEventBuilder:
+    _event: GhCheckRunEvent
+
+    def __init__(self) -> None:
+        self._event = GhCheckRunEvent(
+            action=GhCheckRunAction.Created,
+            check_run=GhCheckRun(
+                id=1,
+                name="check",
+                head_sha="def",
+                status=GhCheckStatus.InProgress,
+                conclusion=None,
+                pull_requests=[
+                    GhPullRequestShort(
+                        base=GhBranchShort(ref="base", sha="abc"),
+                        head=GhBranchShort(ref="head", sha="def"),
+                        number=1,
+                    )
+                ],
+                app=GhApplication(
+                    slug="app-slug", name="app-name", owner=GhUser(login="foo")
+                ),
+                started_at=now(),
+            ),
+            repository=GhRepository(
+                name="bar", full_name="foo/bar", owner=GhUser(login="foo")
+            ),
+        )
+
+    def with_action(self, action: GhCheckRunAction) -> Self:
+        self._event.action = action
+        return self
+
+    def with_check_run(self, check_run: GhCheckRun) -> Self:
+        self._event.check_run = copy.deepcopy(check_run)
+        return self
+
+    def build(self) -> GhCheckRunEvent:
+        return copy.deepcopy(self._event)
+
+
 class GhEventBuilder:
     def ping(self) -> GhPingEventBuilder:
         return GhPingEventBuilder()
@@ -300,3 +333,6 @@ class GhEventBuilder:
 
     def check_suite(self) -> GhCheckSuiteEventBuilder:
         return GhCheckSuiteEventBuilder()
+
+    def check_run(self) -> GhCheckRunEventBuilder:
+        return GhCheckRunEventBuilder()